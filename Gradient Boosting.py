@@ -1,8 +1,23 @@
-from sklearn.ensemble import GradientBoostingRegressor
+import os
 
-gbr = GradientBoostingRegressor(n_estimators=300, learning_rate=0.05, max_depth=4, random_state=42)
-gbr.fit(X_train, y_train)
+import numpy as np
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+
+import dataset_store
+from boosting import fit_booster, make_booster, n_rounds
+from era5_features import FEATURES
+
+BACKEND = "exact"   # "exact", "hist" or "xgboost"
+
+df = dataset_store.read_table("era5_features", columns=["time"] + FEATURES)
+X = df[FEATURES].fillna(0).to_numpy(dtype=np.float64)
+y = df["windspeed"].to_numpy(dtype=np.float64)
+X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+
+gbr = fit_booster(make_booster(BACKEND, n_jobs=os.cpu_count()), X_train, y_train)
+print(f"GBR ({BACKEND}) trees:", n_rounds(gbr))
 
 y_pred = gbr.predict(X_test)
-print("GBR RMSE:", mean_squared_error(y_test, y_pred, squared=False))
-print("GBR R²:", r2_score(y_test, y_pred))
\ No newline at end of file
+print("GBR RMSE:", np.sqrt(mean_squared_error(y_test, y_pred)))
+print("GBR R²:", r2_score(y_test, y_pred))
@@ -1,11 +1,22 @@
+import argparse
+
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.svm import SVR
 from sklearn.metrics import mean_squared_error, r2_score
 
+import dataset_store
+from kernel_svr import ApproxKernelSVR
+
+parser = argparse.ArgumentParser(description="Fit and evaluate the SVR model")
+parser.add_argument("--approx", choices=["nystroem", "rff"],
+                    help="approximate the RBF kernel instead of fitting an exact SVR")
+args = parser.parse_args()
+
 # Load dataset
-df = pd.read_csv("era5_features.csv", parse_dates=["time"])
+df = dataset_store.read_table("era5_features")
 
 # Features & target
 X = df[["windspeed", "temperature_C", "pressure_hPa", "windspeed_roll24h", "windspeed_cubed"]].fillna(0)
@@ -20,10 +31,13 @@ X_train_scaled = scaler.fit_transform(X_train)
 X_test_scaled = scaler.transform(X_test)
 
 # Train SVR
-svr = SVR(kernel="rbf", C=100, gamma=0.1, epsilon=0.1)
+if args.approx:
+    svr = ApproxKernelSVR(method=args.approx, n_components=500, C=100, gamma=0.1, epsilon=0.1)
+else:
+    svr = SVR(kernel="rbf", C=100, gamma=0.1, epsilon=0.1)
 svr.fit(X_train_scaled, y_train)
 
 # Evaluate
 y_pred = svr.predict(X_test_scaled)
-print("SVR RMSE:", mean_squared_error(y_test, y_pred, squared=False))
+print("SVR RMSE:", np.sqrt(mean_squared_error(y_test, y_pred)))
 print("SVR R²:", r2_score(y_test, y_pred))
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+bench_boosting.py
+GradientBoosting backends (exact / hist / xgboost): fit time, trees kept,
+predict throughput and test RMSE on synthetic grid features.
+
+Like bench_svr.py, the target is the next 3-hourly windspeed of each cell.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_features import synthetic_cleaned  # noqa: E402
+from boosting import BACKENDS, fit_booster, make_booster, n_rounds  # noqa: E402
+from era5_features import FEATURES, add_features  # noqa: E402
+
+
+if __name__ == "__main__":
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    n_lat, n_lon = (int(v) for v in (sys.argv[2:4] or (4, 8)))
+
+    df = add_features(synthetic_cleaned(months, n_lat, n_lon))
+    df["target"] = df.groupby(["latitude", "longitude"])["windspeed"].shift(-1)
+    df = df.dropna(subset=["target"])
+    X = df[FEATURES].fillna(0).to_numpy(dtype=np.float64)
+    y = df["target"].to_numpy(dtype=np.float64)
+    cut = int(len(X) * 0.8)
+    print(f"🔹 {cut:,} training rows, {len(X) - cut:,} test rows, {os.cpu_count()} cores")
+
+    print(f"{'backend':<9} {'fit (s)':>8} {'trees':>6} {'predict (rows/s)':>17} {'RMSE':>8}")
+    for backend in BACKENDS:
+        model = make_booster(backend, n_jobs=os.cpu_count())
+        start = time.perf_counter()
+        fit_booster(model, X[:cut], y[:cut])
+        fit = time.perf_counter() - start
+        start = time.perf_counter()
+        pred = model.predict(X[cut:])
+        throughput = (len(X) - cut) / (time.perf_counter() - start)
+        rmse = float(np.sqrt(np.mean((pred - y[cut:]) ** 2)))
+        print(f"{backend:<9} {fit:8.2f} {n_rounds(model):6d} {throughput:17,.0f} {rmse:8.4f}")
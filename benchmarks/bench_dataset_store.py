@@ -0,0 +1,65 @@
+"""
+bench_dataset_store.py
+Read/write throughput of the partitioned Parquet store vs the CSV hand-offs.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset_store  # noqa: E402
+from era5_features import FEATURES  # noqa: E402
+
+
+def make_features_frame(n_times: int, n_cells: int, seed: int = 0) -> pd.DataFrame:
+    """Long-form frame shaped like era5_features (one row per time x grid cell)."""
+    rng = np.random.default_rng(seed)
+    n = n_times * n_cells
+    df = pd.DataFrame({
+        "time": np.repeat(pd.date_range("2019-11-01", periods=n_times, freq="3h"), n_cells),
+        "latitude": np.tile(np.linspace(56, 53, n_cells), n_times),
+        "longitude": np.tile(np.linspace(-6, 0, n_cells), n_times),
+    })
+    for col in FEATURES + ["wind_direction_deg", "month", "season", "day_of_week"]:
+        df[col] = rng.normal(size=n)
+    return df
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n_times = int(sys.argv[1]) if len(sys.argv) > 1 else 2920   # one year, 3-hourly
+    n_cells = int(sys.argv[2]) if len(sys.argv) > 2 else 325     # 13 x 25 grid
+    df = make_features_frame(n_times, n_cells)
+    print(f"🔹 {len(df):,} rows x {df.shape[1]} columns")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "era5_features.csv")
+        store = os.path.join(tmp, "era5_features")
+
+        results = {
+            "CSV write": timed(lambda: df.to_csv(csv_path, index=False)),
+            "Parquet write": timed(lambda: dataset_store.write_partitions(df, store)),
+            "CSV read (all)": timed(lambda: pd.read_csv(csv_path, parse_dates=["time"])),
+            "Parquet read (all)": timed(lambda: dataset_store.read_dataset(store)),
+            "CSV read (7 features)": timed(lambda: pd.read_csv(csv_path, usecols=FEATURES)),
+            "Parquet read (7 features)": timed(lambda: dataset_store.read_dataset(store, FEATURES)),
+            "Parquet replace one month": timed(
+                lambda: dataset_store.write_partitions(df[df["time"] < "2019-12-01"], store)),
+        }
+
+        for label, seconds in results.items():
+            print(f"   {label:<28} {seconds:7.2f} s   {len(df) / seconds / 1e6:7.2f} M rows/s")
+
+        print(f"   CSV size     {os.path.getsize(csv_path) / 1e6:8.1f} MB")
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(store) for f in fs)
+        print(f"   Parquet size {size / 1e6:8.1f} MB")
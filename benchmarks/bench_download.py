@@ -0,0 +1,33 @@
+"""
+bench_download.py
+Backfill a year of ERA5 months against FakeCDSClient at several concurrency
+levels, then re-run to show that completed months are skipped.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from download_era5 import DownloadScheduler  # noqa: E402
+from fake_cds import FakeCDSClient  # noqa: E402
+
+
+def backfill(out_dir: str, workers: int, **client_kwargs) -> tuple:
+    client = FakeCDSClient(**client_kwargs)
+    scheduler = DownloadScheduler(client, out_dir=out_dir, max_workers=workers,
+                                  base_delay=0.05, sleep=time.sleep)
+    start = time.perf_counter()
+    summary = scheduler.run("2020-01", "2020-12")
+    return time.perf_counter() - start, summary, client.calls
+
+
+if __name__ == "__main__":
+    for workers in (1, 4, 8):
+        with tempfile.TemporaryDirectory() as tmp:
+            wall, summary, calls = backfill(tmp, workers, latency=1.0, failure_rate=0.2, max_days=20)
+            print(f"🔹 workers={workers}: {wall:5.1f} s, {calls} requests, {summary}")
+
+            wall, summary, calls = backfill(tmp, workers, latency=1.0)
+            print(f"   resume: {wall:5.2f} s, {calls} requests, {summary}")
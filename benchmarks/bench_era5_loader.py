@@ -0,0 +1,41 @@
+"""
+bench_era5_loader.py
+Compare wall time and peak RSS of era5_loader.py in streaming vs in-memory mode
+on synthetic ERA5 files.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic import write_era5_files
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOADER = os.path.join(REPO_ROOT, "era5_loader.py")
+
+
+def run_measured(cmd: list, cwd: str) -> tuple:
+    """Run a command and return (wall seconds, peak RSS in MB) for that process alone."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    if status != 0:
+        raise RuntimeError(f"{cmd} exited with status {status}")
+    return elapsed, rusage.ru_maxrss / 1024  # ru_maxrss is KiB on Linux
+
+
+if __name__ == "__main__":
+    n_lat, n_lon = (int(v) for v in (sys.argv[1:3] or (41, 49)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_era5_files(tmp, "2019-11", "2020-10", n_lat=n_lat, n_lon=n_lon)
+        print(f"🔹 12 months, {n_lat}x{n_lon} grid, 3-hourly")
+
+        for label, extra in [("in-memory", ["--in-memory"]),
+                             ("streaming (chunk=248)", []),
+                             ("streaming (chunk=56)", ["--chunk-size", "56"])]:
+            wall, rss = run_measured([sys.executable, LOADER] + extra, cwd=tmp)
+            print(f"   {label:<24} wall {wall:6.1f} s   peak RSS {rss:7.1f} MB")
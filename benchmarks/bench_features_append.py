@@ -0,0 +1,114 @@
+"""
+bench_features_append.py
+Check that month-by-month `era5_features.py --append` output is bit-identical to
+a full recompute, and time a one-month append against recomputing the history.
+
+Then run the script itself: --append once per month, with one append killed
+after writing its rows but before saving its state. The dataset must still
+match a full run, with no rows written twice. Any mismatch exits non-zero.
+suite.py runs this on its own cleaned dataset:
+
+  python bench_features_append.py [months]
+  python bench_features_append.py --input era5_cleaned
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset_store  # noqa: E402
+from bench_features import synthetic_cleaned  # noqa: E402
+from bench_train import REPO_ROOT  # noqa: E402
+from era5_features import SPACE_COLS, compute_features, load_state, save_state  # noqa: E402
+
+FEATURE_COLS = ["wind_direction_deg", "windspeed_roll24h", "temperature_roll7d",
+                "month", "season", "day_of_week", "windspeed_cubed", "windspeed_lag1"]
+
+# era5_features.py --append up to its write, dying before save_state
+CRASHED_APPEND = """
+import dataset_store
+from era5_features import compute_features, load_state
+state = load_state("era5_features/_state.npz")
+df = dataset_store.read_dataset("era5_cleaned", start=state["last_time"].strftime("%Y-%m"))
+df, state = compute_features(df[df["time"] > state["last_time"]].reset_index(drop=True), state)
+dataset_store.write_partitions(df, "era5_features", mode="append")
+"""
+
+
+def assert_same(expected: pd.DataFrame, actual: pd.DataFrame, what: str) -> None:
+    if len(expected) != len(actual):
+        raise AssertionError(f"{what}: {len(actual):,} rows, expected {len(expected):,}")
+    for col in FEATURE_COLS:
+        if not np.array_equal(expected[col].to_numpy(), actual[col].to_numpy(), equal_nan=True):
+            raise AssertionError(f"{what}: {col} differs from a full recompute")
+
+
+def check_in_process(df: pd.DataFrame) -> None:
+    start = time.perf_counter()
+    full, _ = compute_features(df.copy())
+    t_full = time.perf_counter() - start
+
+    month_key = df["time"].dt.to_period("M")
+    state, pieces, t_last = None, [], 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, "_state.npz")
+        for period in month_key.unique():
+            chunk = df[month_key == period].copy()
+            if state is not None:
+                state = load_state(state_path)   # round-trip through disk like --append does
+            start = time.perf_counter()
+            chunk, state = compute_features(chunk, state)
+            t_last = time.perf_counter() - start
+            save_state(state_path, state)
+            pieces.append(chunk)
+
+    assert_same(full, pd.concat(pieces), "monthly compute_features")
+    print(f"✅ {month_key.nunique()} monthly appends are bit-identical to a full recompute ({len(df):,} rows)")
+    print(f"   full recompute {t_full:6.3f} s   one-month append {t_last:6.3f} s")
+
+
+def check_script(df: pd.DataFrame) -> None:
+    script = os.path.join(REPO_ROOT, "era5_features.py")
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    month_key = df["time"].dt.to_period("M")
+    periods = month_key.unique()
+    with tempfile.TemporaryDirectory() as tmp:
+        def run(*args):
+            subprocess.run([sys.executable, *args], cwd=tmp, env=env, check=True, stdout=subprocess.DEVNULL)
+
+        for i, period in enumerate(periods):
+            dataset_store.write_partitions(df[month_key == period], os.path.join(tmp, "era5_cleaned"))
+            if i == len(periods) // 2 and i > 0:
+                run("-c", CRASHED_APPEND)
+            run(script, "--append")
+        run(script, "--output", "era5_full")
+
+        key = ["time"] + [c for c in SPACE_COLS if c in df.columns]
+        appended, full = (dataset_store.read_dataset(os.path.join(tmp, name)).sort_values(key, ignore_index=True)
+                          for name in ("era5_features", "era5_full"))
+    assert_same(full, appended, "era5_features.py --append")
+    print(f"✅ era5_features.py --append over {len(periods)} months, one of them interrupted before saving its "
+          f"state, matches a full run ({len(appended):,} rows)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check era5_features.py --append against a full recompute")
+    parser.add_argument("months", type=int, nargs="?", default=12, help="synthetic months (13x25 grid)")
+    parser.add_argument("--input", help="cleaned dataset to use instead of synthetic data")
+    args = parser.parse_args()
+
+    if args.input:
+        df = dataset_store.read_table(args.input)
+    else:
+        df = synthetic_cleaned(args.months, 13, 25)
+        # Knock out a few values so NaN handling is exercised across month boundaries
+        df.loc[df.sample(frac=0.001, random_state=0).index, ["windspeed", "temperature_C"]] = np.nan
+    check_in_process(df)
+    check_script(df)
@@ -0,0 +1,106 @@
+"""
+bench_flat_trees.py
+sklearn predict vs flat_trees.FlatEnsemble on the tree models predict.py
+serves: RandomForest (200 fully grown trees), exact GradientBoosting (300
+trees) and the hist backend. For each it reports
+  - the largest difference from sklearn's predictions, with and without NaN inputs
+  - the latency of one predict call at 1 to 10,000 rows (best of several)
+  - the in-memory size of the ensemble both ways
+then opens the registered RandomForest in a fresh process, pickled vs
+compiled, and reports time to first prediction and peak RSS.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_registry import MEASURE  # noqa: E402
+from bench_train import REPO_ROOT  # noqa: E402
+from boosting import fit_booster, make_booster  # noqa: E402
+from era5_features import FEATURES  # noqa: E402
+from flat_trees import compile_ensemble  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402
+
+BATCH_SIZES = [1, 10, 100, 1_000, 10_000]
+
+OPEN = ("import numpy as np; from model_registry import ModelRegistry; "
+        "ModelRegistry({root!r}).load('RandomForest', compiled={compiled}).predict(np.zeros((1, {d})))")
+
+
+def synthetic_xy(rows: int, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, len(FEATURES)))
+    y = 2.0 * X[:, 0] + np.sin(3 * X[:, 1]) + X[:, 2] * X[:, 3] + rng.normal(scale=0.3, size=rows)
+    return X, y
+
+
+def latency(fn, X: np.ndarray, budget: float = 0.5) -> float:
+    """Best single-call time, repeating for about `budget` seconds."""
+    best, spent, calls = np.inf, 0.0, 0
+    while spent < budget or calls < 3:
+        start = time.perf_counter()
+        fn(X)
+        elapsed = time.perf_counter() - start
+        best, spent, calls = min(best, elapsed), spent + elapsed, calls + 1
+    return best
+
+
+def sklearn_nbytes(model) -> int:
+    trees = getattr(model, "estimators_", None)
+    if trees is not None:
+        trees = np.ravel(trees)
+        return sum(t.tree_.__getstate__()["nodes"].nbytes + t.tree_.value.nbytes for t in trees)
+    return sum(p.nodes.nbytes for (p,) in model._predictors)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    X, y = synthetic_xy(rows)
+    X_test, _ = synthetic_xy(10_000, seed=1)
+    X_nan = X_test.copy()
+    X_nan[np.random.default_rng(2).random(X_nan.shape) < 0.05] = np.nan
+
+    models = {
+        "RandomForest(200)": RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=1).fit(X, y),
+        "GradientBoosting exact": fit_booster(make_booster("exact"), X, y),
+        "GradientBoosting hist": fit_booster(make_booster("hist"), X, y),
+    }
+    print(f"🔹 {rows:,} training rows, {len(FEATURES)} features, one core")
+
+    for name, model in models.items():
+        flat = compile_ensemble(model)
+        diff = np.abs(model.predict(X_test) - flat.predict(X_test)).max()
+        try:
+            nan_diff = f"{np.abs(model.predict(X_nan) - flat.predict(X_nan)).max():.1e}"
+        except ValueError:   # the exact booster rejects NaN inputs
+            nan_diff = "n/a"
+        print(f"\n🔹 {name}: {flat.n_trees} trees, {flat.levels} levels, {len(flat.arrays['child']):,} nodes, "
+              f"{sklearn_nbytes(model) / 1e6:.1f} MB in sklearn vs {flat.nbytes / 1e6:.1f} MB flat; "
+              f"max |diff| {diff:.1e} (with NaN {nan_diff})")
+        for n in BATCH_SIZES:
+            t_sk, t_flat = latency(model.predict, X_test[:n]), latency(flat.predict, X_test[:n])
+            print(f"   {n:>6,} rows   sklearn {t_sk * 1e3:8.2f} ms   flat {t_flat * 1e3:8.2f} ms   "
+                  f"x{t_sk / t_flat:5.1f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "model_registry")
+        ModelRegistry(root).register("RandomForest", models["RandomForest(200)"])
+        path = os.path.join(root, "RandomForest", "v0001")
+        pickle_mb = os.path.getsize(os.path.join(path, "model.joblib")) / 1e6
+        flat_dir = os.path.join(path, "flat")
+        flat_mb = sum(os.path.getsize(os.path.join(flat_dir, f)) for f in os.listdir(flat_dir)) / 1e6
+        print(f"\n🔹 Registered RandomForest: model.joblib {pickle_mb:.0f} MB, flat/ {flat_mb:.0f} MB; "
+              f"fresh process, load + first single-row predict")
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+        for compiled in (False, True):
+            script = MEASURE.format(code=OPEN.format(root=root, compiled=compiled, d=len(FEATURES)))
+            elapsed, rss = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True,
+                                          check=True).stdout.split()
+            label = "flat arrays, mmap" if compiled else "joblib, mmap_mode='r'"
+            print(f"   {label:<24} {float(elapsed):6.2f} s   peak RSS {float(rss):7.1f} MB")
@@ -0,0 +1,156 @@
+"""
+bench_gaps.py
+Gap and duplicate checks on a synthetic multi-year 3-hourly grid, written as
+monthly partitions, with holes punched in it:
+  - whole time steps missing from every cell
+  - runs of 1-12 steps missing from single cells
+  - a few duplicated rows
+Runs three versions of validate_era5_full.py in their own processes, and
+reports wall time and peak RSS for each:
+  - the original, one global time index with no cells
+  - the streaming scanner, report only
+  - the streaming scanner writing a repaired copy
+Then checks the scanner's gap list against a per-cell pandas reference, and
+its filled values against pandas interpolate(), on the first year.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset_store  # noqa: E402
+from bench_train import REPO_ROOT, run_tree_measured  # noqa: E402
+from gaps import GapScanner  # noqa: E402
+
+# The validate_era5_full.py this stage replaces
+LEGACY = """
+import pandas as pd
+import dataset_store
+df = dataset_store.read_table("era5_cleaned", columns=["time"])
+df = df.drop_duplicates(subset="time", keep="first").sort_values("time")
+expected_range = pd.date_range(start=df["time"].min(), end=df["time"].max(), freq="3h")
+missing = expected_range.difference(df["time"])
+pd.DataFrame(missing, columns=["missing_time"]).to_csv("missing_timestamps.csv", index=False)
+"""
+
+STEP = pd.Timedelta("3h")
+
+
+def write_gappy_grid(root: str, years: int, n_lat: int, n_lon: int, seed: int = 0) -> tuple:
+    """Write the dataset month by month; returns (rows written, rows a gap-free grid would have)."""
+    rng = np.random.default_rng(seed)
+    lat, lon = np.meshgrid(np.linspace(49, 61, n_lat), np.linspace(-8, 2, n_lon), indexing="ij")
+    lat, lon = lat.ravel(), lon.ravel()
+    n_cells = len(lat)
+    rows = full = 0
+    for period in pd.period_range("2000-01", periods=12 * years, freq="M"):
+        times = pd.date_range(period.start_time, period.end_time.floor("3h"), freq="3h")
+        t = len(times)
+        present = np.ones((t, n_cells), dtype=bool)
+        present[rng.random(t) < 0.002] = False                      # time steps missing everywhere
+        for cell, start, length in zip(rng.integers(0, n_cells, 20), rng.integers(0, t, 20),
+                                       rng.integers(1, 13, 20)):    # runs missing from one cell
+            present[start:start + length, cell] = False
+        ti, ci = np.nonzero(present)
+        hours = (times.dayofyear.to_numpy() * 24 + times.hour.to_numpy())[ti]
+        df = pd.DataFrame({
+            "time": times[ti],
+            "latitude": lat[ci],
+            "longitude": lon[ci],
+            "windspeed": (6 + 2 * np.sin(hours / 24 * 2 * np.pi / 5) + rng.normal(0, 1, len(ti))).astype(np.float32),
+            "temperature_C": (10 + 8 * np.sin(hours / 8760 * 2 * np.pi) + rng.normal(0, 1, len(ti))).astype(np.float32),
+            "pressure_hPa": (1013 + rng.normal(0, 8, len(ti))).astype(np.float32),
+        })
+        dup = df.sample(n=max(1, len(df) // 20_000), random_state=int(rng.integers(1 << 31)))
+        df = pd.concat([df, dup.assign(windspeed=np.float32(-1))]).sort_values(["time", "latitude", "longitude"],
+                                                                                 kind="stable")
+        dataset_store.write_partitions(df, root)
+        rows += len(df)
+        full += t * n_cells
+    return rows, full
+
+
+def reference_gaps(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-cell pandas: reindex each cell onto the full time range and measure the runs of missing steps."""
+    df = df.drop_duplicates(["latitude", "longitude", "time"])
+    axis = pd.date_range(df["time"].min(), df["time"].max(), freq=STEP)
+    out = []
+    for (la, lo), cell in df.groupby(["latitude", "longitude"]):
+        missing = ~axis.isin(cell["time"])
+        edges = np.diff(np.concatenate([[0], missing.astype(np.int8), [0]]))
+        for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            out.append((la, lo, axis[start], end - start))
+    return pd.DataFrame(out, columns=["latitude", "longitude", "start", "steps"])
+
+
+def check(root: str, max_fill: int) -> None:
+    first_year = dataset_store.read_dataset(root, start="2000-01", end="2000-12")
+    scanner = GapScanner(["latitude", "longitude"], STEP, max_fill)
+    repaired = pd.concat([scanner.scan(batch) for batch in dataset_store.iter_batches(root, 100_000)
+                          if batch["time"].iloc[0].year == 2000], ignore_index=True)
+    report = scanner.report()
+    ref = reference_gaps(first_year)
+    key = ["latitude", "longitude", "start", "steps"]
+    ref["start"] = ref["start"].astype(report["start"].dtype)
+    same_gaps = report[key].sort_values(key, ignore_index=True).equals(ref.sort_values(key, ignore_index=True))
+
+    # Filled values against pandas: first copy kept, linear interpolation limited to gaps of <= max_fill
+    expected = first_year.drop_duplicates(["latitude", "longitude", "time"]).set_index("time")
+    worst, first_kept = 0.0, True
+    for (la, lo), cell in expected.groupby(["latitude", "longitude"]):
+        series = cell["windspeed"].astype(np.float64).asfreq(STEP)
+        gap_run = series.isna().groupby(series.notna().cumsum()).transform("sum")
+        interpolated = series.interpolate(limit_area="inside")[series.isna() & (gap_run <= max_fill)]
+        ours = repaired[(repaired["latitude"] == la) & (repaired["longitude"] == lo)].set_index("time")
+        worst = max(worst, float(np.abs(ours.loc[interpolated.index, "windspeed"] - interpolated).max() or 0.0))
+        first_kept &= bool((ours["windspeed"] != -1).all())
+    print(f"   first year: {len(report):,} gaps, same as per-cell pandas: {same_gaps}; filled values max |diff| "
+          f"vs interpolate() {worst:.1e}; duplicates resolved to the first copy: {first_kept}")
+
+
+def check_station_files() -> None:
+    """Per-station input: a station read later that starts before the first one moves the mask's origin back."""
+    def station(name, start, periods, skip=()):
+        times = pd.date_range(start, periods=periods, freq=STEP).delete(list(skip))
+        return pd.DataFrame({"time": times, "station": name, "windspeed": np.arange(len(times), dtype=np.float64)})
+
+    batches = [station("A", "2020-01-01", 248), station("A", "2020-02-01", 232, skip=[10]),
+               station("B", "2019-12-31", 300, skip=[100, 101])]
+    for repair, action in ((True, "filled"), (False, "fillable")):
+        scanner = GapScanner(["station"], STEP, max_fill=2)
+        for batch in batches:
+            scanner.scan(batch, repair=repair)
+        report = scanner.report()
+        inner = report[report["action"] == action]
+        assert sorted(zip(inner["station"], inner["steps"])) == [("A", 1), ("B", 2)], report
+        assert report.loc[report["station"] == "A", "action"].tolist() == ["leading", action], report
+    print(f"   station files, the second starting before the first: {len(report)} gaps, as expected")
+
+
+if __name__ == "__main__":
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    n_lat, n_lon = (int(v) for v in (sys.argv[2:4] or (13, 25)))
+    script = os.path.join(REPO_ROOT, "validate_era5_full.py")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows, full = write_gappy_grid(os.path.join(tmp, "era5_cleaned"), years, n_lat, n_lon)
+        print(f"🔹 {years} years x {n_lat * n_lon} cells, 3-hourly: {rows:,} rows, "
+              f"{100 * (1 - rows / full):.2f}% of the grid missing (before duplicates)")
+
+        runs = [("original (global time index)", ["-c", LEGACY]),
+                ("scanner, report only", [script]),
+                ("scanner + repaired copy", [script, "--output", "era5_repaired"])]
+        for label, cmd in runs:
+            wall, rss = run_tree_measured([sys.executable] + cmd, cwd=tmp)
+            print(f"   {label:<30} {wall:6.2f} s   peak RSS {rss:7.1f} MB")
+
+        legacy = pd.read_csv(os.path.join(tmp, "missing_timestamps.csv"))
+        report = pd.read_csv(os.path.join(tmp, "gaps.csv"))
+        print(f"   original found {len(legacy):,} missing timestamps; the scanner found {len(report):,} gaps "
+              f"({report['steps'].sum():,} missing cell-steps, {int((report['action'] == 'filled').sum()):,} filled)")
+        check(os.path.join(tmp, "era5_cleaned"), max_fill=2)
+    check_station_files()
@@ -0,0 +1,87 @@
+"""
+bench_horizons.py
+Lag/lead design matrices for direct multi-horizon forecasting, built two ways
+on a synthetic grid:
+  pandas     one groupby-shift() column per lag and per lead (56 + 24 copies)
+  tensor     horizons.HorizonTensor: float32 per-cell series and strided views,
+             materialized batch by batch
+Reports build time and peak traced memory, checks that both give the same rows,
+and times a streamed BatchRidge fit over every training origin.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_features import synthetic_cleaned  # noqa: E402
+from horizons import DEFAULT_HORIZONS, DEFAULT_WINDOW, BatchRidge, HorizonTensor  # noqa: E402
+
+
+def shifted_columns(df: pd.DataFrame, window: int, steps: list) -> pd.DataFrame:
+    """The shift() approach: every lag and lead as its own float64 column, rows with gaps dropped."""
+    df = df.sort_values(["latitude", "longitude", "time"], ignore_index=True)
+    cells = df.groupby(["latitude", "longitude"], sort=False)["windspeed"]
+    columns = {f"windspeed_t-{k}": cells.shift(k) for k in range(window - 1, -1, -1)}
+    columns.update({f"lead_{s}": cells.shift(-s) for s in steps})
+    out = pd.concat([df[["time", "latitude", "longitude"]], pd.DataFrame(columns)], axis=1)
+    return out.dropna(ignore_index=True)
+
+
+def measured(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    out = fn(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def streamed_fit(tensor: HorizonTensor, batch_size: int) -> tuple:
+    mask = tensor.origins()
+    model = BatchRidge()
+    for _, _, X, Y in tensor.batches(mask, batch_size):
+        model.partial_fit(X, Y)
+    return model, int(mask.sum())
+
+
+if __name__ == "__main__":
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    n_lat, n_lon = (int(v) for v in (sys.argv[2:4] or (13, 25)))
+    df = synthetic_cleaned(months, n_lat, n_lon)[["time", "latitude", "longitude", "windspeed",
+                                                 "temperature_C", "pressure_hPa"]]
+    steps = [h // 3 for h in DEFAULT_HORIZONS]
+    raw_mb = df["windspeed"].to_numpy(dtype=np.float32).nbytes / 1e6
+    print(f"🔹 {months} months x {n_lat * n_lon} cells = {len(df):,} rows; {DEFAULT_WINDOW}-step window, "
+          f"{len(steps)} horizons; windspeed series {raw_mb:.1f} MB as float32")
+
+    shifted, t_pd, mem_pd = measured(shifted_columns, df, DEFAULT_WINDOW, steps)
+    print(f"   pandas shift() columns    {t_pd:7.2f} s  peak {mem_pd:8.1f} MB  "
+          f"result {shifted.memory_usage(index=False).sum() / 1e6:8.1f} MB")
+
+    tensor, t_build, mem_build = measured(HorizonTensor.from_frame, df)
+    print(f"   HorizonTensor build       {t_build:7.2f} s  peak {mem_build:8.1f} MB  "
+          f"held {tensor.nbytes / 1e6:8.1f} MB (views: {tensor.lags['windspeed'].nbytes / 1e6:,.0f} MB "
+          f"+ {tensor.leads.nbytes / 1e6:,.0f} MB if copied)")
+
+    for batch_size in (16_384, 65_536):
+        (model, n), t_fit, mem_fit = measured(streamed_fit, tensor, batch_size)
+        print(f"   BatchRidge, batches {batch_size:>6,}  {t_fit:5.2f} s  peak {mem_fit:8.1f} MB  "
+              f"{n:,} origins ({n / t_fit:,.0f}/s)")
+
+    # Same origins and values both ways (the tensor's inputs are float32)
+    mask = tensor.origins()
+    cells, ts = np.nonzero(mask)
+    X, Y = tensor.take(cells, ts)
+    key = pd.MultiIndex.from_arrays([tensor.cells["latitude"].to_numpy()[cells],
+                                     tensor.cells["longitude"].to_numpy()[cells], tensor.times[ts]])
+    ref = shifted.set_index(["latitude", "longitude", "time"]).loc[key]
+    lags = ref[[f"windspeed_t-{k}" for k in range(DEFAULT_WINDOW - 1, -1, -1)]].to_numpy(dtype=np.float32)
+    leads = ref[[f"lead_{s}" for s in steps]].to_numpy(dtype=np.float32)
+    same = len(ref) == len(shifted) and np.array_equal(X[:, :DEFAULT_WINDOW], lags) and np.array_equal(Y, leads)
+    print(f"   same {len(ref):,} rows as pandas: {same}")
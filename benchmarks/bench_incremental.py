@@ -0,0 +1,61 @@
+"""
+bench_incremental.py
+Nightly incremental updates (update_models.py) against full refits
+(train_models.py). A year of synthetic features is fully trained, then new
+days are appended and folded in with update_models.py. Reports each step's
+wall time, peak RSS and new rows, and the drift of every updated model
+against the latest full refit.
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset_store  # noqa: E402
+from bench_features import synthetic_cleaned  # noqa: E402
+from bench_train import REPO_ROOT, run_tree_measured  # noqa: E402
+from era5_features import add_features  # noqa: E402
+
+MODELS = ["ApproxSVR", "RandomForest", "GradientBoosting"]
+
+
+def step(label: str, script: str, args: list, cwd: str, rows: int = None) -> None:
+    wall, rss = run_tree_measured([sys.executable, os.path.join(REPO_ROOT, script)] + args, cwd=cwd)
+    rows = f"{rows:9,d} rows" if rows is not None else " " * 14
+    print(f"   {label:<30} {rows}  wall {wall:6.1f} s  peak RSS {rss:7.1f} MB")
+    report = os.path.join(cwd, "drift_report.csv")
+    if script == "update_models.py" and os.path.exists(report):
+        for _, r in pd.read_csv(report).iterrows():
+            print(f"      {r['Model']:<17} {r['Parent']} -> {r['Version']}  {r['New rows']:7,d} new rows  "
+                  f"RMSE {r['RMSE']:.4f}  full refit {r['Full refit']} {r['Full RMSE']:.4f}  "
+                  f"drift {r['Δ RMSE']:+.4f}")
+        os.remove(report)
+
+
+if __name__ == "__main__":
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    n_lat, n_lon = (int(v) for v in (sys.argv[2:4] or (6, 6)))
+
+    df = add_features(synthetic_cleaned(months + 1, n_lat, n_lon))
+    cutoff = df["time"].min() + pd.DateOffset(months=months)
+    history, future = df[df["time"] < cutoff], df[df["time"] >= cutoff]
+    train = ["--models", *MODELS, "--boosting", "hist"]
+    print(f"🔹 {months} months x {n_lat * n_lon} cells = {len(history):,} rows of history, {os.cpu_count()} cores")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset_store.write_partitions(history, os.path.join(tmp, "era5_features"))
+        step("full refit (history)", "train_models.py", train, tmp, len(history))
+        step("catch-up update (test tail)", "update_models.py", [], tmp)
+
+        appended = 0
+        for days in (1, 7, 21):
+            new = future[(future["time"] >= cutoff + pd.Timedelta(days=appended))
+                         & (future["time"] < cutoff + pd.Timedelta(days=appended + days))]
+            dataset_store.write_partitions(new, os.path.join(tmp, "era5_features"), mode="append")
+            appended += days
+            step(f"update, +{days} day{'s' if days > 1 else ''}", "update_models.py", [], tmp, len(new))
+
+        step("full refit (history + 29 days)", "train_models.py", train, tmp, len(history) + len(future))
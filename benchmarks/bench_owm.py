@@ -0,0 +1,38 @@
+"""
+bench_owm.py
+Fetch forecasts for many sites from FakeOWMServer: sequential vs concurrent,
+then a warm refresh served from the on-disk cache.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from fake_owm import FakeOWMServer  # noqa: E402
+from owm_loader import fetch_forecasts  # noqa: E402
+
+
+if __name__ == "__main__":
+    n_sites = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    rng = np.random.default_rng(0)
+    sites = pd.DataFrame({"station": [f"site{i:04d}" for i in range(n_sites)],
+                          "lat": rng.uniform(53, 56, n_sites), "lon": rng.uniform(-6, 0, n_sites)})
+
+    with FakeOWMServer(latency=0.05, failure_rate=0.05) as server, tempfile.TemporaryDirectory() as tmp:
+        for concurrency in (1, 50):
+            start = time.perf_counter()
+            df = fetch_forecasts(sites, "test", url=server.url, concurrency=concurrency, rate=500, burst=50,
+                                 cache_dir=None)
+            print(f"🔹 {n_sites} sites, concurrency {concurrency:>2}: {time.perf_counter() - start:6.2f} s, {len(df)} rows")
+
+        fetch_forecasts(sites, "test", url=server.url, concurrency=50, rate=500, burst=50, cache_dir=tmp)
+        before = server.requests
+        start = time.perf_counter()
+        fetch_forecasts(sites, "test", url=server.url, concurrency=50, rate=500, burst=50, cache_dir=tmp)
+        print(f"   warm refresh (same issue cycle): {time.perf_counter() - start:6.2f} s, "
+              f"{server.requests - before} HTTP requests")
@@ -0,0 +1,58 @@
+"""
+bench_predict.py
+Peak memory and wall time of predict.py, in-memory vs --stream, at two input
+sizes. The streaming mode's peak should stay flat as the input grows.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset_store  # noqa: E402
+from bench_features import synthetic_cleaned  # noqa: E402
+from bench_train import REPO_ROOT, run_tree_measured  # noqa: E402
+from boosting import fit_booster, make_booster  # noqa: E402
+from era5_features import FEATURES, add_features  # noqa: E402
+from kernel_svr import ApproxKernelSVR  # noqa: E402
+from model_registry import REGISTRY_DIR, ModelRegistry  # noqa: E402
+
+
+def write_months(root: str, months: int, n_lat: int, n_lon: int) -> int:
+    """Write a features dataset one month at a time, so generating it stays small."""
+    rows = 0
+    for p in pd.period_range("2020-01", periods=months, freq="M"):
+        df = add_features(synthetic_cleaned(1, n_lat, n_lon))
+        df["time"] = df["time"] + (p.start_time - df["time"].min())
+        dataset_store.write_partitions(df, root)
+        rows += len(df)
+    return rows
+
+
+def train_small_models(directory: str, n_lat: int, n_lon: int) -> None:
+    df = add_features(synthetic_cleaned(1, n_lat, n_lon)).iloc[:20_000]
+    X, y = df[FEATURES].fillna(0).to_numpy(dtype=np.float64), df["windspeed"].to_numpy(dtype=np.float64)
+    scaler = StandardScaler().fit(X)
+    registry = ModelRegistry(os.path.join(directory, REGISTRY_DIR))
+    registry.register("ApproxSVR", ApproxKernelSVR(n_epochs=2).fit(scaler.transform(X), y), scaler=scaler)
+    registry.register("RandomForest", RandomForestRegressor(n_estimators=50, max_depth=12, random_state=0).fit(X, y))
+    registry.register("GradientBoosting", fit_booster(make_booster("hist"), X, y))
+
+
+if __name__ == "__main__":
+    n_lat, n_lon = 16, 16
+    script = os.path.join(REPO_ROOT, "predict.py")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        train_small_models(tmp, n_lat, n_lon)
+        for months in (2, 8):
+            dataset_store.clear(os.path.join(tmp, "new_era5_features"))
+            rows = write_months(os.path.join(tmp, "new_era5_features"), months, n_lat, n_lon)
+            for label, extra in [("in-memory", []), ("stream", ["--stream", "--chunk-size", "50000"])]:
+                wall, rss = run_tree_measured([sys.executable, script] + extra, cwd=tmp)
+                print(f"   {rows:>9,} rows  {label:<10} wall {wall:6.1f} s   peak RSS {rss:7.1f} MB")
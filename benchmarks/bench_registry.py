@@ -0,0 +1,62 @@
+"""
+bench_registry.py
+Startup cost of a 200-tree RandomForest, measured in a fresh process:
+compressed joblib, uncompressed joblib, uncompressed with mmap_mode="r", and
+ModelRegistry.lazy (metadata only, before the first predict).
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_train import REPO_ROOT  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402
+
+LOADERS = {
+    "joblib compress=3": "import joblib; joblib.load({path!r})",
+    "joblib uncompressed": "import joblib; joblib.load({path!r})",
+    "uncompressed, mmap_mode='r'": "import joblib; joblib.load({path!r}, mmap_mode='r')",
+    "registry lazy (metadata)": "from model_registry import ModelRegistry; ModelRegistry({root!r}).lazy('RandomForest')",
+    "registry first predict": "import numpy as np; from model_registry import ModelRegistry; "
+                              "ModelRegistry({root!r}).lazy('RandomForest').predict(np.zeros((1, 7)))",
+}
+
+# VmHWM rather than ru_maxrss: the latter keeps the (large) parent's peak across fork + exec
+MEASURE = """
+import time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+hwm = next(line for line in open("/proc/self/status") if line.startswith("VmHWM"))
+print(elapsed, int(hwm.split()[1]) / 1024)
+"""
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    rng = np.random.default_rng(0)
+    X, y = rng.normal(size=(rows, 7)), rng.normal(size=rows)
+    model = RandomForestRegressor(n_estimators=200, random_state=0, n_jobs=-1).fit(X, y)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        compressed, plain = os.path.join(tmp, "rf_c.pkl"), os.path.join(tmp, "rf.pkl")
+        joblib.dump(model, compressed, compress=3)
+        joblib.dump(model, plain)
+        root = os.path.join(tmp, "model_registry")
+        ModelRegistry(root).register("RandomForest", model)
+        print(f"🔹 RandomForest(200) on {rows:,} rows: {os.path.getsize(plain) / 1e6:.0f} MB uncompressed, "
+              f"{os.path.getsize(compressed) / 1e6:.0f} MB compressed")
+
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+        for label, code in LOADERS.items():
+            path = compressed if "compress=3" in label else plain
+            script = MEASURE.format(code=code.format(path=path, root=root))
+            elapsed, rss = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True,
+                                          check=True).stdout.split()
+            print(f"   {label:<30} {float(elapsed):6.2f} s   peak RSS {float(rss):7.1f} MB")
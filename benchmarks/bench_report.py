@@ -0,0 +1,85 @@
+"""
+bench_report.py
+Report rendering: the old serial full-resolution figures from predict.py vs
+report.build_report (LTTB, binned histograms, process pool). Reports wall
+time and the size of model_report.pdf.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from matplotlib.backends.backend_pdf import PdfPages  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from report import build_report  # noqa: E402
+
+MODELS = ["SVR", "RandomForest", "GradientBoosting"]
+
+
+def synthetic_predictions(path: str, years: int, cells: int, seed: int = 0) -> int:
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2018-01-01", periods=years * 2920, freq="3h")
+    wind = np.abs(6 + np.cumsum(rng.normal(0, 0.3, (len(times), cells)), axis=0) % 8 - 4)
+    df = pd.DataFrame({"time": np.repeat(times, cells), "windspeed": wind.ravel().astype(np.float32)})
+    for i, name in enumerate(MODELS):
+        df[f"{name}_Predicted"] = df["windspeed"] + rng.normal(0, 0.3 + 0.1 * i, len(df)).astype(np.float32)
+        df[f"{name}_Residuals"] = df["windspeed"] - df[f"{name}_Predicted"]
+    df.to_csv(path, index=False)
+    return len(df)
+
+
+def legacy_report(path: str, out_dir: str, report: str) -> None:
+    """The figures predict.py used to draw inline, one after another, at full resolution."""
+    new_data = pd.read_csv(path, parse_dates=["time"])
+    y_true = new_data["windspeed"]
+    with PdfPages(report) as pdf:
+        for name in MODELS:
+            plt.figure(figsize=(12,6))
+            plt.plot(new_data["time"], y_true, label="Actual Windspeed", color="blue")
+            plt.plot(new_data["time"], new_data[f"{name}_Predicted"], label=f"{name} Predicted", color="red",
+                     linestyle="--")
+            plt.tight_layout()
+            plt.savefig(os.path.join(out_dir, f"{name}_actual_vs_predicted.png"))
+            pdf.savefig()
+            plt.close()
+
+            plt.figure(figsize=(12,6))
+            plt.plot(new_data["time"], new_data[f"{name}_Residuals"], label="Residuals", color="green")
+            plt.axhline(0, color="black", linestyle="--")
+            plt.tight_layout()
+            plt.savefig(os.path.join(out_dir, f"{name}_residuals_over_time.png"))
+            pdf.savefig()
+            plt.close()
+
+            plt.figure(figsize=(8,6))
+            plt.hist(new_data[f"{name}_Residuals"], bins=30, color="purple", alpha=0.7)
+            plt.tight_layout()
+            plt.savefig(os.path.join(out_dir, f"{name}_residual_distribution.png"))
+            pdf.savefig()
+            plt.close()
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        for years, cells in [(5, 1), (5, 16)]:
+            path = os.path.join(tmp, "predictions.csv")
+            rows = synthetic_predictions(path, years, cells)
+            print(f"🔹 {years} years x {cells} cells: {rows:,} rows, {len(MODELS)} models")
+
+            runs = [("legacy (serial, full res)", lambda out, pdf: legacy_report(path, out, pdf)),
+                    ("report.py png+pdf", lambda out, pdf: build_report(path, None, out, pdf)),
+                    ("report.py png only", lambda out, pdf: build_report(path, None, out, pdf, ["png"]))]
+            for label, run in runs:
+                out_dir = tempfile.mkdtemp(dir=tmp)
+                pdf = os.path.join(out_dir, "model_report.pdf")
+                start = time.perf_counter()
+                run(out_dir, pdf)
+                size = f"{os.path.getsize(pdf) / 1e6:6.2f} MB PDF" if os.path.exists(pdf) else ""
+                print(f"   {label:<26} {time.perf_counter() - start:6.1f} s  {size}")
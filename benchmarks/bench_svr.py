@@ -0,0 +1,62 @@
+"""
+bench_svr.py
+Exact RBF SVR vs ApproxKernelSVR (Nystroem and random Fourier features):
+fit time, predict latency and test RMSE at several training-set sizes.
+
+The target is the next 3-hourly windspeed of the same grid cell. Predicting
+windspeed from itself, as train_models.py does, is close to linear and leaves
+exact SVR with few support vectors, which hides how it scales.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVR
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_features import synthetic_cleaned  # noqa: E402
+from era5_features import FEATURES, add_features  # noqa: E402
+from kernel_svr import ApproxKernelSVR  # noqa: E402
+
+EXACT_LIMIT = 20_000   # exact SVR beyond this takes minutes
+
+
+def measure(model, X_train, y_train, X_test, y_test) -> tuple:
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit = time.perf_counter() - start
+    start = time.perf_counter()
+    pred = model.predict(X_test)
+    latency = (time.perf_counter() - start) / len(X_test) * 1e6
+    return fit, latency, float(np.sqrt(np.mean((pred - y_test) ** 2)))
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [2_000, 5_000, 10_000, 20_000, 40_000]
+    n_test = 5_000
+
+    df = add_features(synthetic_cleaned(months=max(2, -(-(max(sizes) + n_test) // 26_000) * 12), n_lat=3, n_lon=8))
+    df["target"] = df.groupby(["latitude", "longitude"])["windspeed"].shift(-1)
+    df = df.dropna(subset=["target"])
+    X = df[FEATURES].fillna(0).to_numpy(dtype=np.float64)
+    y = df["target"].to_numpy(dtype=np.float64)
+    X_test, y_test = X[-n_test:], y[-n_test:]
+
+    print(f"{'rows':>7} {'model':<10} {'fit (s)':>8} {'predict (µs/row)':>17} {'RMSE':>8} {'gap':>8}")
+    for n in sizes:
+        scaler = StandardScaler().fit(X[:n])
+        X_train, X_eval = scaler.transform(X[:n]), scaler.transform(X_test)
+
+        models = {"nystroem": ApproxKernelSVR(method="nystroem"), "rff": ApproxKernelSVR(method="rff")}
+        if n <= EXACT_LIMIT:
+            models = {"exact": SVR(kernel="rbf", C=100, gamma=0.1, epsilon=0.1), **models}
+
+        exact_rmse = None
+        for name, model in models.items():
+            fit, latency, rmse = measure(model, X_train, y[:n], X_eval, y_test)
+            exact_rmse = rmse if name == "exact" else exact_rmse
+            gap = f"{rmse - exact_rmse:+8.4f}" if exact_rmse is not None else f"{'-':>8}"
+            print(f"{n:>7} {name:<10} {fit:8.2f} {latency:17.2f} {rmse:8.4f} {gap}")
@@ -0,0 +1,59 @@
+"""
+bench_train.py
+Wall-clock and peak memory (summed over the process tree) of train_models.py,
+sequential vs parallel, on a synthetic feature dataset.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dataset_store  # noqa: E402
+from bench_features import synthetic_cleaned  # noqa: E402
+from era5_features import add_features  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_tree_measured(cmd: list, cwd: str, interval: float = 0.05, pythonpath: str = REPO_ROOT) -> tuple:
+    """Run a command; return (wall seconds, peak RSS in MB summed over it and its children)."""
+    env = dict(os.environ, PYTHONPATH=pythonpath)
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL, env=env)
+    root = psutil.Process(proc.pid)
+    peak = 0
+    while proc.poll() is None:
+        try:
+            procs = [root] + root.children(recursive=True)
+            peak = max(peak, sum(p.memory_info().rss for p in procs if p.is_running()))
+        except psutil.Error:
+            pass
+        time.sleep(interval)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{cmd} exited with status {proc.returncode}")
+    return time.perf_counter() - start, peak / 1e6
+
+
+def write_features(root: str, months: int, n_lat: int, n_lon: int) -> int:
+    df = add_features(synthetic_cleaned(months, n_lat, n_lon))
+    dataset_store.write_partitions(df, root)
+    return len(df)
+
+
+if __name__ == "__main__":
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    n_lat, n_lon = (int(v) for v in (sys.argv[2:4] or (3, 4)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = write_features(os.path.join(tmp, "era5_features"), months, n_lat, n_lon)
+        print(f"🔹 {rows:,} feature rows, {os.cpu_count()} cores")
+
+        script = os.path.join(REPO_ROOT, "train_models.py")
+        for label, extra in [("sequential", ["--sequential"]), ("parallel", []), ("pool x3", ["--cores", "3"])]:
+            wall, rss = run_tree_measured([sys.executable, script] + extra, cwd=tmp)
+            print(f"   {label:<11} wall {wall:6.1f} s   peak RSS (tree) {rss:7.1f} MB")
@@ -0,0 +1,39 @@
+"""
+bench_tuning.py
+Successive halving vs scoring every candidate on every fold: trials run,
+wall time and the validation RMSE of the configuration each one picks.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.model_selection import ParameterSampler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_features import synthetic_cleaned  # noqa: E402
+from era5_features import FEATURES, add_features  # noqa: E402
+from tune_models import SEARCH_SPACES, TrialStore, cache_folds, successive_halving, walk_forward_folds  # noqa: E402
+
+
+if __name__ == "__main__":
+    model = sys.argv[1] if len(sys.argv) > 1 else "RandomForest"
+    n_candidates, n_folds = 27, 5
+
+    df = add_features(synthetic_cleaned(4, 3, 4)).sort_values("time", kind="stable")
+    X = df[FEATURES].fillna(0).to_numpy(dtype=np.float64)
+    y = df["windspeed"].to_numpy(dtype=np.float64)
+    candidates = list(ParameterSampler(SEARCH_SPACES[model], n_candidates, random_state=0))
+    print(f"🔹 {model}: {len(X):,} rows, {n_candidates} candidates, {n_folds} folds, {os.cpu_count()} cores")
+
+    with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(os.cpu_count()) as pool:
+        fold_dirs = cache_folds(X, y, walk_forward_folds(df["time"].to_numpy(), n_folds), tmp)
+        for label, min_folds in [("exhaustive", n_folds), ("halving", 1)]:
+            store = TrialStore(os.path.join(tmp, f"{label}.jsonl"), "bench")
+            start = time.perf_counter()
+            ranked = successive_halving(model, candidates, fold_dirs, store, pool, eta=3, min_folds=min_folds)
+            print(f"   {label:<11} {len(store.results):3d} trials  {time.perf_counter() - start:6.1f} s  "
+                  f"best RMSE {ranked['RMSE'].iloc[0]:.4f}  {ranked['params'].iloc[0]}")
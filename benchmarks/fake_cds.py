@@ -0,0 +1,43 @@
+"""
+fake_cds.py
+Local stand-in for cdsapi.Client that simulates queue latency, transient
+failures and oversized-request rejections, writing synthetic NetCDF output.
+"""
+
+import random
+import threading
+import time
+
+import pandas as pd
+
+from synthetic import make_era5_month
+
+
+class FakeCDSClient:
+    def __init__(self, latency: float = 0.5, failure_rate: float = 0.1, max_days: int = None,
+                 n_lat: int = 13, n_lon: int = 25, seed: int = 0):
+        self.latency = latency            # seconds for a full-month request
+        self.failure_rate = failure_rate  # probability a request fails transiently
+        self.max_days = max_days          # requests longer than this are always rejected
+        self.n_lat = n_lat
+        self.n_lon = n_lon
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def retrieve(self, name: str, request: dict, target: str) -> None:
+        days = request["day"]
+        with self.lock:
+            self.calls += 1
+            fail = self.rng.random() < self.failure_rate
+
+        time.sleep(self.latency * len(days) / 31)
+        if self.max_days is not None and len(days) > self.max_days:
+            raise RuntimeError(f"request too large ({len(days)} days)")
+        if fail:
+            raise RuntimeError("simulated CDS queue failure")
+
+        year, month = int(request["year"]), int(request["month"])
+        ds = make_era5_month(year, month, self.n_lat, self.n_lon)
+        day = pd.DatetimeIndex(ds["valid_time"].values).strftime("%d")
+        ds.isel(valid_time=day.isin(days)).to_netcdf(target)
@@ -0,0 +1,57 @@
+"""
+fake_owm.py
+Local stand-in for the OpenWeatherMap forecast endpoint, with configurable
+latency and a share of 429/503 responses, run in a background thread.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_payload(lat: float, lon: float, start: int = 1704067200, steps: int = 40) -> dict:
+    rng = random.Random(f"{lat:.4f},{lon:.4f}")
+    return {"cod": "200", "cnt": steps, "list": [{
+        "dt": start + i * 10800,
+        "main": {"temp": round(8 + rng.gauss(0, 3), 2), "pressure": 1013},
+        "wind": {"speed": round(abs(rng.gauss(6, 3)), 2), "deg": rng.randrange(360)},
+    } for i in range(steps)]}
+
+
+class FakeOWMServer:
+    def __init__(self, latency: float = 0.05, failure_rate: float = 0.0):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(latency)
+                if random.random() < failure_rate:
+                    self.send_response(random.choice([429, 503]))
+                    self.end_headers()
+                    return
+                query = parse_qs(urlparse(self.path).query)
+                body = json.dumps(make_payload(float(query["lat"][0]), float(query["lon"][0]))).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.requests = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/data/2.5/forecast"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
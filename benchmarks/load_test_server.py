@@ -0,0 +1,106 @@
+"""
+load_test_server.py
+Load-test predict_server.py: many concurrent clients post small feature
+batches for a fixed time, then report p50/p99 latency and throughput along
+with the server's own /metrics.
+
+  python load_test_server.py                       # start local instances with small synthetic models
+  python load_test_server.py --url http://127.0.0.1:8765
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_predict import train_small_models  # noqa: E402
+from bench_train import REPO_ROOT  # noqa: E402
+from era5_features import FEATURES  # noqa: E402
+
+
+async def client(session: aiohttp.ClientSession, url: str, rows: int, stop: float, latencies: list, seed: int):
+    rng = np.random.default_rng(seed)
+    while time.monotonic() < stop:
+        payload = {"features": rng.normal(5, 2, (rows, len(FEATURES))).round(3).tolist()}
+        start = time.perf_counter()
+        async with session.post(f"{url}/predict", json=payload) as response:
+            response.raise_for_status()
+            await response.json()
+        latencies.append(time.perf_counter() - start)
+
+
+async def load_test(url: str, concurrency: int, rows: int, duration: float) -> dict:
+    latencies = []
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        stop = time.monotonic() + duration
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session, url, rows, stop, latencies, i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        async with session.get(f"{url}/metrics") as response:
+            server = await response.json()
+    ms = np.array(latencies) * 1000
+    return {"requests": len(ms), "p50": np.percentile(ms, 50), "p99": np.percentile(ms, 99),
+            "req/s": len(ms) / elapsed, "rows/s": len(ms) * rows / elapsed, "server": server}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(cwd: str, max_wait_ms: float, max_batch_rows: int) -> tuple:
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, "predict_server.py"), "--port", str(port),
+                             "--max-wait-ms", str(max_wait_ms), "--max-batch-rows", str(max_batch_rows)],
+                            cwd=cwd, env=dict(os.environ, PYTHONPATH=REPO_ROOT),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(600):
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                return proc, url
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def report(label: str, result: dict) -> None:
+    server = result["server"]
+    print(f"   {label:<22} {result['requests']:6d} req  p50 {result['p50']:6.1f} ms  p99 {result['p99']:6.1f} ms  "
+          f"{result['req/s']:7.1f} req/s  {result['rows/s']:9,.0f} rows/s  "
+          f"mean batch {server['mean_batch_rows'] or 0:6.1f} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="test an already running server instead of starting local ones")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rows", type=int, default=10, help="rows per request")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    args = parser.parse_args()
+
+    if args.url:
+        report(args.url, asyncio.run(load_test(args.url, args.concurrency, args.rows, args.duration)))
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        train_small_models(tmp, 8, 8)
+        print(f"🔹 {args.concurrency} clients x {args.rows} rows per request, {args.duration:.0f} s per scenario")
+        scenarios = [("one request per batch", 0, 1), ("coalesce queued", 0, 4096), ("also wait 5 ms", 5, 4096)]
+        for label, max_wait_ms, max_batch_rows in scenarios:
+            proc, url = start_server(tmp, max_wait_ms, max_batch_rows)
+            try:
+                report(label, asyncio.run(load_test(url, args.concurrency, args.rows, args.duration)))
+            finally:
+                proc.terminate()
+                proc.wait()
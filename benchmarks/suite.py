@@ -0,0 +1,221 @@
+"""
+suite.py
+End-to-end benchmark of every pipeline stage on synthetic data.
+
+For each scale, a fresh workspace gets synthetic ERA5 NetCDF, MIDAS station
+CSVs and an OWM forecast CSV (synthetic.py). The stages then run there in
+pipeline order, each as its own process:
+  era5_loader.py -> validate_era5_full.py -> era5_features.py (and its --append
+  check, bench_features_append.py, which fails the run on a mismatch) -> train_models.py
+  -> predict.py (in memory and --stream) -> report.py -> power_curve.py
+  -> train_horizons.py (DirectRidge) -> forecast.py
+  scripts/midas_loader.py (cold and warm cache) -> scripts/preprocess_merge.py
+For every stage it records wall time, CPU time and peak RSS summed over the
+process tree. Results are written as JSON. --compare checks them against a
+stored baseline and exits with status 1 if any stage got slower or bigger
+than --threshold allows. --trace also collects every stage's spans (see
+instrumentation.py) into one Chrome trace per scale.
+
+  python suite.py --scales small medium --output baseline.json
+  python suite.py --scales small medium --compare baseline.json
+  python suite.py --results new.json --compare baseline.json     # compare only
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+try:
+    import resource   # Unix only
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_power import synthetic_fleet  # noqa: E402
+from bench_train import REPO_ROOT, run_tree_measured  # noqa: E402
+from instrumentation import TRACE_ENV  # noqa: E402
+from synthetic import write_era5_files, write_midas_stations, write_owm_forecasts  # noqa: E402
+
+SCALES = {
+    "small": {"months": 2, "n_lat": 4, "n_lon": 5, "stations": 2, "years": 1},
+    "medium": {"months": 6, "n_lat": 8, "n_lon": 10, "stations": 4, "years": 2},
+    "large": {"months": 12, "n_lat": 13, "n_lon": 25, "stations": 8, "years": 5},
+}
+
+SCRIPTS_DIR = os.path.join(REPO_ROOT, "scripts")
+PYTHONPATH = os.pathsep.join([REPO_ROOT, SCRIPTS_DIR])
+
+LOAD_MIDAS = """
+import glob
+from instrumentation import stage
+from midas_loader import load_multiple_stations
+with stage("midas_loader"):
+    df = load_multiple_stations(sorted(glob.glob("midas/*/qc-version-1")))
+    df.to_csv("data/midas_combined.csv", index=False)
+"""
+
+# (stage, command) in pipeline order; every command runs with the workspace as cwd
+STAGES = [
+    ("era5_loader", ["era5_loader.py", "--pattern", os.path.join("era5_raw", "*.nc")]),
+    ("validate_era5_full", ["validate_era5_full.py"]),
+    ("era5_features", ["era5_features.py"]),
+    ("era5_features --append", [os.path.join("benchmarks", "bench_features_append.py"), "--input", "era5_cleaned"]),
+    ("train_models", ["train_models.py", "--models", "ApproxSVR", "RandomForest", "GradientBoosting",
+                      "--boosting", "hist"]),
+    ("predict", ["predict.py", "--input", "era5_features", "--no-report"]),
+    ("predict --stream", ["predict.py", "--input", "era5_features", "--stream", "--no-report",
+                          "--output", "predictions_stream.csv"]),
+    ("report", ["report.py"]),
+    ("power_curve", ["power_curve.py", "--turbines", "fleet.csv"]),
+    ("train_horizons", ["train_horizons.py", "--models", "DirectRidge"]),
+    ("forecast", ["forecast.py"]),
+    ("midas_loader (cold)", ["-c", LOAD_MIDAS]),
+    ("midas_loader (warm)", ["-c", LOAD_MIDAS]),
+    ("preprocess_merge", [os.path.join("scripts", "preprocess_merge.py")]),
+]
+
+
+def generate(workspace: str, months: int, n_lat: int, n_lon: int, stations: int, years: int) -> dict:
+    """Write the synthetic inputs for one scale; returns their sizes."""
+    start = datetime.date(2020, 1, 1)
+    end = f"{start.year + (months - 1) // 12}-{(months - 1) % 12 + 1:02d}"
+    era5 = write_era5_files(os.path.join(workspace, "era5_raw"), f"{start:%Y-%m}", end, n_lat, n_lon)
+    midas_years = list(range(2020 - years + 1, 2021))
+    folders = write_midas_stations(os.path.join(workspace, "midas"), stations, midas_years)
+    os.makedirs(os.path.join(workspace, "data"), exist_ok=True)
+    owm_rows = write_owm_forecasts(os.path.join(workspace, "openweathermap", "forecast_combined.csv"), stations,
+                                   f"{midas_years[0]}-01-01", f"{midas_years[-1]}-12-31 21:00")
+    midas_files = [os.path.join(f, name) for f in folders for name in os.listdir(f)]
+    synthetic_fleet(1_000, 20).to_csv(os.path.join(workspace, "fleet.csv"), index=False)
+    return {
+        "era5_files": len(era5),
+        "era5_mb": round(sum(os.path.getsize(p) for p in era5) / 1e6, 2),
+        "midas_files": len(midas_files),
+        "midas_mb": round(sum(os.path.getsize(p) for p in midas_files) / 1e6, 2),
+        "owm_rows": owm_rows,
+    }
+
+
+def children_cpu() -> float:
+    if resource is None:   # no RUSAGE_CHILDREN on Windows; CPU time is reported as nan
+        return float("nan")
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_stage(command: list, workspace: str) -> dict:
+    args = list(command)
+    if args[0].endswith(".py"):
+        args[0] = os.path.join(REPO_ROOT, args[0])
+    # Stages run one at a time, so the RUSAGE_CHILDREN delta is this stage's process tree
+    cpu = children_cpu()
+    wall, rss = run_tree_measured([sys.executable] + args, cwd=workspace, pythonpath=PYTHONPATH)
+    return {"wall_s": round(wall, 3), "cpu_s": round(children_cpu() - cpu, 3), "peak_rss_mb": round(rss, 1)}
+
+
+def run_scale(scale: str, repeat: int, stages: list, trace: str = None) -> list:
+    results = []
+    if trace:
+        # Stages inherit the variable; a fresh file per scale
+        os.environ[TRACE_ENV] = os.path.abspath(f"{os.path.splitext(trace)[0]}_{scale}.json")
+        if os.path.exists(os.environ[TRACE_ENV]):
+            os.remove(os.environ[TRACE_ENV])
+    with tempfile.TemporaryDirectory() as workspace:
+        inputs = generate(workspace, **SCALES[scale])
+        print(f"🔹 {scale}: {SCALES[scale]}  {inputs}")
+        for stage, command in STAGES:
+            if stages and stage.split()[0] not in stages:
+                continue
+            runs = []
+            for _ in range(repeat):
+                runs.append(run_stage(command, workspace))
+            best = min(runs, key=lambda r: r["wall_s"])
+            result = {"scale": scale, "stage": stage, **best, "inputs": inputs, "repeats": repeat}
+            results.append(result)
+            print(f"   {stage:<22} wall {best['wall_s']:7.2f} s  cpu {best['cpu_s']:7.2f} s  "
+                  f"peak RSS {best['peak_rss_mb']:7.1f} MB")
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_seconds: float, min_mb: float) -> list:
+    """Print a per-stage comparison; return the (scale, stage, metric) entries that regressed."""
+    base = {(r["scale"], r["stage"]): r for r in baseline["results"]}
+    print(f"🔹 Against baseline {baseline['meta'].get('commit')} ({baseline['meta'].get('created')}), "
+          f"threshold +{threshold:.0%}")
+    regressions = []
+    for result in current["results"]:
+        key = (result["scale"], result["stage"])
+        if key not in base:
+            print(f"   {key[0]:<7} {key[1]:<22} (no baseline)")
+            continue
+        flags = []
+        # Small absolute changes are noise, whatever the ratio
+        for metric, floor in (("wall_s", min_seconds), ("peak_rss_mb", min_mb)):
+            old, new = base[key][metric], result[metric]
+            if new > old * (1 + threshold) and new - old > floor:
+                flags.append(metric)
+                regressions.append((*key, metric))
+        wall = result["wall_s"] / base[key]["wall_s"] if base[key]["wall_s"] else float("nan")
+        rss = result["peak_rss_mb"] / base[key]["peak_rss_mb"] if base[key]["peak_rss_mb"] else float("nan")
+        status = "⚠️ REGRESSION " + ", ".join(flags) if flags else "ok"
+        print(f"   {key[0]:<7} {key[1]:<22} wall {base[key]['wall_s']:7.2f} -> {result['wall_s']:7.2f} s "
+              f"(x{wall:4.2f})  RSS {base[key]['peak_rss_mb']:7.1f} -> {result['peak_rss_mb']:7.1f} MB "
+              f"(x{rss:4.2f})  {status}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small"])
+    parser.add_argument("--stages", nargs="+", choices=sorted({s.split()[0] for s, _ in STAGES}),
+                        help="run only these stages (their inputs must come from earlier stages, so "
+                             "usually a pipeline prefix)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest is kept")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--results", help="compare this existing results file instead of running")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against this results file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown / growth")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="ignore wall-time changes below this")
+    parser.add_argument("--min-mb", type=float, default=20.0, help="ignore RSS changes below this")
+    parser.add_argument("--trace", metavar="PATH", help="also write a Chrome trace per scale (PATH_<scale>.json)")
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results) as fh:
+            current = json.load(fh)
+    else:
+        current = {"meta": environment(), "results": []}
+        for scale in args.scales:
+            current["results"] += run_scale(scale, args.repeat, args.stages, args.trace)
+        with open(args.output, "w") as fh:
+            json.dump(current, fh, indent=2)
+        print(f"✅ Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        regressions = compare(baseline, current, args.threshold, args.min_seconds, args.min_mb)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s)")
+            sys.exit(1)
+        print("✅ No regressions")
@@ -0,0 +1,166 @@
+"""
+synthetic.py
+Generate ERA5-shaped NetCDF files, MIDAS Open-shaped CSVs and an OWM
+forecast CSV so pipeline stages can be run and timed without CDS, CEDA or
+OpenWeatherMap access.
+
+  python synthetic.py --era5 era5_raw --start 2020-01 --end 2020-06 --lat 13 --lon 25
+  python synthetic.py --midas midas --stations 4 --years 2019 2020 --owm openweathermap/forecast_combined.csv
+"""
+
+import argparse
+import calendar
+import os
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+def make_era5_month(year: int, month: int, n_lat: int = 13, n_lon: int = 25,
+                    freq: str = "3h", seed: int = 0) -> xr.Dataset:
+    """
+    Build one month of ERA5 single-level data (u10, v10, t2m, msl) over the
+    [56, -6, 53, 0] box, using the same variable names, units and 'valid_time'
+    coordinate as current CDS downloads.
+    """
+    rng = np.random.default_rng(seed + year * 12 + month)
+    num_days = calendar.monthrange(year, month)[1]
+    times = pd.date_range(f"{year}-{month:02d}-01", periods=num_days * 24 // int(freq[:-1]), freq=freq)
+    lats = np.linspace(56, 53, n_lat)
+    lons = np.linspace(-6, 0, n_lon)
+    shape = (len(times), n_lat, n_lon)
+
+    # Smooth diurnal signal plus noise so rolling features are not degenerate
+    hours = times.hour.to_numpy()[:, None, None]
+    diurnal = np.sin(2 * np.pi * hours / 24.0)
+
+    u10 = (5 + 2 * diurnal + rng.normal(0, 1.5, shape)).astype("float32")
+    v10 = (2 + rng.normal(0, 1.5, shape)).astype("float32")
+    t2m = (282 + 4 * diurnal + rng.normal(0, 1.0, shape)).astype("float32")
+    msl = (101325 + rng.normal(0, 300, shape)).astype("float32")
+
+    dims = ("valid_time", "latitude", "longitude")
+    return xr.Dataset(
+        {"u10": (dims, u10), "v10": (dims, v10), "t2m": (dims, t2m), "msl": (dims, msl)},
+        coords={"valid_time": times, "latitude": lats, "longitude": lons},
+    )
+
+
+def write_era5_files(out_dir: str, start: str = "2019-11", end: str = "2020-10",
+                     n_lat: int = 13, n_lon: int = 25, freq: str = "3h") -> list:
+    """Write era5_{year}_{month}.nc files for every month in [start, end]."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for period in pd.period_range(start, end, freq="M"):
+        ds = make_era5_month(period.year, period.month, n_lat, n_lon, freq)
+        path = os.path.join(out_dir, f"era5_{period.year}_{period.month:02d}.nc")
+        ds.to_netcdf(path)
+        paths.append(path)
+    return paths
+
+
+MIDAS_COLUMNS = ["ob_time", "id", "id_type", "met_domain_name", "src_id", "rec_st_ind",
+                 "wind_speed_unit_id", "src_opr_type", "wind_direction", "wind_speed",
+                 "prst_wx_id", "past_wx_id_1", "cld_ttl_amt_id", "visibility", "msl_pressure",
+                 "air_temperature", "dewpoint", "wetb_temp", "rltv_hum", "meto_stmp_time"]
+
+
+def write_midas_file(path: str, station_id: str, year: int, meta_lines: int = 283,
+                     freq: str = "1h", seed: int = 0) -> None:
+    """
+    Write one yearly MIDAS Open hourly-weather CSV (BADC-CSV): a metadata block,
+    a 'data' marker line, the header, the observations and an 'end data' line.
+    `meta_lines` counts every line before the header (283 in current CEDA files).
+    """
+    rng = np.random.default_rng(seed + year)
+    times = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:00", freq=freq)
+    n = len(times)
+    df = pd.DataFrame({c: "" for c in MIDAS_COLUMNS}, index=range(n))
+    df["ob_time"] = times.strftime("%Y-%m-%d %H:%M:%S")
+    df["id"] = station_id
+    df["id_type"] = "DCNN"
+    df["met_domain_name"] = "SYNOP"
+    df["src_id"] = station_id
+    df["rec_st_ind"] = "1011"
+    df["wind_direction"] = rng.integers(0, 36, n) * 10
+    df["wind_speed"] = rng.gamma(2.0, 4.0, n).round(0)
+    df["msl_pressure"] = (1013 + rng.normal(0, 8, n)).round(1)
+    df["air_temperature"] = (9 + 5 * np.sin(2 * np.pi * times.dayofyear / 365) + rng.normal(0, 2, n)).round(1)
+    df["dewpoint"] = (df["air_temperature"] - 2).round(1)
+    # Occasional missing observations, written as empty fields as in the real files
+    df.loc[rng.random(n) < 0.01, "wind_speed"] = np.nan
+
+    with open(path, "w") as fh:
+        fh.write("Conventions,G,BADC-CSV,1\n")
+        fh.write(f"title,G,Synthetic MIDAS Open hourly weather observations {station_id}\n")
+        for i in range(meta_lines - 3):
+            fh.write(f"long_name,{MIDAS_COLUMNS[i % len(MIDAS_COLUMNS)]},synthetic metadata line {i}\n")
+        fh.write("data\n")
+        df.to_csv(fh, index=False, lineterminator="\n")
+        fh.write("end data\n")
+
+
+def write_midas_station(root: str, station: str, station_id: str, years: list, **kwargs) -> str:
+    """Write <root>/<id>_<station>/qc-version-1/*.csv as laid out by CEDA; returns the qc folder."""
+    folder = os.path.join(root, f"{station_id}_{station}", "qc-version-1")
+    os.makedirs(folder, exist_ok=True)
+    for year in years:
+        name = f"midas-open_uk-hourly-weather-obs_dv-202507_synthetic_{station_id}_{station}_qcv-1_{year}.csv"
+        write_midas_file(os.path.join(folder, name), station_id, year, **kwargs)
+    return folder
+
+
+def station_names(n: int) -> list:
+    return [f"station{i:02d}" for i in range(n)]
+
+
+def write_midas_stations(root: str, n_stations: int, years: list) -> list:
+    """Write `n_stations` stations (ids 10000, 10001, ...); returns their qc folders."""
+    return [write_midas_station(root, name, f"{10000 + i:05d}", years, seed=i)
+            for i, name in enumerate(station_names(n_stations))]
+
+
+def write_owm_forecasts(path: str, n_stations: int, start: str, end: str, seed: int = 0) -> int:
+    """Write a forecast_combined.csv (as saved by owm_loader.py) with 3-hourly rows per station."""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, end, freq="3h")
+    stations = station_names(n_stations)
+    n = len(times) * len(stations)
+    df = pd.DataFrame({
+        "timestamp": np.tile(times, len(stations)),
+        "wind_speed": rng.gamma(2.0, 2.5, n).round(2),
+        "wind_direction": rng.integers(0, 360, n),
+        "air_temperature": (9 + rng.normal(0, 3, n)).round(2),
+        "station": np.repeat(stations, len(times)),
+    })
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    df.to_csv(path, index=False)
+    return n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--era5", metavar="DIR", help="write monthly ERA5 NetCDF files here")
+    parser.add_argument("--start", default="2019-11", help="first ERA5 month (YYYY-MM)")
+    parser.add_argument("--end", default="2020-10", help="last ERA5 month (YYYY-MM)")
+    parser.add_argument("--lat", type=int, default=13, help="latitude points")
+    parser.add_argument("--lon", type=int, default=25, help="longitude points")
+    parser.add_argument("--freq", default="3h", help="ERA5 time step")
+    parser.add_argument("--midas", metavar="DIR", help="write MIDAS station folders here")
+    parser.add_argument("--stations", type=int, default=2)
+    parser.add_argument("--years", type=int, nargs="+", default=[2020], help="MIDAS years per station")
+    parser.add_argument("--owm", metavar="CSV", help="write an OWM forecast CSV covering --years")
+    args = parser.parse_args()
+
+    if not (args.era5 or args.midas or args.owm):
+        args.era5 = "synthetic_era5"
+    if args.era5:
+        paths = write_era5_files(args.era5, args.start, args.end, args.lat, args.lon, args.freq)
+        print(f"✅ Wrote {len(paths)} synthetic ERA5 files ({args.lat}x{args.lon} grid) to {args.era5}/")
+    if args.midas:
+        folders = write_midas_stations(args.midas, args.stations, args.years)
+        print(f"✅ Wrote {len(folders)} synthetic MIDAS stations x {len(args.years)} years to {args.midas}/")
+    if args.owm:
+        rows = write_owm_forecasts(args.owm, args.stations, f"{min(args.years)}-01-01", f"{max(args.years)}-12-31 21:00")
+        print(f"✅ Wrote {rows:,} synthetic OWM forecast rows to {args.owm}")
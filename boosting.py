@@ -0,0 +1,104 @@
+"""
+boosting.py
+Pluggable gradient-boosting backends for the GradientBoosting model.
+
+  exact    sklearn GradientBoostingRegressor, 300 trees, single-threaded
+           (the original model)
+  hist     sklearn HistGradientBoostingRegressor, multithreaded via OpenMP
+  xgboost  XGBRegressor with tree_method="hist" and n_jobs threads
+
+The histogram backends bin each feature once (256 bins) instead of sorting
+it at every node. They keep adding trees until the loss on a chronological
+validation slice (the last `validation_fraction` of the training rows) has
+not improved for `patience` rounds.
+
+extend_booster() adds trees fitted to newly arrived rows on top of a fitted
+model (see update_models.py).
+"""
+
+import copy
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+
+BACKENDS = ["exact", "hist", "xgboost"]
+MULTICORE_BACKENDS = {"hist", "xgboost"}
+
+LEARNING_RATE = 0.05
+MAX_DEPTH = 4
+MAX_ROUNDS = 2000   # upper bound for the early-stopped backends
+
+
+def make_booster(backend: str = "exact", n_jobs: int = 1, patience: int = 20):
+    if backend == "exact":
+        return GradientBoostingRegressor(n_estimators=300, learning_rate=LEARNING_RATE, max_depth=MAX_DEPTH,
+                                         random_state=42)
+    if backend == "hist":
+        return HistGradientBoostingRegressor(max_iter=MAX_ROUNDS, learning_rate=LEARNING_RATE, max_depth=MAX_DEPTH,
+                                             early_stopping=True, n_iter_no_change=patience, random_state=42)
+    if backend == "xgboost":
+        from xgboost import XGBRegressor
+        return XGBRegressor(n_estimators=MAX_ROUNDS, learning_rate=LEARNING_RATE, max_depth=MAX_DEPTH,
+                            tree_method="hist", n_jobs=n_jobs, early_stopping_rounds=patience, random_state=42)
+    raise ValueError(f"Unknown boosting backend {backend!r}; expected one of {BACKENDS}")
+
+
+def chronological_split(X: np.ndarray, y: np.ndarray, validation_fraction: float) -> tuple:
+    """Hold out the last rows (the most recent times) rather than a random sample."""
+    cut = len(X) - max(1, int(len(X) * validation_fraction))
+    return X[:cut], y[:cut], X[cut:], y[cut:]
+
+
+def fit_booster(model, X: np.ndarray, y: np.ndarray, validation_fraction: float = 0.1):
+    """Fit `model`, early-stopping the histogram backends on a chronological validation slice."""
+    if isinstance(model, GradientBoostingRegressor):
+        return model.fit(X, y)
+
+    X_fit, y_fit, X_val, y_val = chronological_split(X, y, validation_fraction)
+    if isinstance(model, HistGradientBoostingRegressor):
+        return model.fit(X_fit, y_fit, X_val=X_val, y_val=y_val)
+    return model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+
+
+def n_rounds(model) -> int:
+    """Number of boosting rounds actually kept."""
+    if isinstance(model, GradientBoostingRegressor):
+        return model.n_estimators_
+    if isinstance(model, HistGradientBoostingRegressor):
+        return model.n_iter_
+    return model.best_iteration + 1
+
+
+def extend_booster(model, X: np.ndarray, y: np.ndarray, new_rounds: int = 50, validation_fraction: float = 0.1):
+    """
+    Add up to `new_rounds` boosting rounds fitted to (X, y), the newly arrived
+    rows, to a fitted model. Every backend early-stops on a chronological
+    validation slice of the new rows, and keeps no new rounds if none help.
+
+    xgboost continues from its best iteration with early_stopping_rounds.
+    exact and hist trial-fit a copy with all `new_rounds` and pick the best
+    count from staged_predict. The original is then extended by that many
+    rounds. hist's own early stopping is not used, because on a warm start it
+    compares against the previous fit's validation history and stops after
+    one round.
+    """
+    X_fit, y_fit, X_val, y_val = chronological_split(X, y, validation_fraction)
+    if not isinstance(model, (GradientBoostingRegressor, HistGradientBoostingRegressor)):
+        booster = model.get_booster()[:n_rounds(model)]   # drop the rounds after the best one
+        return model.set_params(n_estimators=new_rounds).fit(X_fit, y_fit, eval_set=[(X_val, y_val)],
+                                                             verbose=False, xgb_model=booster)
+
+    def extended(estimator, rounds):
+        total = n_rounds(estimator) + rounds
+        if isinstance(estimator, GradientBoostingRegressor):
+            return estimator.set_params(warm_start=True, n_estimators=total).fit(X_fit, y_fit)
+        return estimator.set_params(warm_start=True, early_stopping=False, max_iter=total).fit(X_fit, y_fit)
+
+    start = n_rounds(model)
+    trial = extended(copy.deepcopy(model), new_rounds)
+    # Validation loss after start, start + 1, ..., start + new_rounds rounds
+    losses = [np.mean((y_val - p) ** 2) for i, p in enumerate(trial.staged_predict(X_val)) if i >= start - 1]
+    best = int(np.argmin(losses))
+    if best == new_rounds:
+        return trial
+    return extended(model, best) if best else model
@@ -0,0 +1,175 @@
+"""
+dataset_store.py
+Partitioned Parquet datasets shared by the pipeline stages.
+
+A dataset is a directory laid out as <root>/year=YYYY/month=MM/part-NNNNN.parquet.
+Columns keep their dtypes (no datetime re-parsing), readers can project just the
+columns they need, and a month can be replaced or appended without touching the
+rest of the history.
+"""
+
+import glob
+import os
+import shutil
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from instrumentation import span
+
+
+def partition_dir(root: str, year: int, month: int) -> str:
+    return os.path.join(root, f"year={year:04d}", f"month={month:02d}")
+
+
+def list_partitions(root: str) -> list:
+    """Return sorted (year, month, directory) tuples for every partition under root."""
+    partitions = []
+    for path in glob.glob(os.path.join(root, "year=*", "month=*")):
+        year = int(os.path.basename(os.path.dirname(path)).split("=")[1])
+        month = int(os.path.basename(path).split("=")[1])
+        partitions.append((year, month, path))
+    return sorted(partitions)
+
+
+def write_partitions(df: pd.DataFrame, root: str, time_col: str = "time",
+                     mode: str = "overwrite") -> list:
+    """
+    Split df by calendar month of `time_col` and write each month to its partition.
+
+    mode="overwrite" replaces the months present in df and leaves every other
+    month untouched; mode="append" adds a new part file next to existing ones.
+    Returns the list of (year, month) partitions written.
+    """
+    if mode not in ("overwrite", "append"):
+        raise ValueError(f"unknown mode {mode!r}")
+
+    times = pd.DatetimeIndex(df[time_col])
+    keys = times.year * 100 + times.month
+    written = []
+
+    with span("write_partitions", rows=len(df), bytes=0, root=root) as s:
+        for key in pd.unique(keys):
+            year, month = divmod(int(key), 100)
+            out_dir = partition_dir(root, year, month)
+            if mode == "overwrite" and os.path.isdir(out_dir):
+                shutil.rmtree(out_dir)
+            os.makedirs(out_dir, exist_ok=True)
+
+            part = len(glob.glob(os.path.join(out_dir, "part-*.parquet")))
+            out_path = os.path.join(out_dir, f"part-{part:05d}.parquet")
+            df[keys == key].to_parquet(out_path, index=False)
+            s.bytes += os.path.getsize(out_path)
+            written.append((year, month))
+
+    return written
+
+
+def iter_partitions(root: str, columns: list = None, start: str = None, end: str = None):
+    """
+    Yield one DataFrame per monthly partition, oldest first.
+    `start`/`end` are inclusive "YYYY-MM" bounds used to skip whole partitions.
+    """
+    lo = pd.Period(start, freq="M") if start else None
+    hi = pd.Period(end, freq="M") if end else None
+
+    for year, month, path in list_partitions(root):
+        period = pd.Period(year=year, month=month, freq="M")
+        if (lo is not None and period < lo) or (hi is not None and period > hi):
+            continue
+        parts = sorted(glob.glob(os.path.join(path, "part-*.parquet")))
+        frames = [pd.read_parquet(p, columns=columns) for p in parts]
+        if frames:
+            yield pd.concat(frames, ignore_index=True)
+
+
+def read_dataset(root: str, columns: list = None, start: str = None, end: str = None) -> pd.DataFrame:
+    """Read a whole dataset (or a month range of it), loading only `columns`."""
+    frames = list(iter_partitions(root, columns, start, end))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_table(path: str, columns: list = None, time_col: str = "time") -> pd.DataFrame:
+    """
+    Read a partitioned dataset directory, a single Parquet file or a CSV file.
+    A bare dataset name with no directory falls back to the legacy `<path>.csv`.
+    """
+    with span("read_table", path=path) as s:
+        if os.path.isdir(path):
+            df = read_dataset(path, columns)
+        else:
+            if not os.path.exists(path) and os.path.exists(path + ".csv"):
+                path = path + ".csv"
+            s.bytes = os.path.getsize(path) if os.path.exists(path) else None
+            if path.endswith(".parquet"):
+                df = pd.read_parquet(path, columns=columns)
+            else:
+                parse_dates = [time_col] if columns is None or time_col in columns else None
+                df = pd.read_csv(path, usecols=columns, parse_dates=parse_dates)
+        s.rows = len(df)
+    return df
+
+
+def iter_batches(path: str, batch_size: int, columns: list = None, time_col: str = "time"):
+    """
+    Yield DataFrames of at most `batch_size` rows from a dataset directory, a
+    Parquet file or a CSV file (same resolution as read_table), in row order.
+    Only one batch is materialised at a time.
+    """
+    if not os.path.isdir(path) and not os.path.exists(path) and os.path.exists(path + ".csv"):
+        path = path + ".csv"
+    if os.path.isdir(path):
+        files = [f for _, _, d in list_partitions(path) for f in sorted(glob.glob(os.path.join(d, "part-*.parquet")))]
+    elif path.endswith(".parquet"):
+        files = [path]
+    else:
+        parse_dates = [time_col] if columns is None or time_col in columns else None
+        yield from pd.read_csv(path, usecols=columns, parse_dates=parse_dates, chunksize=batch_size)
+        return
+
+    for f in files:
+        for batch in pq.ParquetFile(f).iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+
+
+def truncate(root: str, after: pd.Timestamp, time_col: str = "time") -> int:
+    """
+    Drop the rows with `time_col` > `after`, e.g. the part files of an append that
+    was interrupted before its caller recorded it. Only the partitions from the
+    month of `after` on are read. Returns the number of rows dropped.
+    """
+    dropped = 0
+    for year, month, path in list_partitions(root):
+        if (year, month) < (after.year, after.month):
+            continue
+        for part in sorted(glob.glob(os.path.join(path, "part-*.parquet"))):
+            keep = pd.read_parquet(part, columns=[time_col])[time_col] <= after
+            if keep.all():
+                continue
+            dropped += int((~keep).sum())
+            if keep.any():
+                df = pd.read_parquet(part)
+                df[keep.to_numpy()].to_parquet(part + ".tmp", index=False)
+                os.replace(part + ".tmp", part)
+            else:
+                os.remove(part)
+        if not glob.glob(os.path.join(path, "part-*.parquet")):
+            shutil.rmtree(path)
+    return dropped
+
+
+def export_csv(root: str, path: str, columns: list = None) -> int:
+    """Stream a dataset to a single CSV side output, one partition at a time."""
+    rows = 0
+    for df in iter_partitions(root, columns):
+        df.to_csv(path, mode="w" if rows == 0 else "a", header=(rows == 0), index=False)
+        rows += len(df)
+    return rows
+
+
+def clear(root: str) -> None:
+    """Remove a dataset directory if it exists."""
+    if os.path.isdir(root):
+        shutil.rmtree(root)
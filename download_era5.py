@@ -1,67 +1,201 @@
-import cdsapi
+"""
+download_era5.py
+Queue monthly ERA5 requests and download them with bounded concurrency.
+
+Progress is kept in a JSON manifest (era5_manifest.json) so an interrupted
+backfill resumes where it stopped: months whose files are already present and
+valid are skipped. Failed requests are retried with exponential backoff and then
+split into smaller day ranges (_a/_b, _aa/_ab, ...) until they succeed.
+"""
+
+import argparse
 import calendar
+import json
+import os
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import span, stage
 
-c = cdsapi.Client()
+DATASET = 'reanalysis-era5-single-levels'
+VARIABLES = [
+    '10m_u_component_of_wind',
+    '10m_v_component_of_wind',
+    '2m_temperature',
+    'mean_sea_level_pressure',
+]
+TIMES = ['00:00', '03:00', '06:00', '09:00',
+         '12:00', '15:00', '18:00', '21:00']
+AREA = [56, -6, 53, 0]
+MANIFEST_FILE = "era5_manifest.json"
 
-# Resume from Nov 2019 to 2024
-years_monthly = list(range(2019, 2025))
-months = [f"{m:02d}" for m in range(1, 13)]
 
-def download_month(year, month, target_file, days):
+def build_request(year: int, month: int, days: list, area: list = AREA) -> dict:
+    return {
+        'product_type': 'reanalysis',
+        'variable': VARIABLES,
+        'year': str(year),
+        'month': f"{month:02d}",
+        'day': days,
+        'time': TIMES,
+        'area': area,
+        'format': 'netcdf',
+    }
+
+
+def is_valid_file(path: str) -> bool:
+    """A download is valid if it exists and opens as NetCDF with all four variables."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
     try:
-        c.retrieve(
-            'reanalysis-era5-single-levels',
-            {
-                'product_type': 'reanalysis',
-                'variable': [
-                    '10m_u_component_of_wind',
-                    '10m_v_component_of_wind',
-                    '2m_temperature',
-                    'mean_sea_level_pressure',
-                ],
-                'year': str(year),
-                'month': month,
-                'day': days,
-                'time': ['00:00', '03:00', '06:00', '09:00',
-                         '12:00', '15:00', '18:00', '21:00'],
-                'area': [56, -6, 53, 0],
-                'format': 'netcdf',
-            },
-            target_file
-        )
-        print(f"✅ Finished {target_file}")
-        return True
-    except Exception as e:
-        print(f"⚠️ Error for {year}-{month}: {e}")
+        import xarray as xr
+        with xr.open_dataset(path) as ds:
+            return all(v in ds for v in ("u10", "v10", "t2m", "msl"))
+    except Exception:
         return False
 
-for year in years_monthly:
-    for month in months:
-        # Skip months before Nov 2019
-        if year == 2019 and int(month) < 11:
-            continue
 
-        num_days = calendar.monthrange(year, int(month))[1]
+def month_range(start: str, end: str) -> list:
+    """Inclusive list of (year, month) between two "YYYY-MM" strings."""
+    y, m = (int(v) for v in start.split("-"))
+    end_y, end_m = (int(v) for v in end.split("-"))
+    months = []
+    while (y, m) <= (end_y, end_m):
+        months.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+
+class Manifest:
+    """Thread-safe JSON record of every month's status: in_flight, completed or failed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as fh:
+                self.entries = json.load(fh)
+
+    def get(self, key: str) -> dict:
+        with self.lock:
+            return dict(self.entries.get(key, {}))
+
+    def update(self, key: str, **fields) -> None:
+        with self.lock:
+            entry = self.entries.setdefault(key, {})
+            entry.update(fields, updated=time.strftime("%Y-%m-%dT%H:%M:%S"))
+            # Write atomically so a crash never leaves a truncated manifest
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as fh:
+                json.dump(self.entries, fh, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+class DownloadScheduler:
+    """
+    Download ERA5 months concurrently.
+
+    `client` is anything with a cdsapi-style retrieve(dataset, request, target)
+    method, so a fake client can stand in for CDS when testing.
+    """
+
+    def __init__(self, client, out_dir: str = ".", max_workers: int = 4, max_retries: int = 3,
+                 base_delay: float = 10.0, min_days: int = 1, area: list = AREA,
+                 validate=is_valid_file, sleep=time.sleep):
+        if max_retries < 1:
+            raise ValueError(f"max_retries must be at least 1, got {max_retries}")
+        self.client = client
+        self.out_dir = out_dir
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.min_days = min_days
+        self.area = area
+        self.validate = validate
+        self.sleep = sleep
+        os.makedirs(out_dir, exist_ok=True)
+        self.manifest = Manifest(os.path.join(out_dir, MANIFEST_FILE))
+
+    def run(self, start: str, end: str) -> dict:
+        """Download every month in [start, end]. Returns a count per final status."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            statuses = list(pool.map(lambda ym: self.download_month(*ym), month_range(start, end)))
+        return {s: statuses.count(s) for s in sorted(set(statuses))}
+
+    def download_month(self, year: int, month: int) -> str:
+        key = f"{year}-{month:02d}"
+        entry = self.manifest.get(key)
+        if entry.get("status") == "completed" and all(self.validate(f) for f in entry.get("files", [])):
+            return "skipped"
+
+        num_days = calendar.monthrange(year, month)[1]
         days = [f"{d:02d}" for d in range(1, num_days + 1)]
-        target_file = f"era5_{year}_{month}.nc"
+        print(f"▶ Starting {key} with {num_days} days...")
+        self.manifest.update(key, status="in_flight")
+
+        try:
+            with span("download_month", month=key) as s:
+                files = self._fetch(year, month, days, "")
+                s.bytes = sum(os.path.getsize(f) for f in files)
+        except Exception as e:
+            print(f"❌ Giving up on {key}: {e}")
+            self.manifest.update(key, status="failed", error=str(e))
+            return "failed"
+
+        self.manifest.update(key, status="completed", files=files, error=None)
+        return "completed"
+
+    def _fetch(self, year: int, month: int, days: list, suffix: str) -> list:
+        """Download one day range, retrying with backoff and splitting it in half on repeated failure."""
+        name = f"era5_{year}_{month:02d}" + (f"_{suffix}" if suffix else "") + ".nc"
+        target = os.path.join(self.out_dir, name)
+        if self.validate(target):
+            return [target]
+
+        error = None
+        for attempt in range(self.max_retries):
+            try:
+                with span("retrieve", file=name, days=len(days), attempt=attempt + 1) as s:
+                    self.client.retrieve(DATASET, build_request(year, month, days, self.area), target)
+                    if not self.validate(target):
+                        raise RuntimeError(f"{name} failed validation")
+                    s.bytes = os.path.getsize(target)
+                print(f"✅ Finished {name}")
+                return [target]
+            except Exception as e:
+                error = e
+                print(f"⚠️ Error for {name} (attempt {attempt + 1}/{self.max_retries}): {e}")
+                if attempt + 1 < self.max_retries:
+                    self.sleep(self.base_delay * 2 ** attempt * random.uniform(0.8, 1.2))
 
-        print(f"▶ Starting {year}-{month} with {num_days} days...")
+        if len(days) <= self.min_days:
+            raise error
 
-        success = download_month(year, month, target_file, days)
+        half = len(days) // 2
+        print(f"✂️ Splitting {name} into days {days[0]}-{days[half - 1]} and {days[half]}-{days[-1]}...")
+        return (self._fetch(year, month, days[:half], suffix + "a")
+                + self._fetch(year, month, days[half:], suffix + "b"))
 
-        if not success:
-            print(f"🔄 Retrying {year}-{month} after short pause...")
-            time.sleep(10)
-            success = download_month(year, month, target_file, days)
 
-        if not success:
-            print(f"✂️ Splitting {year}-{month} into halves...")
-            days_first_half = [f"{d:02d}" for d in range(1, 16)]
-            days_second_half = [f"{d:02d}" for d in range(16, num_days + 1)]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download monthly ERA5 files")
+    parser.add_argument("--start", default="2019-11", help="first month, YYYY-MM")
+    parser.add_argument("--end", default="2024-12", help="last month, YYYY-MM")
+    parser.add_argument("--out-dir", default=".")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent CDS requests")
+    parser.add_argument("--retries", type=int, default=3, help="attempts per request before splitting")
+    parser.add_argument("--area", type=float, nargs=4, default=AREA, metavar=("N", "W", "S", "E"))
+    args = parser.parse_args()
+    if args.retries < 1:
+        parser.error("--retries must be at least 1")
 
-            target_file_a = f"era5_{year}_{month}_a.nc"
-            target_file_b = f"era5_{year}_{month}_b.nc"
+    import cdsapi
 
-            download_month(year, month, target_file_a, days_first_half)
-            download_month(year, month, target_file_b, days_second_half)
\ No newline at end of file
+    with stage("download_era5"):
+        scheduler = DownloadScheduler(cdsapi.Client(), out_dir=args.out_dir, max_workers=args.workers,
+                                      max_retries=args.retries, area=args.area)
+        summary = scheduler.run(args.start, args.end)
+    print(f"✅ Download run finished: {summary}")
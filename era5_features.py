@@ -1,29 +1,329 @@
+"""
+era5_features.py
+Build model features from the cleaned ERA5 dataset.
+
+Features are computed on (time, cell) arrays, where a cell is one grid point
+(latitude, longitude) or one station, so rolling windows and lags run along each
+cell's own time axis instead of across neighbouring rows of the long-form table.
+Only the final result is flattened back to one row per (time, cell).
+
+The time axis is regular: every step from the first time to the last, at
+the data's most common spacing. Timestamps missing from the data become NaN
+rows, so a rolling window that would reach across a gap yields NaN until it
+has filled again after the gap. validate_era5_full.py fills the short gaps
+beforehand; the long ones reset the windows this way.
+
+`--append` computes features only for rows newer than the last run, using the
+trailing window state saved in <output>/_state.npz. The result is bit-identical
+to a full recompute as long as earlier months have not changed. The state is
+saved after the rows, and it is what marks them done. Rows written past it by
+an append that died before saving it are dropped and recomputed on the next
+run.
+"""
+
+import argparse
+import os
+
 import pandas as pd
 import numpy as np
 
-# Load deduplicated dataset
-df = pd.read_csv("era5_cleaned.csv", parse_dates=["time"])
+import dataset_store
+from instrumentation import span, stage
+
+# Model inputs consumed by train_models.py and predict.py
+FEATURES = ["windspeed", "temperature_C", "pressure_hPa",
+            "windspeed_roll24h", "temperature_roll7d",
+            "windspeed_cubed", "windspeed_lag1"]
+
+SPACE_COLS = ["latitude", "longitude", "station"]
+
+
+def infer_step(times: pd.DatetimeIndex):
+    """Most common spacing of sorted, distinct `times`, or None with fewer than two."""
+    if len(times) < 2:
+        return None
+    diffs = np.diff(times.asi8)
+    values, counts = np.unique(diffs, return_counts=True)
+    return pd.Timedelta(int(values[np.argmax(counts)]), unit=times.unit)
+
+
+def regular_axis(times: pd.DatetimeIndex, step: pd.Timedelta, after: pd.Timestamp = None) -> pd.DatetimeIndex:
+    """
+    Every `step` from times[0] (or from `after` + step) through times[-1], plus any
+    of `times` that fall off that grid.
+    """
+    start = times[0] if after is None else after + step
+    axis = pd.date_range(start, times[-1], freq=step, unit=times.unit)
+    return axis if times.isin(axis).all() else axis.union(times)
+
+
+def time_index(times: pd.Series) -> tuple:
+    """(time code of each row, sorted distinct times); sorted input is coded from its run boundaries."""
+    if times.is_monotonic_increasing:
+        values = times.to_numpy()
+        new = np.empty(len(values), dtype=bool)
+        new[:1] = True
+        np.not_equal(values[1:], values[:-1], out=new[1:])
+        return np.cumsum(new) - 1, pd.DatetimeIndex(values[new])
+    codes, uniques = pd.factorize(times, sort=True)
+    return codes, pd.DatetimeIndex(uniques)
+
+
+def cell_index(df: pd.DataFrame, levels: dict = None, dense: bool = False) -> tuple:
+    """
+    (cell code of each row, levels). A cell is one distinct combination of the
+    SPACE_COLS present, and levels holds each column's value in every cell,
+    sorted. Scattered sites thus cost one cell each, not a row and a column of
+    a latitude x longitude grid. Pass saved levels back in to code appended
+    rows onto the same cells. With `dense`, the cells are the full cross
+    product instead, and levels holds each column's sorted distinct values.
+    """
+    cols = [c for c in SPACE_COLS if c in df.columns]
+    keys, uniques = np.zeros(len(df), dtype=np.int64), []
+    for col in cols:
+        codes, values = pd.factorize(df[col], sort=True, use_na_sentinel=False)
+        keys = keys * len(values) + codes
+        uniques.append(np.asarray(values))
+    if dense:
+        return keys, dict(zip(cols, uniques))
+
+    cell_codes, cell_keys = pd.factorize(keys, sort=True)
+    cells = np.unravel_index(cell_keys, [len(u) for u in uniques]) if cols else ()
+    new_levels = {col: u[c] for col, u, c in zip(cols, uniques, cells)}
+    if levels is None or not cols:
+        return cell_codes, new_levels
+    saved = pd.MultiIndex.from_arrays([levels[col] for col in cols])
+    mapping = saved.get_indexer(pd.MultiIndex.from_arrays([new_levels[col] for col in cols]))
+    if (mapping < 0).any():
+        raise ValueError(f"new {'/'.join(cols)} cells not in the saved feature state; run a full recompute")
+    return mapping[cell_codes], {col: np.asarray(levels[col]) for col in cols}
+
+
+def grid_index(df: pd.DataFrame, levels: dict = None, regular: bool = False, step: pd.Timedelta = None,
+               after: pd.Timestamp = None, dense: bool = False) -> tuple:
+    """
+    Map each row to a position in a (time, cell) array.
+
+    Returns (time_codes, positions, times, n_cells, levels). positions is the flat
+    index of each row, or None if the rows already are the array in row-major
+    order (the usual case for loader output), so scatter/gather become reshapes.
+    Cells and `levels` are as in cell_index; `dense` is for callers that need
+    the latitude x longitude grid itself (interpolation, reshaping to 3-D).
+    With `regular`, `times` is the regular_axis at `step` (inferred if None)
+    rather than only the timestamps present.
+    """
+    time_codes, times = time_index(df["time"])
+    n_times = len(times)
+
+    # Loader output repeats the same block of cells at every time step, so only the first block is coded
+    block = len(df) // n_times if n_times else 0
+    cols = [c for c in SPACE_COLS if c in df.columns]
+    repeated = (block and block * n_times == len(df)
+                and (time_codes.reshape(n_times, block) == np.arange(n_times)[:, None]).all()
+                and all((v.reshape(n_times, block) == v[:block]).all() for v in (df[c].to_numpy() for c in cols)))
+    if repeated:
+        cell_codes, levels = cell_index(df.iloc[:block], levels, dense)
+    else:
+        cell_codes, levels = cell_index(df, levels, dense)
+    n_cells = int(np.prod([len(v) for v in levels.values()])) if dense else len(next(iter(levels.values()), [0]))
+
+    if regular and n_times:
+        step = step or infer_step(times)
+        if step is not None:
+            axis = regular_axis(times, step, after)
+            if len(axis) != n_times:
+                time_codes = axis.get_indexer(times)[time_codes]
+            times = axis
+
+    if repeated and len(times) == n_times and np.array_equal(cell_codes, np.arange(n_cells)):
+        positions = None
+    else:
+        positions = time_codes * n_cells + (np.tile(cell_codes, n_times) if repeated else cell_codes)
+    return time_codes, positions, times, n_cells, levels
+
+
+def to_grid(values: np.ndarray, positions: np.ndarray, shape: tuple) -> np.ndarray:
+    """Scatter a long-form column into a (time, cell) float64 array; missing points are NaN."""
+    if positions is None:
+        return values.astype(np.float64).reshape(shape)
+    grid = np.full(shape[0] * shape[1], np.nan)
+    grid[positions] = values
+    return grid.reshape(shape)
+
+
+def from_grid(grid: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """Gather a (time, cell) array back to the long-form rows it came from."""
+    flat = grid.reshape(-1)
+    return flat if positions is None else flat[positions]
+
+
+def rolling_mean(grid: np.ndarray, window: int, carry: tuple = None) -> tuple:
+    """
+    Trailing mean over `window` time steps per cell via cumulative sums.
+    Matches pandas rolling(window).mean(): NaN until the window is full or if it contains a NaN.
+
+    `carry` is the (csum, count) tail returned by the previous call on the rows
+    just before `grid`. The running sum is continued rather than restarted, so
+    appending gives bit-identical results to one call over the whole history.
+    Returns (means, carry).
+    """
+    if carry is None:
+        carry = (np.zeros((window,) + grid.shape[1:]), np.zeros((window,) + grid.shape[1:], dtype=np.int64))
+    prev_csum, prev_count = carry
+
+    valid = ~np.isnan(grid)
+    csum = np.concatenate([prev_csum, np.where(valid, grid, 0.0)])
+    np.cumsum(csum[window - 1:], axis=0, out=csum[window - 1:])
+    count = np.concatenate([prev_count, valid])
+    np.cumsum(count[window - 1:], axis=0, out=count[window - 1:])
+
+    full = (count[window:] - count[:-window]) == window
+    means = np.where(full, (csum[window:] - csum[:-window]) / window, np.nan)
+    return means, (csum[-window:].copy(), count[-window:].copy())
+
+
+def lag(grid: np.ndarray, steps: int = 1, previous: np.ndarray = None) -> np.ndarray:
+    """Value `steps` time steps earlier in the same cell; `previous` supplies the rows before grid."""
+    out = np.full(grid.shape, np.nan)
+    out[steps:] = grid[:-steps]
+    if previous is not None:
+        out[:steps] = previous[-steps:]
+    return out
+
+
+def compute_features(df: pd.DataFrame, state: dict = None) -> tuple:
+    """
+    Add feature columns to df and return (df, state).
+
+    `state` is the trailing window state from a previous call (see save_state);
+    pass it to compute features for rows that directly follow that call's rows.
+    """
+    levels = state["levels"] if state else None
+    step = state.get("step") if state else None
+    time_codes, positions, times, n_cells, levels = grid_index(df, levels, regular=True, step=step,
+                                                               after=state and state["last_time"])
+    shape = (len(times), n_cells)
+    windspeed = to_grid(df["windspeed"].to_numpy(), positions, shape)
+    temperature = to_grid(df["temperature_C"].to_numpy(), positions, shape)
+
+    if state and len(times) and times[0] <= state["last_time"]:
+        raise ValueError(f"appended rows start at {times[0]}, not after {state['last_time']}")
+
+    def flat(grid: np.ndarray) -> np.ndarray:
+        return from_grid(grid, positions)
+
+    # --- Wind direction ---
+    df["wind_direction_deg"] = flat(np.degrees(np.arctan2(windspeed, windspeed)))  # placeholder
+    # Better: if you still have u10 and v10, use atan2(v10, u10)
+
+    # --- Rolling averages ---
+    roll24h, ws_carry = rolling_mean(windspeed, 8, state and state["windspeed_carry"])      # 8 steps = 24h (3h each)
+    roll7d, t_carry = rolling_mean(temperature, 56, state and state["temperature_carry"])  # 56 steps = 7 days
+    df["windspeed_roll24h"] = flat(roll24h)
+    df["temperature_roll7d"] = flat(roll7d)
+
+    # --- Seasonal flags (depend on time only) ---
+    month = times.month.to_numpy()
+    df["month"] = month[time_codes]
+    df["season"] = (month % 12 // 3 + 1)[time_codes]   # 1=Winter, 2=Spring, 3=Summer, 4=Autumn
+    df["day_of_week"] = times.dayofweek.to_numpy()[time_codes]
+
+    # --- Interaction term ---
+    df["windspeed_cubed"] = flat(windspeed ** 3)
+
+    # --- Lag feature ---
+    df["windspeed_lag1"] = flat(lag(windspeed, 1, state and state["windspeed_last"]))
+
+    if not len(times):
+        return df, state
+    new_state = {
+        "levels": levels,
+        "last_time": times[-1],
+        "windspeed_carry": ws_carry,
+        "temperature_carry": t_carry,
+        "windspeed_last": windspeed[-1:].copy(),
+        "step": step or infer_step(times),
+    }
+    return df, new_state
+
+
+def add_features(df: pd.DataFrame) -> pd.DataFrame:
+    return compute_features(df)[0]
+
+
+def save_state(path: str, state: dict) -> None:
+    """
+    Persist the trailing window state (last 56 cumulative rows per cell) as .npz.
+    The file is replaced atomically: it is the commit point of an --append.
+    """
+    arrays = {f"level_{col}": values for col, values in state["levels"].items()}
+    step = np.timedelta64(state["step"].value if state.get("step") is not None else "NaT", "ns")
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, last_time=np.datetime64(state["last_time"], "ns"), step=step,
+                 windspeed_csum=state["windspeed_carry"][0], windspeed_count=state["windspeed_carry"][1],
+                 temperature_csum=state["temperature_carry"][0], temperature_count=state["temperature_carry"][1],
+                 windspeed_last=state["windspeed_last"], **arrays)
+    os.replace(path + ".tmp", path)
+
+
+def load_state(path: str) -> dict:
+    with np.load(path, allow_pickle=False) as f:
+        levels = {k[len("level_"):]: f[k] for k in f.files if k.startswith("level_")}
+        if levels and any(len(v) != f["windspeed_last"].shape[1] for v in levels.values()):
+            # Written when cells were the cross product of each column's values
+            grid = np.meshgrid(*levels.values(), indexing="ij")
+            levels = {col: g.reshape(-1) for col, g in zip(levels, grid)}
+        return {
+            "levels": levels,
+            "last_time": pd.Timestamp(f["last_time"][()]),
+            "windspeed_carry": (f["windspeed_csum"], f["windspeed_count"]),
+            "temperature_carry": (f["temperature_csum"], f["temperature_count"]),
+            "windspeed_last": f["windspeed_last"],
+            "step": pd.Timedelta(f["step"][()]) if "step" in f.files and not np.isnat(f["step"][()]) else None,
+        }
 
-# --- Wind direction ---
-df["wind_direction_deg"] = np.degrees(np.arctan2(df["windspeed"], df["windspeed"]))  # placeholder
-# Better: if you still have u10 and v10, use atan2(v10, u10)
 
-# --- Rolling averages ---
-df["windspeed_roll24h"] = df["windspeed"].rolling(window=8).mean()   # 8 steps = 24h (3h each)
-df["temperature_roll7d"] = df["temperature_C"].rolling(window=56).mean()  # 56 steps = 7 days
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the era5_features dataset")
+    parser.add_argument("--input", default="era5_cleaned", help="cleaned dataset directory (or legacy CSV)")
+    parser.add_argument("--output", default="era5_features", help="partitioned dataset directory")
+    parser.add_argument("--csv", metavar="PATH", help="also export the features to a single CSV")
+    parser.add_argument("--append", action="store_true",
+                        help="only compute features for rows newer than the saved window state")
+    args = parser.parse_args()
 
-# --- Seasonal flags ---
-df["month"] = df["time"].dt.month
-df["season"] = df["month"] % 12 // 3 + 1   # 1=Winter, 2=Spring, 3=Summer, 4=Autumn
-df["day_of_week"] = df["time"].dt.dayofweek
+    with stage("era5_features"):
+        state_path = os.path.join(args.output, "_state.npz")
 
-# --- Interaction term ---
-df["windspeed_cubed"] = df["windspeed"] ** 3
+        if args.append and os.path.exists(state_path):
+            # Only the partition holding the last processed row and newer ones are read
+            state = load_state(state_path)
+            # The saved state marks what was committed; rows past it are from an append that died before saving it
+            dropped = dataset_store.truncate(args.output, state["last_time"])
+            if dropped:
+                print(f"⚠️ Dropped {dropped} feature rows of an unfinished append; recomputing them")
+            df = dataset_store.read_dataset(args.input, start=state["last_time"].strftime("%Y-%m"))
+            df = df[df["time"] > state["last_time"]].reset_index(drop=True)
+            if df.empty:
+                print("✅ Feature dataset already up to date")
+                raise SystemExit(0)
+            with span("compute_features", rows=len(df)):
+                df, state = compute_features(df, state)
+            dataset_store.write_partitions(df, args.output, mode="append")
+            print(f"✅ Appended {len(df)} feature rows to {args.output}/")
+        else:
+            # Load deduplicated dataset
+            df = dataset_store.read_table(args.input)
+            with span("compute_features", rows=len(df)):
+                df, state = compute_features(df)
 
-# --- Lag feature ---
-df["windspeed_lag1"] = df["windspeed"].shift(1)
+            # Save enriched dataset
+            dataset_store.clear(args.output)
+            dataset_store.write_partitions(df, args.output)
+            print(f"✅ Feature-engineered dataset saved to {args.output}/")
 
-# Save enriched dataset
-df.to_csv("era5_features.csv", index=False)
+        save_state(state_path, state)
 
-print("✅ Feature-engineered dataset saved as era5_features.csv")
\ No newline at end of file
+        if args.csv:
+            dataset_store.export_csv(args.output, args.csv)
+            print(f"✅ CSV copy saved as {args.csv}")
@@ -1,17 +1,47 @@
-import xarray as xr
-import pandas as pd
+"""
+era5_loader.py
+Convert monthly ERA5 NetCDF downloads (era5_*.nc) into the partitioned
+era5_cleaned/ dataset (see dataset_store.py), with an optional CSV side output.
+
+By default files are streamed: each file is opened lazily and converted
+`--chunk-size` time steps at a time, so peak memory is set by the chunk size
+rather than by the length of the history or of a file. Chunks end on 3-hour
+boundaries, so hourly input never has a resample bin split across two chunks. `--in-memory` keeps the original
+concat-everything behaviour.
+
+`--incremental` only converts months whose source files are new or changed
+(tracked by size, mtime and SHA-256 in <output>/_manifest.json) and replaces
+just those months' partitions.
+
+A month's sources are the files download_era5.py recorded for it in
+era5_manifest.json, when that manifest sits next to the files. Without one,
+split downloads (era5_YYYY_MM_a.nc, _b.nc, _ab.nc, ...) replace the
+full-month file only if they cover the whole month and are all newer than it;
+leftovers of an abandoned split are ignored with a warning. Either way, rows
+repeated across a month's sources are dropped, keeping the first.
+"""
+
+import argparse
 import glob
+import hashlib
+import json
+import os
+import re
+
 import numpy as np
+import pandas as pd
+import xarray as xr
+
+import dataset_store
+from download_era5 import MANIFEST_FILE
+from instrumentation import span, stage
 
-files = sorted(glob.glob("era5_*.nc"))
-print(f"Found {len(files)} files")
 
-datasets = []
+RESAMPLE = pd.Timedelta("3h")   # output time step
 
-for f in files:
-    print(f"Loading {f}...")
-    ds = xr.open_dataset(f)
 
+def derive_fields(ds: xr.Dataset) -> xr.Dataset:
+    """Compute windspeed, temperature (°C) and pressure (hPa) from raw ERA5 variables."""
     # Normalize time coordinate
     if "valid_time" in ds.coords and "time" not in ds.coords:
         ds = ds.rename({"valid_time": "time"})
@@ -24,22 +54,263 @@ for f in files:
 
     windspeed = np.sqrt(u10**2 + v10**2)
 
-    ds_clean = xr.Dataset({
+    return xr.Dataset({
         'windspeed': windspeed,
         'temperature_C': t2m,
         'pressure_hPa': msl
     }, coords={'time': ds['time']})
 
-    datasets.append(ds_clean)
 
-# Concatenate with join override
-merged = xr.concat(datasets, dim='time', join="override")
+def chunk_bounds(times: np.ndarray, chunk_size: int, period: pd.Timedelta = RESAMPLE) -> list:
+    """
+    (start, stop) positions of chunks of at most `chunk_size` time steps that never
+    split a resample `period` bin; a bin longer than chunk_size becomes one chunk.
+    """
+    bins = times.astype("datetime64[ns]").view(np.int64) // period.value
+    bounds, start = [], 0
+    while start < len(bins):
+        stop = min(start + chunk_size, len(bins))
+        if stop < len(bins) and bins[stop] == bins[stop - 1]:
+            cut = int(np.searchsorted(bins, bins[stop], side="left"))
+            stop = cut if cut > start else int(np.searchsorted(bins, bins[stop], side="right"))
+        bounds.append((start, stop))
+        start = stop
+    return bounds
+
+
+def iter_chunks(files: list, chunk_size: int):
+    """
+    Yield derived datasets of at most `chunk_size` time steps, cut on resample bin boundaries.
+    Files are opened lazily and each chunk is derived on its own, so only the
+    current chunk is ever read into memory.
+    """
+    for f in files:
+        print(f"Loading {f}...")
+        # The file span also covers the consumer's work on each chunk (it runs while this generator is paused)
+        with span("file", bytes=os.path.getsize(f), file=os.path.basename(f)), xr.open_dataset(f) as ds:
+            time_dim = "time" if "time" in ds.dims else "valid_time"
+            for start, stop in chunk_bounds(ds[time_dim].values, chunk_size):
+                with span("decode") as s:
+                    chunk = derive_fields(ds.isel({time_dim: slice(start, stop)}).load())
+                    s.rows = chunk["windspeed"].size
+                yield chunk
+
+
+def iter_frames(files: list, chunk_size: int):
+    """Yield each chunk as a flat DataFrame, one row per (time, latitude, longitude)."""
+    for chunk in iter_chunks(files, chunk_size):
+        with span("to_frame") as s:
+            # Resample within the chunk (ERA5 is already 3-hourly, but ensures consistency)
+            chunk = chunk.resample(time=RESAMPLE).mean()
+            df = chunk.to_dataframe().reset_index()
+            s.rows = len(df)
+        yield df
+
+
+SOURCE_RE = re.compile(r"era5_(\d{4})_(\d{2})(?:_([a-z]+))?\.nc$")
+
+
+def _split_cover(splits: dict, suffix: str = "") -> list:
+    """Split files that together cover the day range `suffix` (halved into +a/+b), or None if any part is missing."""
+    if suffix in splits:
+        return [splits[suffix]]
+    if len(suffix) >= max(map(len, splits)):
+        return None
+    left, right = _split_cover(splits, suffix + "a"), _split_cover(splits, suffix + "b")
+    return left + right if left is not None and right is not None else None
+
+
+def _downloaded_files(directory: str, cache: dict) -> dict:
+    """download_era5.py's record of each completed month in `directory`: {"YYYY-MM": [file names]}."""
+    if directory not in cache:
+        path = os.path.join(directory, MANIFEST_FILE)
+        entries = {}
+        if os.path.exists(path):
+            with open(path) as fh:
+                entries = json.load(fh)
+        cache[directory] = {key: [os.path.basename(f) for f in e.get("files", [])]
+                            for key, e in entries.items() if e.get("status") == "completed"}
+    return cache[directory]
+
+
+def select_sources(files: list) -> dict:
+    """
+    Group files by month ("YYYY-MM") and pick the ones to ingest: the files the
+    download manifest lists for the month, else a complete set of split downloads
+    newer than the full-month file, else the full-month file.
+    """
+    groups = {}
+    for f in files:
+        m = SOURCE_RE.search(os.path.basename(f))
+        key = f"{m[1]}-{m[2]}" if m else os.path.basename(f)
+        groups.setdefault(key, []).append(f)
+
+    manifests, selected = {}, {}
+    for key, group in sorted(groups.items()):
+        by_name = {os.path.basename(f): f for f in group}
+        recorded = _downloaded_files(os.path.dirname(group[0]), manifests).get(key)
+        if recorded and all(name in by_name for name in recorded):
+            chosen = [by_name[name] for name in recorded]
+        else:
+            parts = {f: SOURCE_RE.search(os.path.basename(f)) for f in group}
+            full = [f for f, m in parts.items() if not (m and m[3])]
+            splits = {m[3]: f for f, m in parts.items() if m and m[3]}
+            cover = _split_cover(splits) if splits else None
+            if cover and full and min(map(os.path.getmtime, cover)) <= max(map(os.path.getmtime, full)):
+                cover = None   # the full month was downloaded after the split
+            chosen = sorted(cover) if cover else sorted(full)
+        ignored = sorted(set(group) - set(chosen))
+        if ignored:
+            print(f"⚠️ {key}: ignoring {', '.join(os.path.basename(f) for f in ignored)}")
+        selected[key] = chosen
+    return selected
+
+
+def deduplicate(df: pd.DataFrame, written: set) -> pd.DataFrame:
+    """
+    Drop rows repeated within `df` or already written for an earlier chunk of
+    the same month (their time is in `written`), keeping the first, as
+    validate_era5_full.py does. Adds the times kept to `written`.
+    """
+    keys = ["time"] + [c for c in ("latitude", "longitude") if c in df.columns]
+    df = df.drop_duplicates(subset=keys, keep="first")
+    df = df[~df["time"].isin(written)]
+    written.update(df["time"].unique())
+    return df
+
+
+def file_fingerprint(path: str, previous: dict = None) -> dict:
+    """Size, mtime and SHA-256 of a file. The hash is reused if size and mtime are unchanged."""
+    st = os.stat(path)
+    if previous and previous["size"] == st.st_size and previous["mtime"] == st.st_mtime:
+        return previous
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            sha.update(block)
+    return {"size": st.st_size, "mtime": st.st_mtime, "sha256": sha.hexdigest()}
+
+
+def load_manifest(output: str) -> dict:
+    path = os.path.join(output, "_manifest.json")
+    if os.path.exists(path):
+        with open(path) as fh:
+            return json.load(fh)
+    return {"files": {}, "months": {}}
+
+
+def save_manifest(output: str, manifest: dict) -> None:
+    os.makedirs(output, exist_ok=True)
+    path = os.path.join(output, "_manifest.json")
+    with open(path + ".tmp", "w") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def load_streaming(files: list, output: str, chunk_size: int = 248) -> int:
+    """
+    Convert the files select_sources() picks, chunk by chunk, appending each chunk
+    to the `output` dataset. Returns rows written.
+    """
+    dataset_store.clear(output)
+
+    rows = 0
+    manifest = load_manifest(output)
+    for key, sources in select_sources(files).items():
+        written = set()
+        for df in iter_frames(sources, chunk_size):
+            df = deduplicate(df, written)
+            dataset_store.write_partitions(df, output, mode="append")
+            rows += len(df)
+        # Record what was ingested so a later --incremental run starts from here
+        manifest["files"].update({f: file_fingerprint(f) for f in sources})
+        manifest["months"][key] = sources
+    save_manifest(output, manifest)
+    return rows
+
+
+def load_incremental(files: list, output: str, chunk_size: int = 248) -> int:
+    """
+    Re-convert only months whose selected source files are new or changed and
+    overwrite their partitions. Work is proportional to the changed months.
+    """
+    manifest = load_manifest(output)
+    rows = 0
+
+    for key, sources in select_sources(files).items():
+        previous = manifest["files"]
+        fingerprints = {f: file_fingerprint(f, previous.get(f)) for f in sources}
+        unchanged = manifest["months"].get(key) == sources and all(
+            previous.get(f, {}).get("sha256") == fp["sha256"] for f, fp in fingerprints.items())
+        manifest["files"].update(fingerprints)
+        if unchanged:
+            continue
+
+        df = deduplicate(pd.concat(iter_frames(sources, chunk_size), ignore_index=True), set())
+        df = df.sort_values(["time"] + [c for c in ("latitude", "longitude") if c in df.columns])
+
+        dataset_store.write_partitions(df, output)
+        manifest["months"][key] = sources
+        save_manifest(output, manifest)
+        print(f"🔄 Updated {key} ({len(df)} rows)")
+        rows += len(df)
+
+    save_manifest(output, manifest)
+    return rows
+
+
+def load_in_memory(files: list, output: str) -> int:
+    """Original behaviour: load every file, concatenate, then export in one go."""
+    datasets = []
+
+    for f in files:
+        print(f"Loading {f}...")
+        with span("file", bytes=os.path.getsize(f), file=os.path.basename(f)):
+            datasets.append(derive_fields(xr.open_dataset(f)))
+
+    with span("concat_resample"):
+        # Concatenate with join override
+        merged = xr.concat(datasets, dim='time', join="override")
+
+        # Resample to 3-hourly (ERA5 is already 3-hourly, but ensures consistency)
+        merged = merged.resample(time=RESAMPLE).mean()
+
+    with span("to_frame") as s:
+        df = merged.to_dataframe().reset_index()
+        s.rows = len(df)
+    dataset_store.clear(output)
+    dataset_store.write_partitions(df, output)
+    return len(df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert ERA5 NetCDF files to the era5_cleaned dataset")
+    parser.add_argument("--pattern", default="era5_*.nc", help="glob for input NetCDF files")
+    parser.add_argument("--output", default="era5_cleaned", help="partitioned dataset directory")
+    parser.add_argument("--csv", metavar="PATH", help="also export the dataset to a single CSV")
+    parser.add_argument("--chunk-size", type=int, default=248,
+                        help="time steps converted per chunk (248 = one 31-day month at 3h)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--in-memory", action="store_true",
+                      help="load all files at once (original behaviour, unbounded memory)")
+    mode.add_argument("--incremental", action="store_true",
+                      help="only convert new or changed files and merge them into the dataset")
+    args = parser.parse_args()
+
+    with stage("era5_loader"):
+        files = sorted(glob.glob(args.pattern))
+        print(f"Found {len(files)} files")
 
-# Resample to 3-hourly (ERA5 is already 3-hourly, but ensures consistency)
-merged = merged.resample(time="3H").mean()
+        if args.incremental:
+            rows = load_incremental(files, args.output, args.chunk_size)
+        elif args.in_memory:
+            rows = load_in_memory([f for fs in select_sources(files).values() for f in fs], args.output)
+        else:
+            rows = load_streaming(files, args.output, args.chunk_size)
 
-# Export to CSV
-df = merged.to_dataframe().reset_index()
-df.to_csv("era5_cleaned.csv", index=False)
+        print(f"✅ Exported {rows} rows to {args.output}/")
 
-print("✅ Exported merged dataset to era5_cleaned.csv")
\ No newline at end of file
+        if args.csv:
+            dataset_store.export_csv(args.output, args.csv)
+            print(f"✅ CSV copy saved as {args.csv}")
@@ -0,0 +1,125 @@
+"""
+forecast.py
+Direct multi-horizon windspeed forecasts with the models of train_horizons.py.
+
+For every cell, the latest origin with a complete lag window is forecast at
+every horizon the models were trained on. The output has one row per
+(cell, lead time) with:
+  the cell's coordinates;
+  origin time, lead hours and valid time;
+  one <model>_Forecast column per model.
+
+--backtest START scores every origin from START on whose targets are known,
+batch by batch, with RMSE per lead time next to persistence. The tensor is
+built once per distinct model spec (window, horizons, columns), from the
+spec stored in the registry.
+
+  python forecast.py                                  # latest forecasts -> forecasts.csv
+  python forecast.py --backtest 2020-10-01            # RMSE by lead time -> backtest_metrics.csv
+"""
+
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from horizons import TENSOR_DTYPE, HorizonTensor, feature_names
+from instrumentation import span, stage
+from model_registry import REGISTRY_DIR, ModelRegistry
+from train_horizons import HORIZON_MODELS, evaluate, horizon_table, read_tensor
+
+
+def load_direct_models(registry_dir: str = REGISTRY_DIR, names: list = None) -> dict:
+    """
+    {spec: {name: model}}: the latest version of every direct model, grouped by
+    the tensor spec it was trained on and checked against that spec's inputs.
+    """
+    registry = ModelRegistry(registry_dir)
+    groups = {}
+    for name in names or [n for n in HORIZON_MODELS if registry.versions(n)]:
+        spec = registry.metadata(name)["horizons"]
+        features = feature_names(spec["window"], spec["lag_columns"], spec["origin_columns"])
+        model = registry.lazy(name, features=features, feature_dtype=TENSOR_DTYPE)
+        groups.setdefault(json.dumps(spec, sort_keys=True), {})[name] = model
+    return groups
+
+
+def latest_origins(tensor: HorizonTensor) -> tuple:
+    """(cells, ts): the newest origin with a complete lag window in each cell that has one."""
+    mask = tensor.origins(targets=False)
+    has = mask.any(axis=1)
+    last = mask.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
+    cells = np.flatnonzero(has)
+    return cells, last[cells]
+
+
+def forecast_latest(models: dict, tensor: HorizonTensor) -> pd.DataFrame:
+    cells, ts = latest_origins(tensor)
+    X, _ = tensor.take(cells, ts, targets=False)
+    n_h = len(tensor.horizons)
+    origin = tensor.times[np.repeat(ts, n_h)]
+    lead = np.tile(tensor.horizons, len(cells))
+    out = tensor.cells.iloc[np.repeat(cells, n_h)].reset_index(drop=True)
+    out["origin"] = origin
+    out["lead_hours"] = lead
+    out["valid_time"] = origin + pd.to_timedelta(lead, unit="h")
+    for name, model in models.items():
+        with span("score", rows=len(X), model=name):
+            out[f"{name}_Forecast"] = model.predict(X).reshape(len(X), n_h).ravel()
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast windspeed at every lead time with the direct models")
+    parser.add_argument("--input", default="era5_features", help="features dataset directory (or legacy CSV)")
+    parser.add_argument("--models", nargs="+", choices=list(HORIZON_MODELS), help="default: every registered one")
+    parser.add_argument("--registry", default=REGISTRY_DIR, help="model registry directory")
+    parser.add_argument("--output", default="forecasts.csv")
+    parser.add_argument("--backtest", metavar="START", help="score the origins from this time on instead")
+    parser.add_argument("--batch-size", type=int, default=65_536, help="origins materialized at a time")
+    parser.add_argument("--report", default="backtest_metrics.csv", help="CSV of RMSE per lead time (--backtest)")
+    args = parser.parse_args()
+
+    with stage("forecast"):
+        groups = load_direct_models(args.registry, args.models)
+        if not groups:
+            raise SystemExit(f"No direct models registered in {args.registry}; run train_horizons.py first")
+
+        forecasts, tables = [], []
+        for spec, models in groups.items():
+            spec = json.loads(spec)
+            tensor = read_tensor(args.input, spec["window"], spec["horizons"], spec["lag_columns"],
+                                 spec["origin_columns"], spec["target"])
+            for name, model in models.items():
+                print(f"🔹 {name} {model.meta['version']} (window {spec['window']}, "
+                      f"leads {spec['horizons'][0]}-{spec['horizons'][-1]} h)")
+
+            if args.backtest:
+                start = int(np.searchsorted(tensor.times, pd.Timestamp(args.backtest)))
+                mask = tensor.origins(start=start)
+                if not mask.any():
+                    raise SystemExit(f"No origins from {args.backtest} with all {spec['horizons'][-1]} h of "
+                                     f"targets; the data ends at {tensor.times[-1]}")
+                overall, by_horizon = evaluate(models, tensor, mask, args.batch_size)
+                tables.append(horizon_table(tensor, by_horizon))
+                print(pd.DataFrame([{"Model": n, **m} for n, m in overall.items()]).to_string(index=False))
+            else:
+                forecasts.append(forecast_latest(models, tensor))
+
+        if args.backtest:
+            table = tables[0]
+            for other in tables[1:]:
+                table = table.merge(other, on="Lead (h)", how="outer", suffixes=("", " (2)"))
+            table.to_csv(args.report, index=False)
+            print(f"\n📊 Backtest RMSE by lead time from {args.backtest}")
+            print(table.to_string(index=False, float_format="%.4f"))
+            print(f"✅ Backtest metrics saved to {args.report}")
+        else:
+            keys = [c for c in forecasts[0].columns if not c.endswith("_Forecast")]
+            out = forecasts[0]
+            for other in forecasts[1:]:
+                out = out.merge(other, on=keys, how="outer")
+            with span("write_csv", rows=len(out)):
+                out.to_csv(args.output, index=False)
+            print(f"✅ {len(out):,} forecasts from {out['origin'].max()} saved to {args.output}")
@@ -0,0 +1,263 @@
+"""
+gaps.py
+Streaming gap and duplicate detection, and short-gap filling, for long-form
+time series with one series per cell (a grid point or a station).
+
+Timestamps become integer step indices, (t - epoch) // step, so each cell's
+series is a set of integers. Every (cell, step) seen so far is one bit of a
+packed StepMask: 40 years of 3-hourly data at 325 grid points take 4.7 MB. A
+row whose bit is already set is a duplicate, including when the first copy
+came in an earlier batch. Duplicates are dropped, keeping the first.
+
+Within a batch, rows are sorted by (cell, step). The step difference to the
+cell's previous row gives every gap. The previous row comes from the same
+batch or is carried over from the last one. Gaps of up to `max_fill` steps
+are filled with linearly interpolated rows, flagged filled=True. Longer gaps
+are reported and left open. Other columns of a filled row are copied from
+the next observed row. era5_features.py builds its grid on a regular
+step axis, so the missing steps of a long gap become NaN, and the rolling
+windows restart after it rather than spanning it.
+
+Only one batch is in memory at a time, plus the mask and one carried row per
+cell. Each cell's rows must arrive in time order across batches, as they do
+from monthly partitions or per-station files. Rows that do not are counted as
+out of order and passed through. Timestamps off the step grid are passed
+through too, and take no part in the checks.
+"""
+
+import numpy as np
+import pandas as pd
+
+NONE = np.iinfo(np.int64).min   # "no step yet" in the per-cell carries
+
+
+class StepMask:
+    """Packed (cell, step) bitmap that grows as new cells and later steps arrive."""
+
+    def __init__(self):
+        self.bits = np.zeros((0, 0), dtype=np.uint8)
+        self.origin = None   # step held by bit 0 of byte 0; a multiple of 8
+
+    def _reserve(self, n_cells: int, lo: int, hi: int) -> None:
+        """Make room for cells < n_cells and steps lo..hi, with spare capacity on both axes."""
+        if self.origin is None:
+            self.origin = lo // 8 * 8
+        rows, width = self.bits.shape
+        extra_left = max(0, (self.origin - lo + 7) // 8)
+        need_width = (hi - self.origin) // 8 + 1 + extra_left
+        if n_cells <= rows and need_width <= width and not extra_left:
+            return
+        new_rows = max(n_cells, 2 * rows) if n_cells > rows else rows
+        new_width = width + extra_left   # shifting left keeps every existing byte
+        if need_width > new_width:
+            new_width = max(need_width, 2 * width)
+        bits = np.zeros((new_rows, new_width), dtype=np.uint8)
+        bits[:rows, extra_left:extra_left + width] = self.bits
+        self.bits = bits
+        self.origin -= 8 * extra_left
+
+    def test_and_set(self, cells: np.ndarray, steps: np.ndarray) -> np.ndarray:
+        """Set the bits of distinct (cell, step) pairs; returns which of them were set already."""
+        if not len(cells):
+            return np.zeros(0, dtype=bool)
+        self._reserve(int(cells.max()) + 1, int(steps.min()), int(steps.max()))
+        offset = steps - self.origin
+        byte, bit = offset >> 3, (1 << (offset & 7)).astype(np.uint8)
+        seen = (self.bits[cells, byte] & bit) != 0
+        np.bitwise_or.at(self.bits, (cells, byte), bit)
+        return seen
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+
+class CellIndex:
+    """Stable integer codes for the cells (unique combinations of `columns`) seen across batches."""
+
+    def __init__(self, columns: list):
+        self.columns = columns
+        self.cells = None   # one row per code, in first-seen order
+
+    def __len__(self) -> int:
+        return 0 if self.cells is None else len(self.cells)
+
+    def codes(self, df: pd.DataFrame) -> np.ndarray:
+        if not self.columns:   # one series for the whole dataset
+            self.cells = pd.DataFrame(index=range(1))
+            return np.zeros(len(df), dtype=np.int64)
+        local = np.zeros(len(df), dtype=np.int64)
+        for col in self.columns:
+            codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+            local = local * len(uniques) + codes
+        combo, combos = pd.factorize(local)
+        first = np.empty(len(combos), dtype=np.int64)
+        first[combo[::-1]] = np.arange(len(df))[::-1]   # first row of every combination
+        found = df[self.columns].iloc[first].reset_index(drop=True)
+
+        if self.cells is None:
+            self.cells = found
+            return combo.astype(np.int64)
+        known = pd.MultiIndex.from_frame(self.cells).get_indexer(pd.MultiIndex.from_frame(found))
+        new = known < 0
+        known[new] = len(self.cells) + np.arange(int(new.sum()))
+        self.cells = pd.concat([self.cells, found[new]], ignore_index=True)
+        return known[combo]
+
+
+class GapScanner:
+    """
+    Feed batches to scan(); each returns the batch without duplicates and with
+    its short gaps filled. report() lists every gap found.
+    """
+
+    def __init__(self, cell_columns: list, step: pd.Timedelta = pd.Timedelta("3h"), max_fill: int = 2,
+                 time_col: str = "time"):
+        self.step = pd.Timedelta(step)
+        self.step_ns = self.step.value
+        self.max_fill = max_fill
+        self.time_col = time_col
+        self.index = CellIndex(cell_columns)
+        self.mask = StepMask()
+        self.value_columns = None
+        self.first = np.zeros(0, dtype=np.int64)   # per cell: first and last step, last row's values
+        self.last = np.zeros(0, dtype=np.int64)
+        self.last_values = np.zeros((0, 0))
+        # per batch: (cells, first missing step, steps, whether the returned batch filled it)
+        self.gaps = [(np.zeros(0, dtype=np.int64),) * 3 + (np.zeros(0, dtype=bool),)]
+        self.counts = dict(rows=0, duplicates=0, off_grid=0, out_of_order=0, filled_rows=0)
+
+    def _grow(self, n_cells: int) -> None:
+        if n_cells <= len(self.last):
+            return
+        extra = n_cells - len(self.last)
+        self.first = np.concatenate([self.first, np.full(extra, NONE)])
+        self.last = np.concatenate([self.last, np.full(extra, NONE)])
+        self.last_values = np.vstack([self.last_values, np.full((extra, len(self.value_columns)), np.nan)])
+
+    def scan(self, df: pd.DataFrame, repair: bool = True):
+        """Check one batch. Returns the repaired batch, sorted by (time, cell), or None unless `repair`."""
+        if self.value_columns is None:
+            skip = set(self.index.columns) | {self.time_col, "filled"}
+            self.value_columns = [c for c in df.columns if c not in skip and pd.api.types.is_float_dtype(df[c])]
+            self.last_values = np.zeros((0, len(self.value_columns)))
+        self.counts["rows"] += len(df)
+
+        times = df[self.time_col].to_numpy(dtype="datetime64[ns]")
+        steps, remainder = np.divmod(times.view(np.int64), self.step_ns)
+        on_grid = ~np.isnat(times) & (remainder == 0)
+        cells = self.index.codes(df)
+        self._grow(len(self.index))
+        self.counts["off_grid"] += int((~on_grid).sum())
+
+        # --- Duplicates: repeated within the batch, or already in the mask ---
+        rows = np.flatnonzero(on_grid)
+        order = np.lexsort((steps[rows], cells[rows]))
+        rows = rows[order]
+        c, s = cells[rows], steps[rows]
+        distinct = np.ones(len(rows), dtype=bool)
+        distinct[1:] = (c[1:] != c[:-1]) | (s[1:] != s[:-1])
+        keep = distinct.copy()
+        keep[np.flatnonzero(distinct)[self.mask.test_and_set(c[distinct], s[distinct])]] = False
+        self.counts["duplicates"] += int((~keep).sum())
+        rows, c, s = rows[keep], c[keep], s[keep]
+
+        # --- Gaps: step difference to the cell's previous row (carried across batches) ---
+        starts = np.ones(len(rows), dtype=bool)
+        starts[1:] = c[1:] != c[:-1]
+        ends = np.append(starts[1:], True)
+        prev = np.empty_like(s)
+        prev[1:] = s[:-1]
+        prev[starts] = NONE
+        carried = self.last[c]
+        prev = np.maximum(prev, carried)   # an out-of-order row never shortens the gap after the carry
+        late = (prev != NONE) & (s <= prev)
+        self.counts["out_of_order"] += int(late.sum())
+        missing = np.where((prev != NONE) & ~late, s - prev - 1, 0)
+        gap = np.flatnonzero(missing > 0)
+        filled = (missing[gap] <= self.max_fill) & bool(repair and self.value_columns)
+        self.gaps.append((c[gap], prev[gap] + 1, missing[gap], filled))
+
+        values = df[self.value_columns].to_numpy(dtype=np.float64)[rows] if self.value_columns else None
+        left = None
+        if repair and self.value_columns:
+            fill = gap[missing[gap] <= self.max_fill]
+            from_carry = (prev[fill] == carried[fill])[:, None]
+            left = np.where(from_carry, self.last_values[c[fill]], values[np.maximum(fill - 1, 0)])
+
+        # --- Carry each cell's first and last step, and its last row's values ---
+        first = self.first[c[starts]]
+        self.first[c[starts]] = np.where(first == NONE, s[starts], np.minimum(first, s[starts]))
+        newer = ends & (s > self.last[c])
+        self.last[c[newer]] = s[newer]
+        if self.value_columns:
+            self.last_values[c[newer]] = values[newer]
+
+        if not repair:
+            return None
+        return self._repaired(df, cells, steps, on_grid, rows, s, gap, missing, values, left)
+
+    def _repaired(self, df, cells, steps, on_grid, rows, s, gap, missing, values, left) -> pd.DataFrame:
+        fill = gap[missing[gap] <= self.max_fill]
+        lengths = missing[fill]
+        kept = np.sort(np.concatenate([rows, np.flatnonzero(~on_grid)]))
+        out = df.iloc[kept].reset_index(drop=True)
+        if "filled" not in out.columns:
+            out["filled"] = False
+        out_cells, out_steps = cells[kept], steps[kept]
+
+        if len(fill):
+            # k-th missing step of a gap of n: left + (right - left) * k / (n + 1)
+            anchor = np.repeat(np.arange(len(fill)), lengths)
+            k = np.arange(len(anchor)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + 1
+            filled = df.iloc[rows[fill][anchor]].reset_index(drop=True)   # the right anchor row
+            new_steps = s[fill][anchor] - lengths[anchor] - 1 + k
+            filled[self.time_col] = (new_steps * self.step_ns).astype("datetime64[ns]").astype(df[self.time_col].dtype)
+            if self.value_columns:
+                frac = (k / (lengths[anchor] + 1))[:, None]
+                right = values[fill][anchor]
+                filled[self.value_columns] = left[anchor] + (right - left[anchor]) * frac
+            filled["filled"] = True
+            self.counts["filled_rows"] += len(filled)
+            out = pd.concat([out, filled], ignore_index=True)
+            out_cells = np.concatenate([out_cells, cells[rows[fill]][anchor]])
+            out_steps = np.concatenate([out_steps, new_steps])
+
+        order = np.lexsort((out_cells, np.where(np.isnat(out[self.time_col].to_numpy(dtype="datetime64[ns]")),
+                                                 np.iinfo(np.int64).max, out_steps)))
+        return out.iloc[order].reset_index(drop=True)
+
+    def report(self) -> pd.DataFrame:
+        """
+        One row per gap: the cell, first and last missing time, length in steps, and
+        the action: "filled", "fillable" (short enough, but scanned without repair),
+        "open" (longer than max_fill), or "leading"/"trailing" for steps missing
+        before a cell's first row or after its last, relative to the whole dataset.
+        """
+        cells, starts, lengths, filled = (np.concatenate(parts) for parts in zip(*self.gaps))
+        actions = np.where(filled, "filled", np.where(lengths <= self.max_fill, "fillable", "open")).astype(object)
+
+        seen = np.flatnonzero(self.first != NONE)
+        if len(seen):
+            lo, hi = self.first[seen].min(), self.last[seen].max()
+            lead = seen[self.first[seen] > lo]
+            trail = seen[self.last[seen] < hi]
+            cells = np.concatenate([cells, lead, trail])
+            starts = np.concatenate([starts, np.full(len(lead), lo), self.last[trail] + 1])
+            lengths = np.concatenate([lengths, self.first[lead] - lo, hi - self.last[trail]])
+            actions = np.concatenate([actions, ["leading"] * len(lead), ["trailing"] * len(trail)])
+
+        table = self.index.cells.iloc[cells].reset_index(drop=True) if len(self.index) else pd.DataFrame()
+        table["start"] = (starts * self.step_ns).astype("datetime64[ns]")
+        table["end"] = ((starts + lengths - 1) * self.step_ns).astype("datetime64[ns]")
+        table["steps"] = lengths
+        table["action"] = actions
+        return table.sort_values(["start"] + self.index.columns, kind="stable", ignore_index=True)
+
+    def summary(self) -> dict:
+        seen = self.first != NONE
+        span = int(self.last[seen].max() - self.first[seen].min() + 1) if seen.any() else 0
+        observed = self.counts["rows"] - self.counts["duplicates"] - self.counts["off_grid"]
+        return {**self.counts, "cells": int(seen.sum()), "steps": span,
+                "complete (%)": 100.0 * observed / (span * int(seen.sum())) if span else 100.0,
+                "mask_bytes": self.mask.nbytes}
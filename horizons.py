@@ -0,0 +1,239 @@
+"""
+horizons.py
+Lag windows and lead targets for direct multi-horizon forecasting.
+
+Each variable is held once, as a (cell, time) float32 array in which every
+cell's series is contiguous. For a forecast origin t, the model inputs are:
+  the last `window` values of the lag columns, up to and including t;
+  the origin columns at t;
+  the time of day and year at t.
+The targets are windspeed at t + h for every horizon h. Lag windows and lead
+targets are strided sliding_window_view views of the series. No shifted copy
+is made, so with 24 horizons and a 56-step window the tensors take no more
+memory than the series. Rows are materialized only at the model boundary,
+batch by batch (HorizonTensor.batches).
+
+train_horizons.py fits the direct models on these tensors, and forecast.py
+applies them.
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.base import BaseEstimator, RegressorMixin
+
+from era5_features import grid_index
+
+DEFAULT_HORIZONS = list(range(3, 75, 3))   # hours ahead: +3 h ... +72 h
+DEFAULT_WINDOW = 56                        # lag steps: 7 days of 3-hourly data
+LAG_COLUMNS = ["windspeed"]
+ORIGIN_COLUMNS = ["temperature_C", "pressure_hPa"]
+TARGET = "windspeed"
+CALENDAR = ["hour_sin", "hour_cos", "doy_sin", "doy_cos"]
+TENSOR_DTYPE = "float32"                   # dtype of the series and of every materialized batch
+
+
+def feature_names(window: int = DEFAULT_WINDOW, lag_columns: list = LAG_COLUMNS,
+                  origin_columns: list = ORIGIN_COLUMNS) -> list:
+    """Model input columns, oldest lag first; this is the registry schema of the direct models."""
+    lags = [f"{c}_t-{k}" for c in lag_columns for k in range(window - 1, -1, -1)]
+    return lags + list(origin_columns) + CALENDAR
+
+
+def cell_series(df: pd.DataFrame, columns: list) -> tuple:
+    """
+    Scatter long-form columns into contiguous (cell, time) float32 arrays; missing points are NaN.
+    Returns (series, times, cells): a dict of arrays, the regular time axis, and
+    the coordinates of every cell. Time steps missing from the data get NaN
+    columns, so lags and leads counted in array positions stay whole steps apart.
+    """
+    time_codes, positions, times, n_cells, levels = grid_index(df, regular=True)
+    series = {}
+    for col in columns:
+        values = df[col].to_numpy()
+        out = np.full((n_cells, len(times)), np.nan, dtype=np.float32)
+        if positions is None:
+            out[:] = values.reshape(len(times), n_cells).T
+        else:
+            out[positions % n_cells, time_codes] = values
+        series[col] = out
+
+    cells = pd.DataFrame(levels)
+    return series, times, cells
+
+
+def step_hours(times: pd.DatetimeIndex) -> float:
+    if len(times) < 2:
+        raise ValueError("need at least two time steps to infer the step length")
+    return float((times[1:] - times[:-1]).median() / pd.Timedelta(hours=1))
+
+
+def trailing_complete(values: np.ndarray, window: int) -> np.ndarray:
+    """(cell, time) mask: True where the `window` values up to and including t are all finite."""
+    missing = np.zeros((values.shape[0], values.shape[1] + 1), dtype=np.int32)
+    np.cumsum(np.isnan(values), axis=1, out=missing[:, 1:])
+    complete = np.zeros(values.shape, dtype=bool)
+    complete[:, window - 1:] = (missing[:, window:] - missing[:, :-window]) == 0
+    return complete
+
+
+class HorizonTensor:
+    """
+    Lag-window inputs and lead targets over every (cell, origin) of a set of series.
+
+    `lags[c][cell, t - window + 1]` is the window of column c ending at t, and
+    `leads[cell, t, s - 1]` is the target s steps after t. Both are views, so
+    the arrays are only indexed (and copied) for the rows of one batch.
+    """
+
+    def __init__(self, series: dict, times: pd.DatetimeIndex, cells: pd.DataFrame,
+                 window: int = DEFAULT_WINDOW, horizons: list = DEFAULT_HORIZONS,
+                 lag_columns: list = LAG_COLUMNS, origin_columns: list = ORIGIN_COLUMNS, target: str = TARGET):
+        self.series, self.times, self.cells = series, times, cells
+        self.window, self.horizons = window, list(horizons)
+        self.lag_columns, self.origin_columns, self.target = list(lag_columns), list(origin_columns), target
+        self.step_hours = step_hours(times)
+
+        steps = np.asarray(self.horizons, dtype=np.float64) / self.step_hours
+        if np.any(steps != np.round(steps)) or np.any(steps < 1):
+            raise ValueError(f"horizons {self.horizons} h are not whole multiples of the {self.step_hours:g} h step")
+        self.steps = steps.astype(np.int64)
+        if len(times) < window + self.steps.max():
+            raise ValueError(f"{len(times)} time steps cannot hold a {window}-step window and "
+                             f"a {self.steps.max()}-step lead")
+
+        self.lags = {c: sliding_window_view(series[c], window, axis=1) for c in self.lag_columns}
+        self.leads = sliding_window_view(series[target][:, 1:], int(self.steps.max()), axis=1)
+        hour = (times.hour.to_numpy() + times.minute.to_numpy() / 60) * (2 * np.pi / 24)
+        day = times.dayofyear.to_numpy() * (2 * np.pi / 365.25)
+        self.calendar = np.column_stack([np.sin(hour), np.cos(hour), np.sin(day), np.cos(day)]).astype(np.float32)
+        self.feature_names = feature_names(window, self.lag_columns, self.origin_columns)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, **kwargs) -> "HorizonTensor":
+        columns = (kwargs.get("lag_columns", LAG_COLUMNS) + kwargs.get("origin_columns", ORIGIN_COLUMNS)
+                   + [kwargs.get("target", TARGET)])
+        columns = list(dict.fromkeys(columns))
+        series, times, cells = cell_series(df, columns)
+        return cls(series, times, cells, **kwargs)
+
+    @property
+    def spec(self) -> dict:
+        """What forecast.py needs to rebuild the tensor a model was trained on."""
+        return {"window": self.window, "horizons": self.horizons, "step_hours": self.step_hours,
+                "lag_columns": self.lag_columns, "origin_columns": self.origin_columns, "target": self.target}
+
+    @property
+    def nbytes(self) -> int:
+        """Memory actually held: the series and the calendar; the views add nothing."""
+        return sum(s.nbytes for s in self.series.values()) + self.calendar.nbytes
+
+    def origins(self, start: int = 0, stop: int = None, targets: bool = True) -> np.ndarray:
+        """
+        (cell, time) mask of the usable origins with a time index in [start, stop):
+        complete lag windows and origin values, and every lead target too if `targets`.
+        """
+        mask = np.ones(self.series[self.target].shape, dtype=bool)
+        for c in self.lag_columns:
+            mask &= trailing_complete(self.series[c], self.window)
+        for c in self.origin_columns:
+            mask &= ~np.isnan(self.series[c])
+        mask[:, :self.window - 1] = False
+        if targets:
+            finite = ~np.isnan(self.series[self.target])
+            mask[:, len(self.times) - self.steps.max():] = False
+            for s in self.steps:
+                mask[:, :-s] &= finite[:, s:]
+        mask[:, :start] = False
+        if stop is not None:
+            mask[:, stop:] = False
+        return mask
+
+    def take(self, cells: np.ndarray, ts: np.ndarray, targets: bool = True) -> tuple:
+        """Materialize the (X, Y) rows of origins (cells, ts); Y is None without targets."""
+        X = np.empty((len(cells), len(self.feature_names)), dtype=np.float32)
+        col = 0
+        for c in self.lag_columns:
+            X[:, col:col + self.window] = self.lags[c][cells, ts - (self.window - 1)]
+            col += self.window
+        for c in self.origin_columns:
+            X[:, col] = self.series[c][cells, ts]
+            col += 1
+        X[:, col:] = self.calendar[ts]
+        Y = self.leads[cells[:, None], ts[:, None], self.steps - 1] if targets else None
+        return X, Y
+
+    def batches(self, mask: np.ndarray, batch_size: int = 65_536, targets: bool = True):
+        """Yield (cells, ts, X, Y) for the origins in `mask`, at most batch_size rows at a time."""
+        flat = mask.reshape(-1)
+        for start in range(0, flat.size, batch_size):
+            idx = np.flatnonzero(flat[start:start + batch_size]) + start
+            if len(idx):
+                cells, ts = np.divmod(idx, len(self.times))
+                yield (cells, ts) + self.take(cells, ts, targets)
+
+    def materialize(self, mask: np.ndarray, max_rows: int = None, seed: int = 0,
+                    batch_size: int = 65_536) -> tuple:
+        """(X, Y) for the origins in `mask`, thinned at random to about `max_rows` rows."""
+        n = int(mask.sum())
+        keep = 1.0 if not max_rows or max_rows >= n else max_rows / n
+        rng = np.random.default_rng(seed)
+        X, Y = [], []
+        for _, _, X_batch, Y_batch in self.batches(mask, batch_size):
+            if keep < 1.0:
+                chosen = rng.random(len(X_batch)) < keep
+                X_batch, Y_batch = X_batch[chosen], Y_batch[chosen]
+            X.append(X_batch)
+            Y.append(Y_batch)
+        return np.concatenate(X), np.concatenate(Y)
+
+
+class BatchRidge(RegressorMixin, BaseEstimator):
+    """
+    Multi-output ridge regression fitted batch by batch.
+
+    partial_fit accumulates the normal equations (X'X, X'Y and the column sums)
+    in float64, so fitting on batches gives the same coefficients as one fit()
+    over all rows. The penalty `alpha` applies to the coefficients of the
+    standardized inputs, as in Ridge on StandardScaler output.
+    """
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+
+    def fit(self, X: np.ndarray, Y: np.ndarray):
+        for attr in ("n_samples_seen_", "xtx_", "xty_", "sum_x_", "sum_y_"):
+            self.__dict__.pop(attr, None)
+        return self.partial_fit(X, Y)
+
+    def partial_fit(self, X: np.ndarray, Y: np.ndarray):
+        X = np.asarray(X, dtype=np.float64)
+        Y = np.asarray(Y, dtype=np.float64).reshape(len(X), -1)
+        if not hasattr(self, "xtx_"):
+            self.n_features_in_ = X.shape[1]
+            self.n_samples_seen_ = 0
+            self.xtx_ = np.zeros((X.shape[1], X.shape[1]))
+            self.xty_ = np.zeros((X.shape[1], Y.shape[1]))
+            self.sum_x_, self.sum_y_ = np.zeros(X.shape[1]), np.zeros(Y.shape[1])
+        self.n_samples_seen_ += len(X)
+        self.xtx_ += X.T @ X
+        self.xty_ += X.T @ Y
+        self.sum_x_ += X.sum(axis=0)
+        self.sum_y_ += Y.sum(axis=0)
+        self._solve()
+        return self
+
+    def _solve(self) -> None:
+        n = self.n_samples_seen_
+        mean_x, mean_y = self.sum_x_ / n, self.sum_y_ / n
+        xtx = self.xtx_ - n * np.outer(mean_x, mean_x)
+        xty = self.xty_ - n * np.outer(mean_x, mean_y)
+        scale = np.sqrt(np.maximum(np.diag(xtx), 0.0) / n)
+        scale[scale == 0] = 1.0
+        A = xtx / np.outer(scale, scale) + self.alpha * np.eye(len(scale))
+        coef = np.linalg.solve(A, xty / scale[:, None]) / scale[:, None]
+        self.coef_ = coef.T
+        self.intercept_ = mean_y - mean_x @ coef
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return np.asarray(X, dtype=np.float64) @ self.coef_.T + self.intercept_
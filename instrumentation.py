@@ -0,0 +1,296 @@
+"""
+instrumentation.py
+Named spans, Chrome traces and opt-in profiling for the pipeline stages.
+
+Each stage script runs its work inside stage("<name>"), and marks the
+interesting steps with span("<name>", rows=..., bytes=...). A span records:
+  wall time;
+  CPU time of this process plus any child processes reaped inside it;
+  RSS at exit, and the peak RSS while the span was open;
+  rows and bytes processed, plus any extra arguments.
+Peak RSS is the kernel's high-water mark (VmHWM). The mark is reset at every
+span boundary, so a span's peak covers its own lifetime, not the whole process.
+Without the Unix resource module (Windows), CPU time covers this process only
+and memory comes from psutil if it is installed, or is left out.
+
+Tracing is off unless PIPELINE_TRACE names a trace file:
+  PIPELINE_TRACE=trace.json python era5_loader.py
+Every process appends complete ("X") events to the file, including pool
+workers, which inherit the variable. The file uses Chrome's JSON Array Format,
+where the closing bracket is optional. That lets several stages and workers
+share one file, and a crashed run still leaves a readable trace. Open it in
+chrome://tracing or https://ui.perfetto.dev, or summarise it with
+  python instrumentation.py trace.json
+
+Profiling is off unless PIPELINE_PROFILE names stages (comma separated, or "all"):
+  PIPELINE_PROFILE=era5_features python era5_features.py      # cProfile -> profiles/era5_features.prof
+  PIPELINE_PROFILE=train_models PIPELINE_PROFILER=sample python train_models.py
+The sampler reads the main thread's stack every PIPELINE_SAMPLE_MS (default
+5) milliseconds. It writes collapsed stacks to profiles/<stage>.folded, the
+input format of flamegraph.pl and speedscope. Either way the hottest functions
+are printed when the stage ends. PIPELINE_PROFILE_DIR changes the output folder.
+"""
+
+import argparse
+import collections
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+try:
+    import resource   # Unix only
+except ImportError:
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+TRACE_ENV = "PIPELINE_TRACE"
+PROFILE_ENV = "PIPELINE_PROFILE"
+PROFILER_ENV = "PIPELINE_PROFILER"
+PROFILE_DIR_ENV = "PIPELINE_PROFILE_DIR"
+SAMPLE_MS_ENV = "PIPELINE_SAMPLE_MS"
+
+_open = []            # spans open in this process, outermost first
+_stage = None         # name of the running stage, inherited by forked workers
+_stage_pid = None
+_named_pid = None     # process whose process_name event has been written
+_can_reset_hwm = os.path.exists("/proc/self/clear_refs")
+
+
+def tracing() -> bool:
+    return bool(os.environ.get(TRACE_ENV))
+
+
+def memory_mb() -> tuple:
+    """(current RSS, high-water mark) of this process in MB; (None, None) where neither can be read."""
+    try:
+        with open("/proc/self/status") as fh:
+            fields = dict(line.split(":", 1) for line in fh if line.startswith(("VmRSS", "VmHWM")))
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+        return peak, peak
+    if psutil is not None:   # Windows: the working set and its peak
+        info = psutil.Process().memory_info()
+        return info.rss / (1024 * 1024), getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    return None, None
+
+
+def _mark_peak() -> float:
+    """Fold the high-water mark into every open span, reset it, and return the current RSS."""
+    global _can_reset_hwm
+    current, hwm = memory_mb()
+    for s in _open:
+        if hwm is not None:
+            s.peak_mb = max(s.peak_mb, hwm)
+    if _can_reset_hwm:
+        try:
+            with open("/proc/self/clear_refs", "w") as fh:
+                fh.write("5")
+        except OSError:
+            _can_reset_hwm = False
+    return current
+
+
+def _cpu_seconds() -> float:
+    if resource is None:   # no RUSAGE_CHILDREN: this process only
+        return time.process_time()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+class Span:
+    """Handle yielded by span(); set rows/bytes or add to args while it is open."""
+
+    def __init__(self, name: str, rows: int = None, bytes: int = None, args: dict = None):
+        self.name = name
+        self.rows = rows
+        self.bytes = bytes
+        self.args = args or {}
+        self.peak_mb = 0.0
+
+    def event(self, start_us: int, wall: float, cpu: float, rss_mb: float) -> dict:
+        args = {"cpu_s": round(cpu, 4)}
+        if rss_mb is not None:
+            args.update(rss_mb=round(rss_mb, 1), peak_rss_mb=round(self.peak_mb, 1))
+        for key, value in (("rows", self.rows), ("bytes", self.bytes)):
+            if value is not None:
+                args[key] = int(value)
+                if wall > 0:
+                    args[f"{key}_per_s"] = round(value / wall, 1)
+        args.update(self.args)
+        return {"name": self.name, "cat": _stage or "pipeline", "ph": "X", "ts": start_us,
+                "dur": round(wall * 1e6), "pid": os.getpid(), "tid": threading.get_native_id(), "args": args}
+
+
+def _append(event: dict) -> None:
+    global _named_pid
+    path = os.environ[TRACE_ENV]
+    events = [event]
+    if _named_pid != os.getpid():
+        label = _stage if os.getpid() == _stage_pid else f"{_stage} worker"
+        events.insert(0, {"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": label}})
+        _named_pid = os.getpid()
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        os.write(fd, b"[\n")
+        os.close(fd)
+    except FileExistsError:
+        pass
+    # One O_APPEND write per batch, so lines from concurrent processes never interleave
+    data = "".join(json.dumps(e, separators=(",", ":"), default=str) + ",\n" for e in events).encode()
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def span(name: str, rows: int = None, bytes: int = None, **args):
+    """Time the enclosed block as one trace event (a no-op unless PIPELINE_TRACE is set)."""
+    s = Span(name, rows, bytes, args)
+    if not tracing():
+        yield s
+        return
+
+    s.peak_mb = _mark_peak()
+    _open.append(s)
+    start_us, start, cpu = time.time_ns() // 1000, time.perf_counter(), _cpu_seconds()
+    try:
+        yield s
+    except BaseException as e:
+        if not isinstance(e, (SystemExit, GeneratorExit)):
+            s.args["error"] = repr(e)
+        raise
+    finally:
+        wall, cpu = time.perf_counter() - start, _cpu_seconds() - cpu
+        rss = _mark_peak()
+        _open.remove(s)
+        _append(s.event(start_us, wall, cpu, rss))
+
+
+class Sampler(threading.Thread):
+    """Counts the main thread's call stacks at a fixed interval."""
+
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.target = threading.main_thread().ident
+        self.counts = collections.Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self.done.set()
+        self.join()
+
+    def report(self, path: str, top: int = 25) -> None:
+        with open(path, "w") as fh:
+            for stack, count in self.counts.most_common():
+                fh.write(f"{stack} {count}\n")
+        total = sum(self.counts.values()) or 1
+        own, inclusive = collections.Counter(), collections.Counter()
+        for stack, count in self.counts.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        print(f"🔍 {total} samples every {self.interval * 1000:g} ms; collapsed stacks in {path}")
+        print(f"   {'self %':>7} {'total %':>8}  function")
+        for frame, count in own.most_common(top):
+            print(f"   {100 * count / total:7.1f} {100 * inclusive[frame] / total:8.1f}  {frame}")
+
+
+def profiling(name: str) -> bool:
+    chosen = os.environ.get(PROFILE_ENV, "")
+    return chosen == "all" or name in chosen.split(",")
+
+
+@contextlib.contextmanager
+def stage(name: str, top: int = 25):
+    """Run a whole pipeline stage as the root span, profiling it if PIPELINE_PROFILE selects it."""
+    global _stage, _stage_pid
+    _stage, _stage_pid = name, os.getpid()
+
+    profiler = None
+    if profiling(name):
+        out_dir = os.environ.get(PROFILE_DIR_ENV, "profiles")
+        os.makedirs(out_dir, exist_ok=True)
+        if os.environ.get(PROFILER_ENV, "cprofile") == "sample":
+            profiler = Sampler(float(os.environ.get(SAMPLE_MS_ENV, 5)) / 1000)
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+    try:
+        with span(name) as s:
+            yield s
+    finally:
+        if isinstance(profiler, Sampler):
+            profiler.stop()
+            profiler.report(os.path.join(out_dir, f"{name}.folded"), top)
+        elif profiler is not None:
+            profiler.disable()
+            path = os.path.join(out_dir, f"{name}.prof")
+            profiler.dump_stats(path)
+            print(f"🔍 cProfile of {name} saved to {path} (hottest by cumulative time):")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
+
+
+def read_trace(path: str) -> list:
+    """Events of a trace file, whether or not its array was closed."""
+    with open(path) as fh:
+        text = fh.read().strip()
+    if text.startswith("{"):
+        return json.loads(text)["traceEvents"]
+    return json.loads(text.rstrip(",").rstrip("]").rstrip().rstrip(",") + "]")
+
+
+def summarise(events: list) -> list:
+    """Per (stage, span name) totals: count, wall, CPU, largest peak RSS and rows."""
+    totals = {}
+    for e in events:
+        if e.get("ph") != "X":
+            continue
+        key = (e.get("cat"), e["name"])
+        t = totals.setdefault(key, {"stage": key[0], "span": key[1], "count": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                    "peak_rss_mb": 0.0, "rows": 0})
+        t["count"] += 1
+        t["wall_s"] += e["dur"] / 1e6
+        t["cpu_s"] += e["args"].get("cpu_s", 0.0)
+        t["peak_rss_mb"] = max(t["peak_rss_mb"], e["args"].get("peak_rss_mb", 0.0))
+        t["rows"] += e["args"].get("rows", 0)
+    return sorted(totals.values(), key=lambda t: -t["wall_s"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise a PIPELINE_TRACE file by stage and span")
+    parser.add_argument("trace")
+    parser.add_argument("--top", type=int, default=40, help="rows to show")
+    args = parser.parse_args()
+
+    print(f"{'stage':<18} {'span':<26} {'n':>5} {'wall s':>9} {'cpu s':>9} {'peak MB':>8} {'rows':>12} {'rows/s':>11}")
+    for t in summarise(read_trace(args.trace))[:args.top]:
+        rate = f"{t['rows'] / t['wall_s']:11,.0f}" if t["rows"] and t["wall_s"] else f"{'':>11}"
+        print(f"{str(t['stage']):<18} {t['span']:<26} {t['count']:5d} {t['wall_s']:9.2f} {t['cpu_s']:9.2f} "
+              f"{t['peak_rss_mb']:8.1f} {t['rows']:12,d} {rate}")
@@ -0,0 +1,108 @@
+"""
+kernel_svr.py
+Approximate RBF-kernel SVR that scales linearly with the number of rows.
+
+The RBF kernel is replaced by an explicit feature map, either Nystroem
+(kernel columns against a random subset of training rows) or random Fourier
+features. A linear epsilon-insensitive regressor (the SVR loss) is then
+trained on that map with averaged SGD in mini-batches. Only one batch of mapped
+features is held in memory at a time. Prediction cost depends on
+n_components, not on the number of support vectors. partial_fit() continues
+training on new rows only, keeping the feature map.
+"""
+
+import numbers
+
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.linear_model import SGDRegressor
+from sklearn.utils import check_random_state
+
+FEATURE_MAPS = {"nystroem": Nystroem, "rff": RBFSampler}
+
+
+class ApproxKernelSVR(BaseEstimator, RegressorMixin):
+    """Epsilon-insensitive regression on an approximate RBF feature map.
+
+    `gamma`, `C` and `epsilon` mean the same as in sklearn.svm.SVR. C is
+    turned into SGD's per-sample penalty as alpha = 1 / (C * n_samples).
+    """
+
+    def __init__(self, method="nystroem", n_components=500, gamma=0.1, C=100.0, epsilon=0.1,
+                 batch_size=4096, n_epochs=10, eta0=0.2, learning_rate="constant", random_state=42):
+        self.method = method
+        self.n_components = n_components
+        self.gamma = gamma
+        self.C = C
+        self.epsilon = epsilon
+        self.batch_size = batch_size
+        self.n_epochs = n_epochs
+        self.eta0 = eta0
+        self.learning_rate = learning_rate
+        self.random_state = random_state
+
+    def _rng(self, *stream) -> np.random.Generator:
+        """Generator seeded from random_state (None, an int or a RandomState) and `stream`."""
+        seed = self.random_state
+        if not isinstance(seed, numbers.Integral):
+            seed = check_random_state(seed).randint(np.iinfo(np.int32).max)
+        return np.random.default_rng([seed, *stream])
+
+    def _batches(self, n):
+        for start in range(0, n, self.batch_size):
+            yield slice(start, min(start + self.batch_size, n))
+
+    def fit(self, X, y):
+        X, y = np.asarray(X), np.asarray(y, dtype=np.float64)
+        rng = self._rng()
+        n = len(X)
+
+        n_components = min(self.n_components, n) if self.method == "nystroem" else self.n_components
+        self.feature_map_ = FEATURE_MAPS[self.method](
+            gamma=self.gamma, n_components=n_components, random_state=self.random_state
+        )
+        # Nystroem only needs its landmark rows, not the whole training set
+        sample = np.sort(rng.choice(n, size=min(n, max(n_components, 1000)), replace=False))
+        self.feature_map_.fit(X[sample])
+
+        # The intercept is not penalised; centring y keeps SGD from chasing it
+        self.y_offset_ = float(np.mean(y))
+        self.n_samples_seen_ = n
+        self.regressor_ = SGDRegressor(
+            loss="epsilon_insensitive", epsilon=self.epsilon, alpha=1.0 / (self.C * n),
+            learning_rate=self.learning_rate, eta0=self.eta0, average=True, random_state=self.random_state,
+        )
+        self._sgd_epochs(X, y, rng)
+        return self
+
+    def partial_fit(self, X, y):
+        """
+        Continue training on new rows only. The feature map and y offset are
+        kept, SGD runs n_epochs over (X, y), and alpha is rescaled to every row
+        seen so far. Because SGD averages over all updates, each new row carries
+        the same weight an old row did. Fits from scratch if the model is unfitted.
+        """
+        if not hasattr(self, "regressor_"):
+            return self.fit(X, y)
+        X, y = np.asarray(X), np.asarray(y, dtype=np.float64)
+        # Models saved before n_samples_seen_ existed: recover n from alpha = 1 / (C * n)
+        seen = getattr(self, "n_samples_seen_", round(1.0 / (self.C * self.regressor_.alpha))) + len(X)
+        self.n_samples_seen_ = seen
+        self.regressor_.set_params(alpha=1.0 / (self.C * seen))
+        self._sgd_epochs(X, y, self._rng(seen))
+        return self
+
+    def _sgd_epochs(self, X, y, rng):
+        for _ in range(self.n_epochs):
+            order = rng.permutation(len(X))
+            for batch in self._batches(len(X)):
+                rows = np.sort(order[batch])
+                self.regressor_.partial_fit(self.feature_map_.transform(X[rows]), y[rows] - self.y_offset_)
+
+    def predict(self, X):
+        X = np.asarray(X)
+        out = np.empty(len(X))
+        for batch in self._batches(len(X)):
+            out[batch] = self.regressor_.predict(self.feature_map_.transform(X[batch]))
+        return out + self.y_offset_
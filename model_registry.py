@@ -0,0 +1,318 @@
+"""
+model_registry.py
+Versioned store for trained models.
+
+Every model version lives in <root>/<name>/vNNNN/ and holds:
+  model.joblib    the estimator, dumped uncompressed so its arrays can be memory-mapped
+  scaler.joblib   the StandardScaler the model was trained behind (SVR models only)
+  flat/           the tree ensembles compiled to flat node arrays (flat_trees.py), as .npy
+  meta.json       version, creation time, training data range, row count, metrics,
+                  hyperparameters, library versions, and the feature schema with its hash.
+                  It also records the lineage: "full" for a refit by train_models.py, or
+                  "incremental" for an update_models.py update of the `parent` version,
+                  with that update's drift against the latest full refit.
+
+The feature schema is the ordered FEATURES columns and their dtype (the direct
+multi-horizon models of train_horizons.py register their own lag-window
+columns as float32). It is checked when an entry is opened, so an artifact
+trained on different columns raises SchemaMismatchError instead of scoring
+the wrong inputs. lazy() reads
+only meta.json. The pickles are loaded with mmap_mode on the first predict
+call. With compiled=True, an entry that has flat/ arrays memory-maps those
+and scores batches of up to FLAT_MAX_ROWS rows with them. The pickled
+ensemble is only unpickled for the first larger batch, where sklearn's own
+traversal is as fast or faster (benchmarks/bench_flat_trees.py).
+
+  python model_registry.py            # list every model version with its metrics
+  python model_registry.py --compile  # add flat/ arrays to versions registered without them
+  python model_registry.py --import-legacy .   # register old <name>_model.pkl / scaler.pkl files
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import joblib
+import numpy as np
+import sklearn
+
+from era5_features import FEATURES
+from flat_trees import FlatEnsemble, compile_ensemble
+from instrumentation import span
+
+REGISTRY_DIR = "model_registry"
+FEATURE_DTYPE = "float64"   # train_models.py and predict.py feed float64 matrices
+FLAT_MAX_ROWS = 128         # largest batch scored through the flat arrays of a compiled entry
+
+
+class SchemaMismatchError(ValueError):
+    pass
+
+
+def schema_hash(features: list = FEATURES, dtype: str = FEATURE_DTYPE) -> str:
+    return hashlib.sha256(json.dumps([[f, dtype] for f in features]).encode()).hexdigest()[:16]
+
+
+class RegisteredModel:
+    """A loaded registry entry; predict() applies the entry's own scaler first."""
+
+    def __init__(self, meta: dict, model, scaler=None):
+        self.meta = meta
+        self.model = model
+        self.scaler = scaler
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.model.predict(self.scaler.transform(X) if self.scaler is not None else X)
+
+
+class CompiledModel:
+    """A tree ensemble scored through its flat arrays, and through the pickle for batches above `max_rows`."""
+
+    def __init__(self, flat: FlatEnsemble, load_estimator, max_rows: int = FLAT_MAX_ROWS):
+        self.flat = flat
+        self.load_estimator = load_estimator
+        self.max_rows = max_rows
+        self.n_features_in_ = flat.n_features_in_
+        self._estimator = None
+
+    @property
+    def estimator(self):
+        if self._estimator is None:
+            self._estimator = self.load_estimator()
+        return self._estimator
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.flat.predict(X) if len(X) <= self.max_rows else self.estimator.predict(X)
+
+
+class LazyModel:
+    """Registry entry whose pickles are only read on the first predict()."""
+
+    def __init__(self, registry: "ModelRegistry", meta: dict, mmap_mode: str = "r", features: list = FEATURES,
+                 feature_dtype: str = FEATURE_DTYPE, compiled: bool = False):
+        self.registry = registry
+        self.meta = meta
+        self.mmap_mode = mmap_mode
+        self.features = features
+        self.feature_dtype = feature_dtype
+        self.compiled = compiled
+        self._loaded = None
+
+    @property
+    def loaded(self) -> RegisteredModel:
+        if self._loaded is None:
+            with span("load_model", model=self.meta["name"], version=self.meta["version"]):
+                self._loaded = self.registry.load(self.meta["name"], self.meta["version"], self.mmap_mode,
+                                                  self.features, self.feature_dtype, self.compiled)
+        return self._loaded
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.loaded.predict(X)
+
+
+class ModelRegistry:
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root = root
+
+    def names(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(n for n in os.listdir(self.root) if self.versions(n))
+
+    def versions(self, name: str) -> list:
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(path):
+            return []
+        return sorted(v for v in os.listdir(path)
+                      if v.startswith("v") and os.path.exists(os.path.join(path, v, "meta.json")))
+
+    def latest(self, name: str, lineage: str = None):
+        """Newest version of `name`, optionally only among "full" or "incremental" ones."""
+        versions = self.versions(name)
+        if lineage is not None:
+            versions = [v for v in versions if self.metadata(name, v).get("lineage", "full") == lineage]
+        return versions[-1] if versions else None
+
+    def metadata(self, name: str, version: str = None) -> dict:
+        version = version or self.latest(name)
+        if version is None:
+            raise FileNotFoundError(f"No registered versions of {name!r} in {self.root}")
+        with open(os.path.join(self.root, name, version, "meta.json")) as fh:
+            return json.load(fh)
+
+    def register(self, name: str, model, scaler=None, metrics: dict = None, params: dict = None,
+                 data_range: tuple = None, n_rows: int = None, features: list = FEATURES,
+                 lineage: str = "full", parent: str = None, drift: dict = None,
+                 feature_dtype: str = FEATURE_DTYPE, extra: dict = None) -> dict:
+        """Store a new version of `name` and return its metadata; `extra` adds model-specific keys."""
+        os.makedirs(os.path.join(self.root, name), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging_", dir=os.path.join(self.root, name))
+        try:
+            joblib.dump(model, os.path.join(staging, "model.joblib"))   # compress=0 keeps it mmap-able
+            if scaler is not None:
+                joblib.dump(scaler, os.path.join(staging, "scaler.joblib"))
+            flat = compile_ensemble(model)
+            if flat is not None:
+                flat.save(os.path.join(staging, "flat"))
+            meta = {
+                "name": name,
+                "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                "estimator": type(model).__name__,
+                "features": list(features),
+                "feature_dtype": feature_dtype,
+                "schema_hash": schema_hash(features, feature_dtype),
+                "scaled": scaler is not None,
+                "data_range": [str(t) for t in data_range] if data_range else None,
+                "n_rows": n_rows,
+                "metrics": {k: float(v) for k, v in (metrics or {}).items()},
+                "params": params or {},
+                "lineage": lineage,
+                "parent": parent,
+                "drift": drift,
+                "sklearn_version": sklearn.__version__,
+                "flat": flat.header() if flat is not None else None,
+                **(extra or {}),
+            }
+
+            # Claim the next version number; mkdir fails if another run took it first
+            taken = [int(v[1:]) for v in os.listdir(os.path.join(self.root, name)) if v[1:].isdigit()]
+            number = max(taken, default=0) + 1
+            while True:
+                version = f"v{number:04d}"
+                try:
+                    os.mkdir(os.path.join(self.root, name, version))
+                    break
+                except FileExistsError:
+                    number += 1
+            meta["version"] = version
+            with open(os.path.join(staging, "meta.json"), "w") as fh:
+                json.dump(meta, fh, indent=2, default=str, ensure_ascii=False)
+
+            # Renaming onto the claimed (empty) directory publishes the version atomically
+            claimed = os.path.join(self.root, name, version)
+            try:
+                os.replace(staging, claimed)
+            except OSError:   # Windows will not rename onto a directory, even an empty one
+                os.rmdir(claimed)
+                os.rename(staging, claimed)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return meta
+
+    def import_legacy(self, directory: str = ".") -> list:
+        """
+        Register the <name>_model.pkl files the old train_models.py wrote into `directory`,
+        with its scaler.pkl behind SVR as predict.py used to apply it. Returns the new metadata.
+        """
+        scaler_path = os.path.join(directory, "scaler.pkl")
+        scaler = joblib.load(scaler_path) if os.path.exists(scaler_path) else None
+        imported = []
+        for file in sorted(os.listdir(directory)):
+            if not file.endswith("_model.pkl"):
+                continue
+            name = file[:-len("_model.pkl")]
+            model = joblib.load(os.path.join(directory, file))
+            with span("import_legacy", model=name):
+                imported.append(self.register(name, model, scaler=scaler if name == "SVR" else None,
+                                              params=model.get_params(deep=False),
+                                              extra={"imported_from": os.path.abspath(os.path.join(directory, file))}))
+        return imported
+
+    def check_schema(self, meta: dict, features: list = FEATURES, feature_dtype: str = FEATURE_DTYPE) -> None:
+        expected = schema_hash(features, feature_dtype)
+        if meta.get("schema_hash") != expected:
+            raise SchemaMismatchError(
+                f"{meta['name']} {meta['version']} was trained on {meta.get('features')} "
+                f"(schema {meta.get('schema_hash')}), but the current features are {features} (schema {expected})"
+            )
+
+    def compile(self, name: str, version: str = None) -> dict:
+        """Write the flat/ arrays for a version registered without them; returns their header, or None."""
+        meta = self.metadata(name, version)
+        path = os.path.join(self.root, name, meta["version"])
+        if meta.get("flat") is None:
+            flat = compile_ensemble(joblib.load(os.path.join(path, "model.joblib"), mmap_mode="r"))
+            if flat is None:
+                return None
+            staging = tempfile.mkdtemp(prefix=".flat_", dir=path)
+            try:
+                flat.save(staging)
+                os.replace(staging, os.path.join(path, "flat"))
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+            meta["flat"] = flat.header()
+            with open(os.path.join(path, "meta.json.tmp"), "w") as fh:
+                json.dump(meta, fh, indent=2, default=str, ensure_ascii=False)
+            os.replace(os.path.join(path, "meta.json.tmp"), os.path.join(path, "meta.json"))
+        return meta["flat"]
+
+    def load(self, name: str, version: str = None, mmap_mode: str = "r",
+             features: list = FEATURES, feature_dtype: str = FEATURE_DTYPE, compiled: bool = False) -> RegisteredModel:
+        """
+        Open a version; with `compiled`, a tree ensemble that has flat/ arrays is
+        returned as a CompiledModel over them (other estimators load as usual).
+        """
+        meta = self.metadata(name, version)
+        self.check_schema(meta, features, feature_dtype)
+        path = os.path.join(self.root, name, meta["version"])
+        if compiled and meta.get("flat"):
+            model = CompiledModel(FlatEnsemble.load(os.path.join(path, "flat"), mmap_mode=mmap_mode),
+                                  lambda: joblib.load(os.path.join(path, "model.joblib"), mmap_mode=mmap_mode))
+        else:
+            model = joblib.load(os.path.join(path, "model.joblib"), mmap_mode=mmap_mode)
+        scaler = joblib.load(os.path.join(path, "scaler.joblib")) if meta["scaled"] else None
+
+        n_features = getattr(scaler if scaler is not None else model, "n_features_in_", len(features))
+        if n_features != len(features):
+            raise SchemaMismatchError(f"{name} {meta['version']} expects {n_features} features, not {len(features)}")
+        return RegisteredModel(meta, model, scaler)
+
+    def lazy(self, name: str, version: str = None, mmap_mode: str = "r", features: list = FEATURES,
+             feature_dtype: str = FEATURE_DTYPE, compiled: bool = False) -> LazyModel:
+        meta = self.metadata(name, version)
+        self.check_schema(meta, features, feature_dtype)
+        return LazyModel(self, meta, mmap_mode, features, feature_dtype, compiled)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List registered model versions")
+    parser.add_argument("--root", default=REGISTRY_DIR)
+    parser.add_argument("--compile", action="store_true", help="add flat/ arrays to tree ensembles lacking them")
+    parser.add_argument("--import-legacy", metavar="DIR",
+                        help="register the <name>_model.pkl and scaler.pkl files of the old train_models.py")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.import_legacy:
+        for meta in registry.import_legacy(args.import_legacy):
+            print(f"✅ {meta['imported_from']} -> {registry.root}/{meta['name']}/{meta['version']}")
+    if args.compile:
+        for name in registry.names():
+            for version in registry.versions(name):
+                if registry.metadata(name, version).get("flat"):
+                    continue
+                with span("compile", model=name, version=version):
+                    header = registry.compile(name, version)
+                if header is not None:
+                    print(f"✅ {name} {version}: {header['n_trees']} trees, {header['n_nodes']:,} nodes")
+    current = schema_hash()
+    for name in registry.names():
+        for version in registry.versions(name):
+            meta = registry.metadata(name, version)
+            metrics = "  ".join(f"{k} {v:.4f}" for k, v in meta["metrics"].items())
+            expected = current
+            if "horizons" in meta:
+                from horizons import TENSOR_DTYPE, feature_names   # direct models: lag-window schema
+                spec = meta["horizons"]
+                expected = schema_hash(feature_names(spec["window"], spec["lag_columns"], spec["origin_columns"]),
+                                       TENSOR_DTYPE)
+            schema = "" if meta["schema_hash"] == expected else "  (schema mismatch)"
+            lineage = meta.get("lineage", "full")
+            if meta.get("parent"):
+                lineage += f" of {meta['parent']}"
+            schema += "  [flat]" if meta.get("flat") else ""
+            print(f"{name:<17} {version}  {meta['created']}  {lineage:<23} rows {meta['n_rows']}  {metrics}{schema}")
@@ -0,0 +1,279 @@
+"""
+power_curve.py
+Turn windspeed predictions into turbine and farm power output.
+
+A fleet is a table of turbines: turbine, farm, latitude, longitude, curve and
+hub_height, plus an optional shear_alpha per turbine. Power curves are
+manufacturer lookup tables (curve, windspeed, power_kw) with optional cut_in,
+cut_out and rated_kw columns. Missing limits default to the first windspeed
+with power, the last tabulated windspeed, and the peak power.
+
+The model windspeed is at 10 m. It is extrapolated to each hub height with the
+power law (v * (h / 10) ** alpha), or with the log law if a roughness length
+is given. It is optionally adjusted for air density as in IEC 61400-12
+(v * (rho / 1.225) ** (1/3)). Each curve is then evaluated with np.interp
+over a (time, turbine) block:
+  zero below cut-in and at or above cut-out;
+  capped at rated power.
+Turbines are sorted by curve when the fleet is loaded. One np.interp call per
+curve type then covers all of that curve's turbines and time steps, with no
+loop over turbines. Farm output is one product with a sparse turbine-to-farm
+indicator matrix.
+
+  python power_curve.py --turbines fleet.csv                    # predict.py output -> farm_power.csv
+  python power_curve.py --turbines fleet.csv --curves curves.csv --turbine-output turbine_power
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import dataset_store
+from era5_features import grid_index, to_grid
+from instrumentation import span, stage
+from spatial_index import compute_weights
+
+REF_HEIGHT_M = 10.0        # ERA5 u10/v10
+DEFAULT_ALPHA = 1 / 7      # power-law shear exponent for open terrain
+RHO_STANDARD = 1.225       # kg/m³, the density power curves are quoted at
+GAS_CONSTANT_DRY = 287.05  # J/(kg·K)
+
+
+def generic_curve(rated_kw: float, rotor_diameter_m: float, cut_in: float = 3.0, cut_out: float = 25.0,
+                  cp: float = 0.45, step: float = 0.5) -> pd.DataFrame:
+    """A tabulated curve shaped like a manufacturer's: Cp-limited cubic rise to rated power."""
+    ws = np.arange(0.0, cut_out + step / 2, step)
+    area = np.pi * (rotor_diameter_m / 2) ** 2
+    power = np.minimum(0.5 * RHO_STANDARD * area * cp * ws ** 3 / 1000, rated_kw)
+    power[ws < cut_in] = 0.0
+    return pd.DataFrame({"windspeed": ws, "power_kw": power})
+
+
+# Stand-ins for manufacturer data when no --curves file is given
+DEFAULT_CURVES = pd.concat([
+    generic_curve(2000, 90).assign(curve="generic_2MW"),
+    generic_curve(3600, 120).assign(curve="generic_3.6MW"),
+    generic_curve(8000, 164, cut_in=3.5).assign(curve="generic_8MW"),
+], ignore_index=True)
+
+
+class CurveSet:
+    """Lookup tables and limits of every power curve, by name."""
+
+    def __init__(self, curves: pd.DataFrame):
+        self.tables = {}
+        for name, table in curves.groupby("curve", sort=True):
+            table = table.sort_values("windspeed")
+            ws = table["windspeed"].to_numpy(dtype=np.float64)
+            power = table["power_kw"].to_numpy(dtype=np.float64)
+            if np.any(np.diff(ws) <= 0):
+                raise ValueError(f"curve {name!r} repeats a windspeed")
+            limits = {
+                "cut_in": table["cut_in"].iloc[0] if "cut_in" in table else ws[np.argmax(power > 0)],
+                "cut_out": table["cut_out"].iloc[0] if "cut_out" in table else ws[-1],
+                "rated_kw": table["rated_kw"].iloc[0] if "rated_kw" in table else power.max(),
+            }
+            spacing = np.diff(ws)
+            self.tables[name] = {
+                "windspeed": ws, "power_kw": power, "slope": np.append(np.diff(power), 0.0),
+                "step": float(spacing[0]) if np.allclose(spacing, spacing[0], rtol=1e-9, atol=0) else None,
+                **{k: float(v) for k, v in limits.items()},
+            }
+        self.names = list(self.tables)
+
+    @classmethod
+    def load(cls, path: str = None) -> "CurveSet":
+        return cls(pd.read_csv(path) if path else DEFAULT_CURVES)
+
+    def evaluate(self, name: str, v_hub: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Power in kW for hub-height windspeeds of any shape, with the curve's cut-in,
+        cut-out and rating; np.interp semantics (zero outside the table), NaN stays NaN.
+        """
+        t = self.tables[name]
+        ws, n = t["windspeed"], len(t["windspeed"])
+        if t["step"] and n > 1:
+            # Evenly spaced table (the usual 0.5 or 1 m/s grid): the bracket is arithmetic, not a binary search
+            x = (v_hub - ws[0]) / t["step"]
+            np.fmin(np.fmax(x, 0.0, out=x), n - 1, out=x)    # fmax also maps NaN to 0
+            i = np.minimum(x.astype(np.intp), n - 2)
+            x -= i
+            power = np.multiply(t["slope"][i], x, out=x)
+            power += t["power_kw"][i]
+            np.copyto(power, np.nan, where=np.isnan(v_hub))
+        else:
+            power = np.interp(v_hub, ws, t["power_kw"], left=0.0, right=0.0)
+        power[(v_hub < max(t["cut_in"], ws[0])) | (v_hub >= t["cut_out"]) | (v_hub > ws[-1])] = 0.0
+        np.minimum(power, t["rated_kw"], out=power)
+        if out is None:
+            return power
+        out[...] = power
+        return out
+
+
+def hub_factor(hub_height: np.ndarray, alpha: np.ndarray = DEFAULT_ALPHA, roughness_m: float = None,
+               ref_height: float = REF_HEIGHT_M) -> np.ndarray:
+    """Ratio of hub-height to reference-height windspeed: power law, or log law given a roughness length."""
+    hub_height = np.asarray(hub_height, dtype=np.float64)
+    if roughness_m:
+        return np.log(hub_height / roughness_m) / np.log(ref_height / roughness_m)
+    return (hub_height / ref_height) ** np.asarray(alpha, dtype=np.float64)
+
+
+def air_density(temperature_C: np.ndarray, pressure_hPa: np.ndarray) -> np.ndarray:
+    """Dry-air density in kg/m³ from the ideal gas law."""
+    return pressure_hPa * 100.0 / (GAS_CONSTANT_DRY * (temperature_C + 273.15))
+
+
+class Fleet:
+    """
+    Turbines sorted by curve, with everything that does not change over time
+    precomputed: hub factors, per-curve column slices and the farm indicator matrix.
+    """
+
+    def __init__(self, turbines: pd.DataFrame, curves: CurveSet, roughness_m: float = None):
+        missing = {"turbine", "farm", "latitude", "longitude", "curve", "hub_height"} - set(turbines.columns)
+        if missing:
+            raise ValueError(f"turbine table lacks columns {sorted(missing)}")
+        unknown = set(turbines["curve"]) - set(curves.names)
+        if unknown:
+            raise ValueError(f"turbines use curves {sorted(unknown)} that are not in the curve table")
+
+        self.turbines = turbines.sort_values(["curve", "turbine"], kind="stable", ignore_index=True)
+        self.curves = curves
+        alpha = DEFAULT_ALPHA
+        if "shear_alpha" in self.turbines:
+            alpha = self.turbines["shear_alpha"].fillna(DEFAULT_ALPHA).to_numpy()
+        self.factor = hub_factor(self.turbines["hub_height"].to_numpy(), alpha, roughness_m)
+
+        codes = self.turbines["curve"].to_numpy()
+        bounds = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1], True])
+        self.slices = {codes[a]: slice(a, b) for a, b in zip(bounds[:-1], bounds[1:])}
+
+        # Sparse, so that 50,000 turbines in 1,000 farms cost 50,000 entries, not a 400 MB dense matrix
+        farm_codes, self.farms = pd.factorize(self.turbines["farm"], sort=True)
+        self.farm_matrix = sparse.csr_matrix((np.ones(len(farm_codes)), (np.arange(len(farm_codes)), farm_codes)),
+                                             shape=(len(farm_codes), len(self.farms)))
+
+    @classmethod
+    def load(cls, path: str, curves: CurveSet, roughness_m: float = None) -> "Fleet":
+        return cls(pd.read_csv(path), curves, roughness_m)
+
+    def __len__(self) -> int:
+        return len(self.turbines)
+
+    def power(self, v_ref: np.ndarray, density: np.ndarray = None, out: np.ndarray = None) -> np.ndarray:
+        """
+        Turbine power in kW for a (time, turbine) block of reference-height windspeeds,
+        with an optional (time, turbine) air density.
+        """
+        v_hub = v_ref * self.factor
+        if density is not None:
+            v_hub *= np.cbrt(density / RHO_STANDARD)
+        out = np.empty(v_hub.shape) if out is None else out
+        for name, cols in self.slices.items():
+            self.curves.evaluate(name, v_hub[:, cols], out[:, cols])
+        return out
+
+    def farm_power(self, turbine_kw: np.ndarray) -> np.ndarray:
+        """(time, farm) output in MW: turbine output summed per farm."""
+        return np.asarray(turbine_kw @ self.farm_matrix) / 1000.0
+
+
+def site_interpolator(fleet: Fleet, lats: np.ndarray, lons: np.ndarray, method: str = "bilinear") -> tuple:
+    """(cell index, weight) arrays, each (turbine, k), for gathering a flat (time, cell) grid at the turbines."""
+    sites = fleet.turbines.rename(columns={"turbine": "site"})
+    weights = compute_weights(lats, lons, sites, method)
+    return weights["lat_idx"] * len(lons) + weights["lon_idx"], weights["weights"]
+
+
+def gather(grid: np.ndarray, cells: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """(time, turbine) values from a (time, cell) block, one weighted term at a time."""
+    out = grid[:, cells[:, 0]] * weights[:, 0]
+    for k in range(1, cells.shape[1]):
+        out += grid[:, cells[:, k]] * weights[:, k]
+    return out
+
+
+def power_from_predictions(path: str, fleet: Fleet, columns: list = None, density: bool = False,
+                           method: str = "bilinear", chunk_steps: int = 256, turbine_output: str = None) -> tuple:
+    """
+    Farm output for every windspeed column of a predict.py output (the *_Predicted
+    columns and the reanalysis windspeed by default), one block of time steps at a time.
+    Returns (farm frame, column names). With `turbine_output`, per-turbine power is
+    also appended to that partitioned dataset.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    columns = columns or ["windspeed"] + [c for c in header if c.endswith("_Predicted")]
+    extra = ["temperature_C", "pressure_hPa"] if density else []
+    with span("read_predictions") as s:
+        df = pd.read_csv(path, usecols=["time", "latitude", "longitude"] + columns + extra, parse_dates=["time"])
+        s.rows = len(df)
+
+    time_codes, positions, times, n_cells, levels = grid_index(df, dense=True)
+    shape = (len(times), n_cells)
+    grids = {c: to_grid(df[c].to_numpy(), positions, shape) for c in columns + extra}
+    del df
+    cells, weights = site_interpolator(fleet, levels["latitude"], levels["longitude"], method)
+    if turbine_output:
+        dataset_store.clear(turbine_output)
+
+    farm = {c: np.empty((len(times), len(fleet.farms))) for c in columns}
+    for start in range(0, len(times), chunk_steps):
+        block = slice(start, start + chunk_steps)
+        with span("power", rows=(min(start + chunk_steps, len(times)) - start) * len(fleet)) as s:
+            rho = None
+            if density:
+                rho = air_density(gather(grids["temperature_C"][block], cells, weights),
+                                  gather(grids["pressure_hPa"][block], cells, weights))
+            turbine = {}
+            for c in columns:
+                turbine[c] = fleet.power(gather(grids[c][block], cells, weights), rho)
+                farm[c][block] = fleet.farm_power(turbine[c])
+        if turbine_output:
+            n = len(turbine[columns[0]])
+            out = pd.DataFrame({"time": np.repeat(times[block], len(fleet)),
+                                "turbine": np.tile(fleet.turbines["turbine"].to_numpy(), n),
+                                "farm": np.tile(fleet.turbines["farm"].to_numpy(), n)})
+            for c in columns:
+                out[f"{c}_kW"] = turbine[c].astype(np.float32).ravel()
+            dataset_store.write_partitions(out, turbine_output, mode="append")
+
+    out = pd.DataFrame({"time": np.repeat(times, len(fleet.farms)), "farm": np.tile(fleet.farms, len(times))})
+    for c in columns:
+        out[f"{c}_MW"] = farm[c].ravel()
+    return out, columns
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Turbine and farm power from predicted windspeed")
+    parser.add_argument("--input", default="predictions_all_models.csv", help="predict.py output")
+    parser.add_argument("--turbines", required=True,
+                        help="CSV: turbine, farm, latitude, longitude, curve, hub_height[, shear_alpha]")
+    parser.add_argument("--curves", help="CSV: curve, windspeed, power_kw[, cut_in, cut_out, rated_kw] "
+                                         "(default: generic 2, 3.6 and 8 MW curves)")
+    parser.add_argument("--columns", nargs="+", help="windspeed columns to convert (default: windspeed and "
+                                                     "every *_Predicted column)")
+    parser.add_argument("--roughness", type=float, help="use the log law with this roughness length (m)")
+    parser.add_argument("--density", action="store_true", help="correct for air density (temperature, pressure)")
+    parser.add_argument("--method", choices=["bilinear", "nearest"], default="bilinear")
+    parser.add_argument("--chunk-steps", type=int, default=256, help="time steps per block")
+    parser.add_argument("--output", default="farm_power.csv")
+    parser.add_argument("--turbine-output", metavar="DIR", help="also write per-turbine power to this dataset")
+    args = parser.parse_args()
+
+    with stage("power_curve"):
+        fleet = Fleet.load(args.turbines, CurveSet.load(args.curves), args.roughness)
+        print(f"🔹 {len(fleet)} turbines in {len(fleet.farms)} farms, curves {', '.join(fleet.slices)}")
+        farm, columns = power_from_predictions(args.input, fleet, args.columns, args.density, args.method,
+                                               args.chunk_steps, args.turbine_output)
+        with span("write_csv", rows=len(farm)):
+            farm.to_csv(args.output, index=False)
+
+        print("\n📊 Mean farm output (MW)")
+        print(farm.groupby("farm")[[f"{c}_MW" for c in columns]].mean().to_string(float_format="%.2f"))
+        print(f"\n✅ Farm power from {farm['time'].min()} to {farm['time'].max()} saved to {args.output}")
+        if args.turbine_output:
+            print(f"✅ Turbine power saved to {args.turbine_output}/")
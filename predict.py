@@ -1,131 +1,136 @@
+import argparse
+import os
+
 import pandas as pd
 import numpy as np
-import joblib
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-import os
 
-# --- Step 1: Define models to load ---
-model_files = {
-    "SVR": "SVR_model.pkl",
-    "RandomForest": "RandomForest_model.pkl",
-    "GradientBoosting": "GradientBoosting_model.pkl"
-}
+import dataset_store
+from era5_features import FEATURES
+from instrumentation import span, stage
+from model_registry import REGISTRY_DIR, ModelRegistry
+from train_models import MODELS, RunningMetrics, compute_metrics
 
-# --- Step 2: Load scaler (needed for SVR only) ---
-try:
-    scaler = joblib.load("scaler.pkl")
-except:
-    scaler = None
 
-# --- Step 3: Load new data for prediction ---
-new_data = pd.read_csv("new_era5_features.csv", parse_dates=["time"])
+def load_models(registry_dir: str = REGISTRY_DIR, versions: dict = None, compiled: bool = True) -> dict:
+    """
+    The latest registered version of every trained model (or the ones pinned in
+    `versions`), checked against FEATURES now and loaded on first use. Each
+    entry applies its own scaler. Tree ensembles with flat arrays are scored
+    through flat_trees unless `compiled` is False.
+    """
+    registry = ModelRegistry(registry_dir)
+    versions = versions or {}
+    return {name: registry.lazy(name, versions.get(name), compiled=compiled)
+            for name in MODELS if registry.versions(name)}
 
-# Select the same features used in training
-X_new = new_data[["windspeed", "temperature_C", "pressure_hPa",
-                  "windspeed_roll24h", "temperature_roll7d",
-                  "windspeed_cubed", "windspeed_lag1"]].fillna(0)
 
-y_true = new_data["windspeed"]
+def predict_in_memory(models: dict, input_path: str, output: str) -> pd.DataFrame:
+    """Score the whole input at once and save it with every model's predictions and residuals."""
+    # --- Step 1: Load new data for prediction ---
+    new_data = dataset_store.read_table(input_path)
 
-results = []
+    # Select the same features used in training
+    X_new = new_data[FEATURES].fillna(0).to_numpy(dtype=np.float64)
 
-# --- Step 4: Create output folders ---
-os.makedirs("plots", exist_ok=True)
+    y_true = new_data["windspeed"]
 
-# --- Step 5: Create PDF report ---
-with PdfPages("model_report.pdf") as pdf:
+    results = []
 
-    for name, file in model_files.items():
+    # --- Step 2: Predict with every model ---
+    for name, model in models.items():
         print(f"\n🔹 Running predictions with {name}...")
 
-        # Load model
-        model = joblib.load(file)
-
-        # Scale if SVR
-        if name == "SVR" and scaler is not None:
-            X_input = scaler.transform(X_new)
-        else:
-            X_input = X_new
-
         # Predict
-        predictions = model.predict(X_input)
+        with span("score", rows=len(X_new), model=name):
+            predictions = model.predict(X_new)
 
         # Add predictions & residuals
         new_data[f"{name}_Predicted"] = predictions
         new_data[f"{name}_Residuals"] = y_true - predictions
 
         # --- Metrics ---
-        rmse = mean_squared_error(y_true, predictions, squared=False)
-        mae = mean_absolute_error(y_true, predictions)
-        r2 = r2_score(y_true, predictions)
-
-        # Weighted MAPE (masking low values < 1 m/s)
-        mask = y_true >= 1.0
-        numerator = np.sum(np.abs(y_true[mask] - predictions[mask]))
-        denominator = np.sum(np.abs(y_true[mask]))
-        wmape = (numerator / denominator) * 100 if denominator != 0 else np.nan
-
-        results.append({"Model": name, "RMSE": rmse, "MAE": mae, "R²": r2, "wMAPE (%)": wmape})
-
-        # --- Plot actual vs predicted ---
-        plt.figure(figsize=(12,6))
-        plt.plot(new_data["time"], y_true, label="Actual Windspeed", color="blue")
-        plt.plot(new_data["time"], predictions, label=f"{name} Predicted", color="red", linestyle="--")
-        plt.xlabel("Time")
-        plt.ylabel("Windspeed (m/s)")
-        plt.title(f"Actual vs Predicted Windspeed ({name})")
-        plt.legend()
-        plt.tight_layout()
-        plt.savefig(f"plots/{name}_actual_vs_predicted.png")
-        pdf.savefig()  # Save to PDF
-        plt.close()
-
-        # --- Plot residuals over time ---
-        plt.figure(figsize=(12,6))
-        plt.plot(new_data["time"], new_data[f"{name}_Residuals"], label="Residuals", color="green")
-        plt.axhline(0, color="black", linestyle="--")
-        plt.xlabel("Time")
-        plt.ylabel("Residual (m/s)")
-        plt.title(f"Residuals Over Time ({name})")
-        plt.legend()
-        plt.tight_layout()
-        plt.savefig(f"plots/{name}_residuals_over_time.png")
-        pdf.savefig()
-        plt.close()
-
-        # --- Residual distribution ---
-        plt.figure(figsize=(8,6))
-        plt.hist(new_data[f"{name}_Residuals"], bins=30, color="purple", alpha=0.7)
-        plt.xlabel("Residual (m/s)")
-        plt.ylabel("Frequency")
-        plt.title(f"Residual Distribution ({name})")
-        plt.tight_layout()
-        plt.savefig(f"plots/{name}_residual_distribution.png")
-        pdf.savefig()
-        plt.close()
-
-    # --- Step 6: Add metrics summary table to PDF ---
-    results_df = pd.DataFrame(results)
-    fig, ax = plt.subplots(figsize=(8,3))
-    ax.axis("tight")
-    ax.axis("off")
-    table = ax.table(cellText=results_df.values,
-                     colLabels=results_df.columns,
-                     loc="center")
-    table.auto_set_font_size(False)
-    table.set_fontsize(10)
-    table.scale(1.2, 1.2)
-    plt.title("📊 Model Comparison Summary")
-    pdf.savefig()
-    plt.close()
-
-# --- Step 7: Save combined predictions & metrics ---
-new_data.to_csv("predictions_all_models.csv", index=False)
-results_df.to_csv("model_metrics_summary.csv", index=False)
-
-print("\n✅ Predictions saved to predictions_all_models.csv")
-print("✅ Metrics summary saved to model_metrics_summary.csv")
-print("✅ All plots saved in 'plots/' folder")
-print("✅ Consolidated PDF report saved as model_report.pdf")
\ No newline at end of file
+        metrics = compute_metrics(y_true, predictions)
+        results.append({"Model": name, "RMSE": metrics["RMSE"], "MAE": metrics["MAE"], "R²": metrics["R²"],
+                        "wMAPE (%)": metrics["wMAPE (%)"]})
+
+    # --- Step 3: Save combined predictions ---
+    with span("write_csv", rows=len(new_data)):
+        new_data.to_csv(output, index=False)
+    return pd.DataFrame(results)
+
+
+def predict_streaming(models: dict, input_path: str, output: str, chunk_size: int) -> pd.DataFrame:
+    """
+    Score the input `chunk_size` rows at a time, appending each scored chunk to
+    `output` and folding it into running metrics, so memory does not grow with
+    the input.
+    """
+    metrics = {name: RunningMetrics() for name in models}
+    tmp = output + ".tmp"
+    rows = 0
+
+    for chunk in dataset_store.iter_batches(input_path, chunk_size):
+        X = chunk[FEATURES].fillna(0).to_numpy(dtype=np.float64)
+        y_true = chunk["windspeed"].to_numpy(dtype=np.float64)
+
+        for name, model in models.items():
+            with span("score", rows=len(X), model=name):
+                predictions = model.predict(X)
+            chunk[f"{name}_Predicted"] = predictions
+            chunk[f"{name}_Residuals"] = y_true - predictions
+            metrics[name].update(y_true, predictions)
+
+        with span("write_csv", rows=len(chunk)):
+            chunk.to_csv(tmp, mode="w" if rows == 0 else "a", header=(rows == 0), index=False)
+        rows += len(chunk)
+        print(f"   scored {rows:,} rows", end="\r")
+
+    if rows == 0:   # empty input: a header-only output, and NaN metrics
+        columns = ["time"] + FEATURES + [f"{name}_{kind}" for name in models for kind in ("Predicted", "Residuals")]
+        pd.DataFrame(columns=columns).to_csv(tmp, index=False)
+    os.replace(tmp, output)
+    print(f"\n✅ Scored {rows:,} rows in chunks of {chunk_size:,}")
+    return pd.DataFrame([{"Model": name, "RMSE": m["RMSE"], "MAE": m["MAE"], "R²": m["R²"],
+                          "wMAPE (%)": m["wMAPE (%)"]} for name, m in ((n, r.result()) for n, r in metrics.items())])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score new ERA5 features with every trained model")
+    parser.add_argument("--input", default="new_era5_features", help="features dataset directory (or legacy CSV)")
+    parser.add_argument("--output", default="predictions_all_models.csv")
+    parser.add_argument("--stream", action="store_true", help="score in fixed-size chunks with bounded memory")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="rows per chunk with --stream")
+    parser.add_argument("--registry", default=REGISTRY_DIR, help="model registry directory")
+    parser.add_argument("--no-report", action="store_true",
+                        help="skip the plots and PDF (run report.py later); implied by --stream")
+    parser.add_argument("--sklearn", action="store_true", help="score tree ensembles with sklearn, not flat arrays")
+    args = parser.parse_args()
+
+    with stage("predict"):
+        models = load_models(args.registry, compiled=not args.sklearn)
+        if not models:
+            raise SystemExit(f"No models registered in {args.registry}; run train_models.py first "
+                             "(or model_registry.py --import-legacy . for old *_model.pkl files)")
+        for name, model in models.items():
+            print(f"🔹 {name} {model.meta['version']} (trained {model.meta['created']})")
+
+        if args.stream:
+            results_df = predict_streaming(models, args.input, args.output, args.chunk_size)
+        else:
+            results_df = predict_in_memory(models, args.input, args.output)
+
+        # --- Save metrics ---
+        results_df.to_csv("model_metrics_summary.csv", index=False)
+
+        print(f"\n✅ Predictions saved to {args.output}")
+        print("✅ Metrics summary saved to model_metrics_summary.csv")
+
+        # --- Render the report (separate stage; matplotlib is only imported here) ---
+        # It reads every prediction back into memory, so --stream leaves it to report.py
+        if args.stream and not args.no_report:
+            print(f"ℹ️ No report with --stream; render it with: python report.py --predictions {args.output}")
+        elif not args.no_report:
+            from report import build_report
+            build_report(args.output, "model_metrics_summary.csv")
+            print("✅ All plots saved in 'plots/' folder")
+            print("✅ Consolidated PDF report saved as model_report.pdf")
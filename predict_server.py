@@ -0,0 +1,188 @@
+"""
+predict_server.py
+Warm prediction service: load the registered models once, then score feature
+batches posted over HTTP (TCP or a Unix socket).
+
+  POST /predict   {"rows": [{"windspeed": ..., ...}, ...]}     (missing features -> 0)
+              or  {"features": [[...], ...]}                   (columns in FEATURES order)
+              ->  {"models": [...], "predictions": {"SVR": [...], ...}}
+  GET  /metrics   request/row/batch counters, latency percentiles and throughput
+  GET  /health
+
+Concurrent requests are coalesced into micro-batches. Scoring runs on a
+single worker thread, and everything that queued up while a batch was being
+scored (up to --max-batch-rows rows) goes into the next one, with one predict
+call per model. Each caller gets back its own slice. --max-wait-ms also holds
+a batch open for more requests after the first. Under load, queueing alone
+already fills the batches, so the default is 0.
+"""
+
+import argparse
+import asyncio
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from aiohttp import web
+
+from era5_features import FEATURES
+from instrumentation import span, stage
+from model_registry import REGISTRY_DIR
+from predict import load_models
+
+LATENCY_WINDOW = 10_000   # recent requests kept for percentiles
+
+
+class Stats:
+    """Counters exposed on /metrics."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counters = collections.Counter()
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.batch_sizes = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self) -> dict:
+        uptime = time.monotonic() - self.started
+        latencies = np.array(self.latencies) * 1000
+        pct = {f"p{q}_ms": float(np.percentile(latencies, q)) if len(latencies) else None for q in (50, 90, 99)}
+        return {
+            "uptime_s": uptime,
+            **self.counters,
+            **pct,
+            "mean_batch_rows": float(np.mean(self.batch_sizes)) if self.batch_sizes else None,
+            "requests_per_s": self.counters["requests"] / uptime,
+            "rows_per_s": self.counters["rows"] / uptime,
+        }
+
+
+class MicroBatcher:
+    def __init__(self, models: dict, stats: Stats, max_rows: int = 4096, max_wait: float = 0.0):
+        self.models = models
+        self.stats = stats
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def predict(self, X: np.ndarray) -> dict:
+        with span("batch", rows=len(X)):
+            return {name: model.predict(X) for name, model in self.models.items()}
+
+    async def submit(self, X: np.ndarray) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((X, future))
+        return await future
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while rows < self.max_rows:
+                try:
+                    item = self.queue.get_nowait() if loop.time() >= deadline else \
+                        await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            X = np.vstack([x for x, _ in batch])
+            try:
+                predictions = await loop.run_in_executor(self.executor, self.predict, X)
+            except Exception as e:   # fail every caller in the batch, keep serving
+                self.stats.counters["errors"] += 1
+                for _, future in batch:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                continue
+
+            self.stats.counters["batches"] += 1
+            self.stats.batch_sizes.append(rows)
+            offsets = np.cumsum([0] + [len(x) for x, _ in batch])
+            for (_, future), lo, hi in zip(batch, offsets[:-1], offsets[1:]):
+                if not future.cancelled():
+                    future.set_result({name: p[lo:hi] for name, p in predictions.items()})
+
+
+def parse_features(payload: dict) -> np.ndarray:
+    if "features" in payload:
+        X = np.asarray(payload["features"], dtype=np.float64).reshape(-1, len(FEATURES))
+    else:
+        X = np.array([[row.get(f, 0.0) for f in FEATURES] for row in payload["rows"]], dtype=np.float64)
+    return np.nan_to_num(X, nan=0.0)
+
+
+async def handle_predict(request: web.Request) -> web.Response:
+    start = time.perf_counter()
+    stats = request.app["stats"]
+    try:
+        X = parse_features(await request.json())
+    except (ValueError, KeyError, TypeError) as e:
+        stats.counters["errors"] += 1
+        raise web.HTTPBadRequest(text=f"bad feature batch: {e}")
+
+    predictions = await request.app["batcher"].submit(X)
+    stats.counters["requests"] += 1
+    stats.counters["rows"] += len(X)
+    stats.latencies.append(time.perf_counter() - start)
+    return web.json_response({"models": list(predictions),
+                              "predictions": {name: p.tolist() for name, p in predictions.items()}})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.json_response(request.app["stats"].snapshot())
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    models = request.app["batcher"].models
+    return web.json_response({"status": "ok", "models": {name: m.meta["version"] for name, m in models.items()}})
+
+
+def make_app(models: dict, max_rows: int = 4096, max_wait: float = 0.0) -> web.Application:
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app["stats"] = Stats()
+
+    async def start_batcher(app):
+        app["batcher"] = MicroBatcher(models, app["stats"], max_rows, max_wait)
+        task = asyncio.create_task(app["batcher"].run())
+        yield
+        task.cancel()
+        app["batcher"].executor.shutdown()
+
+    app.cleanup_ctx.append(start_batcher)
+    app.add_routes([web.post("/predict", handle_predict), web.get("/metrics", handle_metrics),
+                    web.get("/health", handle_health)])
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve predictions from the trained models")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--registry", default=REGISTRY_DIR, help="model registry directory")
+    parser.add_argument("--max-batch-rows", type=int, default=4096)
+    parser.add_argument("--max-wait-ms", type=float, default=0.0,
+                        help="hold each batch open this long for more requests")
+    parser.add_argument("--sklearn", action="store_true", help="score tree ensembles with sklearn, not flat arrays")
+    args = parser.parse_args()
+
+    # The stage spans the server's lifetime; each scored micro-batch is a "batch" span
+    with stage("predict_server"):
+        with span("load_models"):
+            models = load_models(args.registry, compiled=not args.sklearn)
+            if not models:
+                raise SystemExit(f"No models registered in {args.registry}; run train_models.py first")
+            for model in models.values():
+                model.loaded   # load now, not on the first request
+        print("✅ Loaded " + ", ".join(f"{n} {m.meta['version']}" for n, m in models.items()))
+
+        app = make_app(models, args.max_batch_rows, args.max_wait_ms / 1000)
+        if args.unix:
+            web.run_app(app, path=args.unix)
+        else:
+            web.run_app(app, host=args.host, port=args.port)
@@ -0,0 +1,198 @@
+"""
+report.py
+Reporting stage: draw the per-model figures and the PDF report from the
+predictions that predict.py saved.
+
+For every model there are three figures: actual vs predicted, residuals over
+time, and the residual distribution. Before plotting, the time series are
+reduced to --points points with Largest-Triangle-Three-Buckets (LTTB). LTTB
+keeps the peaks and troughs a line plot would show. Histograms are binned
+with np.histogram and drawn as stairs, so no figure carries the full data.
+Figures render in a process pool. PNGs go to plots/. For the PDF, each
+worker hands back its finished page as pixels (DPI), and the parent only
+places those images in the original order, so no figure is drawn twice.
+Only the time, windspeed and per-model columns are read.
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from matplotlib.backends.backend_pdf import PdfPages  # noqa: E402
+
+from instrumentation import span, stage  # noqa: E402
+
+FORMATS = ["png", "pdf"]
+DPI = 100   # resolution of the PNGs and of the rasterized PDF pages
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the `n_out` points Largest-Triangle-Three-Buckets keeps (x must be non-decreasing)."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    # n_out - 2 buckets over the interior points; first and last points are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    x_mean = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes, x[-1])
+    y_mean = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes, y[-1])
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        xa, ya, xc, yc = x[a], y[a], x_mean[i + 1], y_mean[i + 1]
+        area = np.abs((xa - xc) * (y[lo:hi] - ya) - (xa - x[lo:hi]) * (yc - ya))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(times: np.ndarray, values: np.ndarray, n_out: int) -> tuple:
+    finite = np.isfinite(values)
+    times, values = times[finite], values[finite]
+    keep = lttb(times.astype(np.int64), values, n_out)
+    return times[keep], values[keep]
+
+
+def load_predictions(path: str) -> tuple:
+    """(time-sorted frame of the needed columns, model names) from a predictions CSV."""
+    header = pd.read_csv(path, nrows=0).columns
+    models = [c[:-len("_Predicted")] for c in header if c.endswith("_Predicted")]
+    columns = ["time", "windspeed"] + [f"{m}_{kind}" for m in models for kind in ("Predicted", "Residuals")]
+    df = pd.read_csv(path, usecols=columns, parse_dates=["time"],
+                     dtype={c: np.float32 for c in columns if c != "time"})
+    if not df["time"].is_monotonic_increasing:
+        df = df.sort_values("time", kind="stable", ignore_index=True)
+    return df, models
+
+
+def figure_data(df: pd.DataFrame, name: str, n_points: int, bins: int) -> dict:
+    """Downsampled series and histogram counts for one model's three figures."""
+    times = df["time"].to_numpy()
+    residuals = df[f"{name}_Residuals"].to_numpy()
+    counts, edges = np.histogram(residuals[np.isfinite(residuals)], bins=bins)
+    return {
+        "actual": downsample(times, df["windspeed"].to_numpy(), n_points),
+        "predicted": downsample(times, df[f"{name}_Predicted"].to_numpy(), n_points),
+        "residuals": downsample(times, residuals, n_points),
+        "histogram": (counts, edges),
+    }
+
+
+def render(name: str, kind: str, data: dict, out_dir: str, formats: list):
+    """Worker: draw one figure, save the PNG if asked, and return its PDF page as (size, RGB pixels)."""
+    with span("render", model=name, figure=kind):
+        return draw(name, kind, data, out_dir, formats)
+
+
+def draw(name: str, kind: str, data: dict, out_dir: str, formats: list):
+    if kind == "actual_vs_predicted":
+        fig = plt.figure(figsize=(12,6))
+        plt.plot(*data["actual"], label="Actual Windspeed", color="blue")
+        plt.plot(*data["predicted"], label=f"{name} Predicted", color="red", linestyle="--")
+        plt.xlabel("Time")
+        plt.ylabel("Windspeed (m/s)")
+        plt.title(f"Actual vs Predicted Windspeed ({name})")
+        plt.legend()
+    elif kind == "residuals_over_time":
+        fig = plt.figure(figsize=(12,6))
+        plt.plot(*data["residuals"], label="Residuals", color="green")
+        plt.axhline(0, color="black", linestyle="--")
+        plt.xlabel("Time")
+        plt.ylabel("Residual (m/s)")
+        plt.title(f"Residuals Over Time ({name})")
+        plt.legend()
+    else:
+        fig = plt.figure(figsize=(8,6))
+        counts, edges = data["histogram"]
+        plt.stairs(counts, edges, fill=True, color="purple", alpha=0.7)
+        plt.xlabel("Residual (m/s)")
+        plt.ylabel("Frequency")
+        plt.title(f"Residual Distribution ({name})")
+    plt.tight_layout()
+
+    # Rasterize once; the PNG and the PDF page share the pixels
+    fig.set_dpi(DPI)
+    fig.canvas.draw()
+    pixels = np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()   # opaque, so the PDF needs no soft mask
+    size = tuple(fig.get_size_inches())
+    plt.close(fig)
+    if "png" in formats:
+        plt.imsave(os.path.join(out_dir, f"{name}_{kind}.png"), pixels, dpi=DPI)
+    return (size, pixels) if "pdf" in formats else None
+
+
+def summary_page(pdf: PdfPages, results_df: pd.DataFrame) -> None:
+    fig, ax = plt.subplots(figsize=(8,3))
+    ax.axis("tight")
+    ax.axis("off")
+    table = ax.table(cellText=results_df.round(6).values,
+                     colLabels=results_df.columns,
+                     loc="center")
+    table.auto_set_font_size(False)
+    table.set_fontsize(10)
+    table.scale(1.2, 1.2)
+    plt.title("📊 Model Comparison Summary")
+    pdf.savefig(fig)
+    plt.close(fig)
+
+
+def build_report(predictions: str = "predictions_all_models.csv", metrics: str = "model_metrics_summary.csv",
+                 out_dir: str = "plots", report: str = "model_report.pdf", formats: list = FORMATS,
+                 n_points: int = 2000, bins: int = 30, workers: int = None) -> None:
+    with span("load_predictions", bytes=os.path.getsize(predictions)) as s:
+        df, models = load_predictions(predictions)
+        s.rows = len(df)
+    os.makedirs(out_dir, exist_ok=True)
+    kinds = ["actual_vs_predicted", "residuals_over_time", "residual_distribution"]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for name in models:
+            with span("figure_data", rows=len(df), model=name):
+                data = figure_data(df, name, n_points, bins)
+            futures += [pool.submit(render, name, kind, data, out_dir, formats) for kind in kinds]
+        pages = [f.result() for f in futures]
+
+    if "pdf" in formats:
+        with span("write_pdf", report=report), PdfPages(report) as pdf:
+            for size, pixels in pages:
+                fig = plt.figure(figsize=size, dpi=DPI)
+                fig.figimage(pixels)
+                pdf.savefig(fig)
+                plt.close(fig)
+            if metrics and os.path.exists(metrics):
+                summary_page(pdf, pd.read_csv(metrics))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render plots and the PDF report from saved predictions")
+    parser.add_argument("--predictions", default="predictions_all_models.csv")
+    parser.add_argument("--metrics", default="model_metrics_summary.csv")
+    parser.add_argument("--out-dir", default="plots", help="folder for the PNG figures")
+    parser.add_argument("--report", default="model_report.pdf")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=FORMATS, dest="formats")
+    parser.add_argument("--points", type=int, default=2000, help="points per plotted series after LTTB")
+    parser.add_argument("--bins", type=int, default=30, help="residual histogram bins")
+    parser.add_argument("--workers", type=int, default=None, help="rendering processes (default: all cores)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with stage("report"):
+        build_report(args.predictions, args.metrics, args.out_dir, args.report, args.formats,
+                     args.points, args.bins, args.workers)
+    if "png" in args.formats:
+        print(f"✅ All plots saved in '{args.out_dir}/' folder")
+    if "pdf" in args.formats:
+        print(f"✅ Consolidated PDF report saved as {args.report}")
+    print(f"✅ Report rendered in {time.perf_counter() - start:.1f} s")
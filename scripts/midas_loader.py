@@ -1,78 +1,139 @@
 """
 midas_loader.py
 Generalised loader for MIDAS Open hourly weather observation data (qc-version-1).
+
+The header row is located by scanning for the BADC-CSV 'data' marker line, so
+files with a different metadata block length still parse. Only the needed
+columns are read, with explicit dtypes; files are parsed in a process pool and
+each parsed file is cached as Parquet keyed by its path, size and mtime, so
+warm reloads skip CSV parsing entirely.
 """
 
-import pandas as pd
-import glob
+import hashlib
 import os
+import glob
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-def load_midas_data(station_folder: str) -> pd.DataFrame:
-    files = glob.glob(os.path.join(station_folder, "*.csv"))
-    df_list = []
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import span, stage  # noqa: E402
+
+CACHE_DIR = os.path.join("data", "midas_cache")
+
+# Columns kept from each file ("ob_time" is renamed to "timestamp")
+COLUMNS = ["ob_time", "wind_speed", "wind_direction", "air_temperature", "msl_pressure"]
+DTYPES = {"ob_time": str, "wind_speed": "float32", "wind_direction": "float32",
+          "air_temperature": "float32", "msl_pressure": "float32"}
+
+
+def find_header(path: str) -> tuple:
+    """Return (lines to skip, header columns) by scanning for the 'data' marker line."""
+    with open(path, "r") as fh:
+        for i, line in enumerate(fh):
+            if line.strip().rstrip(",") == "data":
+                return i + 1, next(fh).strip().split(",")
+    raise ValueError(f"No 'data' marker line found in {path}")
+
+
+def station_name(path: str) -> str:
+    station_folder_name = os.path.basename(os.path.dirname(os.path.dirname(path)))   # e.g. '01125_rochdale'
+    if "_" in station_folder_name:
+        return station_folder_name.split("_")[-1]        # 'rochdale' or 'crosby'
+    return station_folder_name                           # fallback
+
+
+def parse_midas_file(path: str) -> pd.DataFrame:
+    """Parse one yearly MIDAS CSV into timestamp + numeric columns + station."""
+    with span("parse", bytes=os.path.getsize(path), file=os.path.basename(path)) as s:
+        skiprows, header = find_header(path)
+        usecols = [c for c in COLUMNS if c in header]
 
-    for f in files:
-        # Skip metadata + 'data' marker line
         temp_df = pd.read_csv(
-            f,
-            skiprows=283,   # skip metadata block + 'data' line
-            sep=",",        # comma-separated
-            header=0,       # first row after skiprows is header
-            low_memory=False
+            path,
+            skiprows=skiprows,     # metadata block + 'data' line
+            header=0,              # first row after skiprows is header
+            usecols=usecols,
+            dtype={c: DTYPES[c] for c in usecols},
         )
 
+        # Rename timestamp; the trailing 'end data' line becomes NaT and is dropped
+        if "ob_time" in temp_df.columns:
+            temp_df.rename(columns={"ob_time": "timestamp"}, inplace=True)
+            temp_df["timestamp"] = pd.to_datetime(temp_df["timestamp"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+
         # Drop empty rows/columns
         temp_df = temp_df.dropna(axis=1, how="all")
         temp_df = temp_df.dropna(how="all")
 
-        # Rename timestamp
-        if "ob_time" in temp_df.columns:
-            temp_df.rename(columns={"ob_time": "timestamp"}, inplace=True)
-            temp_df["timestamp"] = pd.to_datetime(temp_df["timestamp"], errors="coerce")
+        temp_df["station"] = station_name(path)
+        s.rows = len(temp_df)
+    return temp_df
 
-        # Keep only useful variables
-        cols = [c for c in ["timestamp", "wind_speed", "wind_direction", "air_temperature", "msl_pressure"] if c in temp_df.columns]
-        temp_df = temp_df[cols]
 
-        # ➡️ Add station name correctly
-        station_folder_name = os.path.basename(os.path.dirname(os.path.dirname(f)))   # e.g. '01125_rochdale'
-        if "_" in station_folder_name:
-            station_name = station_folder_name.split("_")[-1]        # 'rochdale' or 'crosby'
-        else:
-            station_name = station_folder_name                       # fallback
-        temp_df["station"] = station_name
+def cache_path(path: str, cache_dir: str) -> str:
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest()[:20] + ".parquet")
 
-        # Summary printout
-        print(f"📂 File: {os.path.basename(f)}")
-        print(f"   ➡ Columns kept: {list(temp_df.columns)}")
-        print(f"   ➡ Rows kept: {len(temp_df)}")
 
-        # Append to list
-        df_list.append(temp_df)
+def load_files(files: list, cache_dir: str = CACHE_DIR, workers: int = None) -> pd.DataFrame:
+    """Load MIDAS files, reading cached Parquet where fresh and parsing the rest in parallel."""
+    frames = {}
+    misses = []
+    for f in files:
+        cached = cache_path(f, cache_dir) if cache_dir else None
+        if cached and os.path.exists(cached):
+            with span("read_cache", bytes=os.path.getsize(cached), file=os.path.basename(f)) as s:
+                frames[f] = pd.read_parquet(cached)
+                s.rows = len(frames[f])
+        else:
+            misses.append(f)
+
+    if misses:
+        if workers == 1 or len(misses) == 1:
+            parsed = [parse_midas_file(f) for f in misses]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parsed = list(pool.map(parse_midas_file, misses))
+
+        for f, temp_df in zip(misses, parsed):
+            # Summary printout
+            print(f"📂 File: {os.path.basename(f)}")
+            print(f"   ➡ Columns kept: {list(temp_df.columns)}")
+            print(f"   ➡ Rows kept: {len(temp_df)}")
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+                temp_df.to_parquet(cache_path(f, cache_dir), index=False)
+            frames[f] = temp_df
 
     # Concatenate all years
-    if df_list:
-        df = pd.concat(df_list, ignore_index=True)
+    if frames:
+        df = pd.concat([frames[f] for f in files], ignore_index=True)
     else:
         df = pd.DataFrame()
 
     # Drop rows with missing timestamps
     if "timestamp" in df.columns:
         df = df.dropna(subset=["timestamp"])
-        df = df.sort_values("timestamp")
+        df = df.sort_values(["station", "timestamp"], kind="stable")
         df.reset_index(drop=True, inplace=True)
 
     return df
 
 
-def load_multiple_stations(station_folders: list) -> pd.DataFrame:
-    """Load and combine multiple station datasets into one DataFrame."""
-    all_data = []
+def load_midas_data(station_folder: str, cache_dir: str = CACHE_DIR, workers: int = None) -> pd.DataFrame:
+    files = sorted(glob.glob(os.path.join(station_folder, "*.csv")))
+    return load_files(files, cache_dir, workers)
+
+
+def load_multiple_stations(station_folders: list, cache_dir: str = CACHE_DIR, workers: int = None) -> pd.DataFrame:
+    """Load and combine multiple station datasets into one DataFrame, parsing all their files in one pool."""
+    files = []
     for folder in station_folders:
-        df = load_midas_data(folder)
-        all_data.append(df)
-    combined = pd.concat(all_data, ignore_index=True)
-    return combined
+        files.extend(sorted(glob.glob(os.path.join(folder, "*.csv"))))
+    return load_files(files, cache_dir, workers)
 
 
 if __name__ == "__main__":
@@ -80,12 +141,13 @@ if __name__ == "__main__":
     rochdale_path = r"C:\Users\SURFACE\OneDrive - University of Bolton\Assessments\7006\DISSERTATION\Wind Codes\data\midas\01125_rochdale\qc-version-1"
     crosby_path   = r"C:\Users\SURFACE\OneDrive - University of Bolton\Assessments\7006\DISSERTATION\Wind Codes\data\midas\17309_crosby\qc-version-1"
 
-    # Load both stations
-    combined_df = load_multiple_stations([rochdale_path, crosby_path])
+    with stage("midas_loader"):
+        # Load both stations
+        combined_df = load_multiple_stations([rochdale_path, crosby_path])
 
-    print("✅ Combined MIDAS data loaded")
-    print(combined_df.head())
-    print(f"Total rows: {len(combined_df)}")
-    print(f"Stations included: {combined_df['station'].unique()}")
+        print("✅ Combined MIDAS data loaded")
+        print(combined_df.head())
+        print(f"Total rows: {len(combined_df)}")
+        print(f"Stations included: {combined_df['station'].unique()}")
 
-    combined_df.to_csv("data/midas_combined.csv", index=False)
\ No newline at end of file
+        combined_df.to_csv("data/midas_combined.csv", index=False)
@@ -1,47 +1,188 @@
+"""
+owm_loader.py
+Fetch OpenWeatherMap 5-day / 3-hour forecasts for many sites.
+
+Requests run on one pooled aiohttp session with bounded concurrency and a
+token-bucket rate limit, and are retried with backoff on 429/5xx. Responses are
+cached on disk until the next 3-hourly forecast issue, so refreshes within the
+same cycle make no API calls. The API key is read from OWM_API_KEY.
+"""
+
+import asyncio
+import hashlib
+import json
 import os
-import requests
+import sys
+import time
+
+import aiohttp
 import pandas as pd
-from datetime import datetime
 
-def fetch_owm_forecast(lat: float, lon: float, station_name: str, api_key: str) -> pd.DataFrame:
-    url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-    response = requests.get(url)
-    data = response.json()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import span, stage  # noqa: E402
 
-    rows = []
-    for entry in data.get("list", []):
-        timestamp = datetime.fromtimestamp(entry["dt"])
-        wind_speed = entry["wind"]["speed"]
-        wind_direction = entry["wind"]["deg"]
-        air_temperature = entry["main"]["temp"]
+OWM_URL = "https://api.openweathermap.org/data/2.5/forecast"
+CACHE_DIR = os.path.join("openweathermap", "cache")
+ISSUE_CYCLE = 3 * 3600   # forecasts are issued every 3 hours (UTC)
 
-        rows.append({
-            "timestamp": timestamp,
-            "wind_speed": wind_speed,
-            "wind_direction": wind_direction,
-            "air_temperature": air_temperature,
-            "station": station_name
-        })
+SITES = pd.DataFrame({
+    "station": ["rochdale", "crosby"],
+    "lat": [53.609, 53.4778],
+    "lon": [-2.179, -3.0333],
+})
 
-    df = pd.DataFrame(rows)
-    df = df.sort_values("timestamp").reset_index(drop=True)
-    return df
 
+class TokenBucket:
+    """Allow `rate` requests per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def cache_file(lat: float, lon: float, cache_dir: str) -> str:
+    key = hashlib.sha1(f"{lat:.4f},{lon:.4f}".encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def read_cache(lat: float, lon: float, cache_dir: str, now: float = None):
+    """Return the cached payload if it was fetched in the current 3-hour issue cycle."""
+    path = cache_file(lat, lon, cache_dir) if cache_dir else None
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        cached = json.load(fh)
+    now = time.time() if now is None else now
+    if cached["fetched_at"] // ISSUE_CYCLE != now // ISSUE_CYCLE:
+        return None
+    return cached["payload"]
+
+
+def write_cache(lat: float, lon: float, cache_dir: str, payload: dict) -> None:
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_file(lat, lon, cache_dir)
+    with open(path + ".tmp", "w") as fh:
+        json.dump({"fetched_at": time.time(), "payload": payload}, fh)
+    os.replace(path + ".tmp", path)
+
+
+async def fetch_one(session: aiohttp.ClientSession, limiter: TokenBucket, url: str, params: dict,
+                    retries: int = 3, backoff: float = 1.0) -> dict:
+    if retries < 1:
+        raise ValueError(f"retries must be at least 1, got {retries}")
+    for attempt in range(retries):
+        await limiter.acquire()
+        try:
+            async with session.get(url, params=params) as response:
+                if response.status == 429 or response.status >= 500:
+                    raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                      status=response.status, message=response.reason)
+                response.raise_for_status()
+                return await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt + 1 == retries or (isinstance(e, aiohttp.ClientResponseError)
+                                          and e.status < 500 and e.status != 429):
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt)
 
-if __name__ == "__main__":
-    api_key = "68f5a9aa11de1243f2a4cb1ea3ad48a0"
 
-    # Fetch forecasts
-    rochdale_df = fetch_owm_forecast(53.609, -2.179, "rochdale", api_key)
-    crosby_df   = fetch_owm_forecast(53.4778, -3.0333, "crosby", api_key)
+async def fetch_payloads(sites: pd.DataFrame, api_key: str, url: str = OWM_URL, concurrency: int = 10,
+                         rate: float = 1.0, burst: int = 10, timeout: float = 30.0,
+                         cache_dir: str = CACHE_DIR, retries: int = 3) -> list:
+    """
+    Fetch the raw forecast JSON for every site (cached where fresh), in site order.
+    A site whose fetch still fails after `retries` attempts is reported and gets
+    None; the other sites are unaffected. Raises if every fetch failed.
+    """
+    if retries < 1:
+        raise ValueError(f"retries must be at least 1, got {retries}")
+    payloads = [read_cache(lat, lon, cache_dir) for lat, lon in zip(sites["lat"], sites["lon"])]
+    missing = [i for i, p in enumerate(payloads) if p is None]
+    if not missing:
+        return payloads
+
+    limiter = TokenBucket(rate, burst)
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async def fetch(i: int) -> None:
+            lat, lon = float(sites["lat"].iloc[i]), float(sites["lon"].iloc[i])
+            params = {"lat": lat, "lon": lon, "appid": api_key, "units": "metric"}
+            async with semaphore:
+                # Concurrent fetches overlap, so each span is one request's latency, not exclusive time
+                with span("fetch", site=str(sites["station"].iloc[i])):
+                    payloads[i] = await fetch_one(session, limiter, url, params, retries)
+            if cache_dir:
+                write_cache(lat, lon, cache_dir, payloads[i])
+
+        results = await asyncio.gather(*(fetch(i) for i in missing), return_exceptions=True)
+
+    failed = [(i, e) for i, e in zip(missing, results) if isinstance(e, BaseException)]
+    for i, e in failed:   # not str(e): a ClientResponseError's message includes the URL and its API key
+        reason = f"HTTP {e.status} {e.message}" if isinstance(e, aiohttp.ClientResponseError) else repr(e)
+        print(f"⚠️ No forecast for {sites['station'].iloc[i]}: {reason}")
+    if failed and len(failed) == len(payloads):
+        raise failed[0][1]
+    return payloads
+
+
+def payloads_to_frame(payloads: list, stations: list) -> pd.DataFrame:
+    """Flatten forecast payloads into one row per (station, forecast time) with json_normalize."""
+    entries = [p.get("list", []) if p else [] for p in payloads]   # None: the site's fetch failed
+    flat = pd.json_normalize([e for site_entries in entries for e in site_entries])
+    if flat.empty:
+        return pd.DataFrame(columns=["timestamp", "wind_speed", "wind_direction", "air_temperature", "station"])
+
+    df = pd.DataFrame({
+        "timestamp": pd.to_datetime(flat["dt"], unit="s"),   # UTC, like MIDAS ob_time
+        "wind_speed": flat["wind.speed"],
+        "wind_direction": flat["wind.deg"],
+        "air_temperature": flat["main.temp"],
+        "station": pd.Series(stations).repeat([len(e) for e in entries]).to_numpy(),
+    })
+    return df.sort_values(["station", "timestamp"]).reset_index(drop=True)
+
+
+def fetch_forecasts(sites: pd.DataFrame, api_key: str, **kwargs) -> pd.DataFrame:
+    """Fetch forecasts for every site in `sites` (columns station, lat, lon)."""
+    payloads = asyncio.run(fetch_payloads(sites, api_key, **kwargs))
+    return payloads_to_frame(payloads, list(sites["station"]))
+
+
+def fetch_owm_forecast(lat: float, lon: float, station_name: str, api_key: str, **kwargs) -> pd.DataFrame:
+    sites = pd.DataFrame({"station": [station_name], "lat": [lat], "lon": [lon]})
+    return fetch_forecasts(sites, api_key, **kwargs)
+
+
+if __name__ == "__main__":
+    api_key = os.environ.get("OWM_API_KEY")
+    if not api_key:
+        raise SystemExit("Set the OWM_API_KEY environment variable")
 
-    # Combine both
-    combined_df = pd.concat([rochdale_df, crosby_df], ignore_index=True)
+    with stage("owm_loader"):
+        # Fetch forecasts for every site at once
+        combined_df = fetch_forecasts(SITES, api_key)
 
-    # ✅ Ensure folder exists before saving
-    os.makedirs("openweathermap", exist_ok=True)
+        # ✅ Ensure folder exists before saving
+        os.makedirs("openweathermap", exist_ok=True)
 
-    # ✅ Save to CSV
-    combined_df.to_csv("openweathermap/forecast_combined.csv", index=False)
+        # ✅ Save to CSV
+        with span("write_csv", rows=len(combined_df)):
+            combined_df.to_csv("openweathermap/forecast_combined.csv", index=False)
 
-    print("✅ OWM forecast data saved to openweathermap/forecast_combined.csv")
\ No newline at end of file
+    print("✅ OWM forecast data saved to openweathermap/forecast_combined.csv")
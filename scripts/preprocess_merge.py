@@ -1,71 +1,131 @@
 """
 preprocess_merge.py
 Resample MIDAS hourly observations to 3-hourly and merge with OWM forecasts.
+
+All stations are resampled in one vectorized pass on integer (station, 3h bin)
+keys, and forecasts are joined with a per-station as-of merge.
 """
 
 import os
-import pandas as pd
+import sys
 
-def resample_midas_to_3hourly(midas_df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Resample MIDAS hourly data to 3-hourly resolution.
-    Aggregates wind_speed, wind_direction, air_temperature (and msl_pressure if present).
-    """
-    midas_df["timestamp"] = pd.to_datetime(midas_df["timestamp"])
-    midas_df = midas_df.set_index("timestamp")
+import numpy as np
+import pandas as pd
 
-    # Only resample numeric columns
-    numeric_cols = ["wind_speed", "wind_direction", "air_temperature"]
-    if "msl_pressure" in midas_df.columns:
-        numeric_cols.append("msl_pressure")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import span, stage  # noqa: E402
 
-    resampled = midas_df[numeric_cols].resample("3h").mean().reset_index()
+BIN = pd.Timedelta("3h")
 
-    # Reattach station info (assumes single station per call)
-    resampled["station"] = midas_df["station"].iloc[0]
 
+def resample_midas_to_3hourly(midas_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Resample MIDAS hourly data to 3-hourly resolution, for every station at once.
+    Aggregates wind_speed, air_temperature (and msl_pressure if present) with the
+    mean and wind_direction with the circular mean. Each station gets every bin
+    from its first to its last observation; empty bins are NaN. The input is not modified.
+    """
+    numeric_cols = [c for c in ["wind_speed", "wind_direction", "air_temperature", "msl_pressure"]
+                    if c in midas_df.columns]
+
+    # Integer keys: station code and 3-hour bin number since the epoch. Stations are coded
+    # after dropping the rows without a station or time, so every station has a valid row.
+    valid = midas_df["station"].notna().to_numpy() & ~pd.isna(midas_df["timestamp"]).to_numpy()
+    station_codes, stations = pd.factorize(midas_df["station"][valid], sort=True)
+    ts = pd.to_datetime(midas_df["timestamp"]).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    bins = ts[valid] // BIN.value
+
+    # Dense output layout: each station owns the bin range [first, last]
+    n_stations = len(stations)
+    first = np.full(n_stations, np.iinfo(np.int64).max)
+    last = np.full(n_stations, np.iinfo(np.int64).min)
+    np.minimum.at(first, station_codes, bins)
+    np.maximum.at(last, station_codes, bins)
+    lengths = last - first + 1
+    offsets = np.cumsum(lengths) - lengths
+    keys = offsets[station_codes] + bins - first[station_codes]
+    n_out = int(lengths.sum())
+
+    def bin_mean(values: np.ndarray) -> np.ndarray:
+        ok = ~np.isnan(values)
+        sums = np.bincount(keys[ok], weights=values[ok], minlength=n_out)
+        counts = np.bincount(keys[ok], minlength=n_out)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    out_station = np.repeat(np.arange(n_stations), lengths)
+    out_bins = np.arange(n_out) - np.repeat(offsets, lengths) + np.repeat(first, lengths)
+    resampled = pd.DataFrame({"timestamp": (out_bins * BIN.value).astype("datetime64[ns]")})
+
+    for col in numeric_cols:
+        values = midas_df[col].to_numpy(dtype=np.float64)[valid]
+        if col == "wind_direction":
+            # Circular mean, so 350° and 10° average to 0° rather than 180°
+            rad = np.radians(values)
+            mean_sin, mean_cos = bin_mean(np.sin(rad)), bin_mean(np.cos(rad))
+            direction = np.degrees(np.arctan2(mean_sin, mean_cos)) % 360
+            resampled[col] = np.where(direction >= 360, 0.0, direction)   # -0.0 % 360 rounds to 360
+        else:
+            resampled[col] = bin_mean(values)
+
+    resampled["station"] = np.asarray(stations)[out_station]
     return resampled
 
 
-def merge_midas_owm(midas_df: pd.DataFrame, owm_df: pd.DataFrame) -> pd.DataFrame:
+def merge_midas_owm(midas_df: pd.DataFrame, owm_df: pd.DataFrame,
+                    tolerance: pd.Timedelta = pd.Timedelta("90min")) -> pd.DataFrame:
     """
     Merge resampled MIDAS observations with OWM forecasts.
-    Aligns on timestamp + station.
+    Each 3-hourly observation is matched per station to the nearest forecast
+    within `tolerance`; observations with no forecast in range are dropped.
     """
     # Resample MIDAS
-    midas_resampled = resample_midas_to_3hourly(midas_df)
-
-    # Merge on timestamp + station
-    merged = pd.merge(
-        midas_resampled,
-        owm_df,
-        on=["timestamp", "station"],
-        suffixes=("_obs", "_fc")
-    )
-
-    return merged
+    with span("resample", rows=len(midas_df)):
+        midas_resampled = resample_midas_to_3hourly(midas_df)
+    midas_resampled["timestamp"] = midas_resampled["timestamp"].astype("datetime64[ns]")
+
+    forecasts = owm_df.copy()
+    forecasts["timestamp"] = pd.to_datetime(forecasts["timestamp"]).astype("datetime64[ns]")
+    forecasts["_fc_time"] = forecasts["timestamp"]
+
+    # As-of merge on timestamp within each station
+    with span("merge_asof", rows=len(midas_resampled) + len(forecasts)):
+        merged = pd.merge_asof(
+            midas_resampled.sort_values("timestamp"),
+            forecasts.sort_values("timestamp"),
+            on="timestamp",
+            by="station",
+            tolerance=tolerance,
+            direction="nearest",
+            suffixes=("_obs", "_fc")
+        )
+    merged = merged.dropna(subset=["_fc_time"]).drop(columns="_fc_time")
+
+    return merged.sort_values(["station", "timestamp"]).reset_index(drop=True)
 
 
 if __name__ == "__main__":
-    # Paths to input files
-    midas_path = "data/midas_combined.csv"                # output from midas_loader.py
-    owm_path   = "openweathermap/forecast_combined.csv"   # output from owm_loader.py
-
-    # Load data
-    midas_df = pd.read_csv(midas_path, parse_dates=["timestamp"])
-    owm_df   = pd.read_csv(owm_path, parse_dates=["timestamp"])
-
-    # Merge
-    merged_df = merge_midas_owm(midas_df, owm_df)
-
-    print("✅ MIDAS + OWM merged dataset created")
-    print(merged_df.head())
-    print(f"Total rows: {len(merged_df)}")
-    print(f"Stations included: {merged_df['station'].unique()}")
-
-    # Ensure output folder exists
-    os.makedirs("data/merged", exist_ok=True)
-
-    # Save merged dataset
-    merged_df.to_csv("data/merged/midas_owm_3hourly.csv", index=False)
-    print("💾 Saved merged dataset to data/merged/midas_owm_3hourly.csv")
\ No newline at end of file
+    with stage("preprocess_merge"):
+        # Paths to input files
+        midas_path = "data/midas_combined.csv"                # output from midas_loader.py
+        owm_path   = "openweathermap/forecast_combined.csv"   # output from owm_loader.py
+
+        # Load data
+        with span("read_csv", bytes=os.path.getsize(midas_path) + os.path.getsize(owm_path)):
+            midas_df = pd.read_csv(midas_path, parse_dates=["timestamp"])
+            owm_df   = pd.read_csv(owm_path, parse_dates=["timestamp"])
+
+        # Merge
+        merged_df = merge_midas_owm(midas_df, owm_df)
+
+        print("✅ MIDAS + OWM merged dataset created")
+        print(merged_df.head())
+        print(f"Total rows: {len(merged_df)}")
+        print(f"Stations included: {merged_df['station'].unique()}")
+
+        # Ensure output folder exists
+        os.makedirs("data/merged", exist_ok=True)
+
+        # Save merged dataset
+        merged_df.to_csv("data/merged/midas_owm_3hourly.csv", index=False)
+        print("💾 Saved merged dataset to data/merged/midas_owm_3hourly.csv")
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+spatial_index.py
+Map stations and turbine sites onto the ERA5 grid and extract per-site series.
+
+A KD-tree over the grid gives each site its nearest cell; bilinear weights use
+the four surrounding cells. Weights are cached on disk keyed by the grid
+definition and the site list, and extraction gathers every site from each
+loaded array at once, so hundreds of sites cost one pass over the data.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy.spatial import cKDTree
+
+import dataset_store
+from era5_features import grid_index, to_grid
+
+EARTH_RADIUS_KM = 6371.0
+
+# MIDAS stations (scripts/midas_loader.py) and OWM forecast points (scripts/owm_loader.py)
+SITES = pd.DataFrame({
+    "site": ["rochdale", "crosby"],
+    "latitude": [53.609, 53.4778],
+    "longitude": [-2.179, -3.0333],
+})
+
+
+def _unit_xyz(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(lats), np.radians(lons)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _bracket(axis: np.ndarray, x: np.ndarray) -> tuple:
+    """Indices of the two axis points around each x and the fraction towards the second (axis may descend)."""
+    n = len(axis)
+    if n == 1:
+        zeros = np.zeros(len(x), dtype=np.int64)
+        return zeros, zeros, np.zeros(len(x))
+    ascending = axis[0] <= axis[-1]
+    a = axis if ascending else axis[::-1]
+    x = np.clip(x, a[0], a[-1])
+    i1 = np.clip(np.searchsorted(a, x, side="right"), 1, n - 1)
+    i0 = i1 - 1
+    frac = (x - a[i0]) / (a[i1] - a[i0])
+    if not ascending:
+        i0, i1 = n - 1 - i0, n - 1 - i1
+    return i0, i1, frac
+
+
+def grid_key(lats: np.ndarray, lons: np.ndarray) -> str:
+    """Stable hash of a grid definition (coordinate values and their order)."""
+    sha = hashlib.sha1()
+    sha.update(np.asarray(lats, dtype=np.float64).tobytes())
+    sha.update(np.asarray(lons, dtype=np.float64).tobytes())
+    return sha.hexdigest()[:16]
+
+
+def compute_weights(lats: np.ndarray, lons: np.ndarray, sites: pd.DataFrame, method: str = "bilinear") -> dict:
+    """
+    Per-site grid indices and weights, each shaped (n_sites, k): k=1 for
+    "nearest", k=4 for "bilinear". Sites outside the grid are clamped to its edge
+    and flagged in "inside".
+    """
+    lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+    site_lat = sites["latitude"].to_numpy(dtype=np.float64)
+    site_lon = sites["longitude"].to_numpy(dtype=np.float64)
+
+    # Nearest cell by great-circle distance via a KD-tree on unit-sphere coordinates
+    grid_lat, grid_lon = np.meshgrid(lats, lons, indexing="ij")
+    tree = cKDTree(_unit_xyz(grid_lat.ravel(), grid_lon.ravel()))
+    chord, flat = tree.query(_unit_xyz(site_lat, site_lon))
+    near_lat, near_lon = np.unravel_index(flat, grid_lat.shape)
+
+    if method == "nearest":
+        lat_idx, lon_idx = near_lat[:, None], near_lon[:, None]
+        weights = np.ones((len(sites), 1))
+    elif method == "bilinear":
+        y0, y1, fy = _bracket(lats, site_lat)
+        x0, x1, fx = _bracket(lons, site_lon)
+        lat_idx = np.column_stack([y0, y0, y1, y1])
+        lon_idx = np.column_stack([x0, x1, x0, x1])
+        weights = np.column_stack([(1 - fy) * (1 - fx), (1 - fy) * fx, fy * (1 - fx), fy * fx])
+    else:
+        raise ValueError(f"unknown method {method!r}")
+
+    inside = ((site_lat >= lats.min()) & (site_lat <= lats.max())
+              & (site_lon >= lons.min()) & (site_lon <= lons.max()))
+    return {
+        "site": sites["site"].to_numpy(dtype=str),
+        "lat_idx": lat_idx,
+        "lon_idx": lon_idx,
+        "weights": weights,
+        "nearest_km": 2 * EARTH_RADIUS_KM * np.arcsin(chord / 2),
+        "inside": inside,
+    }
+
+
+def site_weights(lats: np.ndarray, lons: np.ndarray, sites: pd.DataFrame = SITES,
+                 method: str = "bilinear", cache_dir: str = "spatial_cache") -> dict:
+    """compute_weights() with an on-disk cache keyed by grid definition, site list and method."""
+    sha = hashlib.sha1(pd.util.hash_pandas_object(sites[["site", "latitude", "longitude"]], index=False).values)
+    path = os.path.join(cache_dir, f"{grid_key(lats, lons)}_{sha.hexdigest()[:16]}_{method}.npz")
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as f:
+            return {k: f[k] for k in f.files}
+
+    weights = compute_weights(lats, lons, sites, method)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(path, **weights)
+    return weights
+
+
+def _gather(arr: np.ndarray, weights: dict) -> np.ndarray:
+    """Weighted gather from a (time, lat, lon) array into (time, site)."""
+    return (arr[:, weights["lat_idx"], weights["lon_idx"]] * weights["weights"]).sum(axis=-1)
+
+
+def _long_frame(times: np.ndarray, weights: dict, columns: dict) -> pd.DataFrame:
+    n_sites = len(weights["site"])
+    out = pd.DataFrame({"time": np.repeat(times, n_sites), "site": np.tile(weights["site"], len(times))})
+    for name, values in columns.items():
+        out[name] = values.reshape(-1)
+    return out
+
+
+def extract_sites(ds: xr.Dataset, sites: pd.DataFrame = SITES, method: str = "bilinear",
+                  variables: list = None, cache_dir: str = "spatial_cache") -> pd.DataFrame:
+    """Per-site series from a gridded dataset (e.g. era5_loader.derive_fields output), one row per (time, site)."""
+    if "valid_time" in ds.coords and "time" not in ds.coords:
+        ds = ds.rename({"valid_time": "time"})
+    ds = ds.transpose("time", "latitude", "longitude")
+    weights = site_weights(ds["latitude"].values, ds["longitude"].values, sites, method, cache_dir)
+    variables = variables or list(ds.data_vars)
+    return _long_frame(ds["time"].values, weights, {v: _gather(ds[v].values, weights) for v in variables})
+
+
+def extract_sites_from_dataset(root: str, sites: pd.DataFrame = SITES, method: str = "bilinear",
+                               variables: list = None, cache_dir: str = "spatial_cache") -> pd.DataFrame:
+    """Per-site series from a partitioned long-form dataset (e.g. era5_cleaned/), one partition at a time."""
+    columns = ["time", "latitude", "longitude"] + variables if variables else None
+    frames = []
+    for df in dataset_store.iter_partitions(root, columns):
+        time_codes, positions, times, n_cells, levels = grid_index(df, dense=True)
+        lats, lons = levels["latitude"], levels["longitude"]
+        weights = site_weights(lats, lons, sites, method, cache_dir)
+        shape = (len(times), len(lats), len(lons))
+        names = variables or [c for c in df.columns if c not in ("time", "latitude", "longitude")]
+        series = {}
+        for v in names:
+            grid = to_grid(df[v].to_numpy(), positions, (len(times), n_cells))
+            series[v] = _gather(grid.reshape(shape), weights)
+        frames.append(_long_frame(times.to_numpy(), weights, series))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+if __name__ == "__main__":
+    out = extract_sites_from_dataset("era5_cleaned", variables=["windspeed", "temperature_C", "pressure_hPa"])
+    print(out.head())
+    dataset_store.write_partitions(out, "era5_sites")
+    print(f"✅ Extracted {len(out)} rows for {out['site'].nunique()} sites to era5_sites/")
@@ -0,0 +1,173 @@
+"""
+train_horizons.py
+Train direct multi-horizon windspeed forecasters on era5_features.
+
+Each model predicts windspeed at every horizon at once (+3 h to +72 h by
+default). Its inputs are a lag window of past windspeed, the origin's
+temperature and pressure, and the time of day and year (see horizons.py).
+Unlike train_models.py, the inputs never contain the value being predicted.
+
+The split is chronological. Test origins start --test-size before the end of
+the time axis. Training origins stop one full lead earlier, so no training
+target falls in the test period. Estimators with partial_fit (DirectRidge)
+take the training origins batch by batch, so memory stays near the size of
+the series. The tree models need all their rows at once. They get one
+materialized matrix, thinned at random to --max-rows. Test metrics are
+accumulated per horizon, batch by batch, next to a persistence baseline. Each
+model is registered with its tensor spec and its RMSE per horizon.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.multioutput import MultiOutputRegressor
+from threadpoolctl import threadpool_limits
+
+import dataset_store
+from horizons import DEFAULT_HORIZONS, DEFAULT_WINDOW, LAG_COLUMNS, ORIGIN_COLUMNS, TARGET, TENSOR_DTYPE
+from horizons import BatchRidge, HorizonTensor
+from instrumentation import span, stage
+from model_registry import REGISTRY_DIR, ModelRegistry
+from train_models import RunningMetrics
+
+# Model factories take the number of threads the estimator may use; every model predicts all horizons
+HORIZON_MODELS = {
+    "DirectRidge": lambda n_jobs: BatchRidge(alpha=1.0),
+    "DirectRandomForest": lambda n_jobs: RandomForestRegressor(n_estimators=100, min_samples_leaf=5, max_features=0.3,
+                                                               random_state=42, n_jobs=n_jobs),
+    "DirectGradientBoosting": lambda n_jobs: MultiOutputRegressor(
+        HistGradientBoostingRegressor(max_iter=200, random_state=42)),
+}
+DEFAULT_HORIZON_MODELS = ["DirectRidge", "DirectGradientBoosting"]
+PERSISTENCE = "Persistence"   # baseline: the last observed windspeed at every horizon
+
+
+def read_tensor(input_path: str, window: int = DEFAULT_WINDOW, horizons: list = DEFAULT_HORIZONS,
+                lag_columns: list = LAG_COLUMNS, origin_columns: list = ORIGIN_COLUMNS,
+                target: str = TARGET) -> HorizonTensor:
+    """Read only the columns the tensor needs and build it; the long-form frame is dropped afterwards."""
+    columns = list(dict.fromkeys(["time", "latitude", "longitude"] + lag_columns + origin_columns + [target]))
+    df = dataset_store.read_table(input_path, columns=columns)
+    with span("build_tensor", rows=len(df)) as s:
+        tensor = HorizonTensor.from_frame(df, window=window, horizons=horizons, lag_columns=lag_columns,
+                                          origin_columns=origin_columns, target=target)
+        s.bytes = tensor.nbytes
+    return tensor
+
+
+def split_origins(tensor: HorizonTensor, test_size: float) -> tuple:
+    """(train mask, test mask, cut): test origins from time index `cut`, training targets all before it."""
+    cut = int(len(tensor.times) * (1 - test_size))
+    return tensor.origins(stop=cut - int(tensor.steps.max())), tensor.origins(start=cut), cut
+
+
+def fit_direct(model, tensor: HorizonTensor, mask: np.ndarray, max_rows: int = None,
+               batch_size: int = 65_536) -> tuple:
+    """Fit `model` on the origins in `mask`; returns (model, training rows)."""
+    if hasattr(model, "partial_fit"):
+        rows = 0
+        for _, _, X, Y in tensor.batches(mask, batch_size):
+            model.partial_fit(X, Y)
+            rows += len(X)
+        return model, rows
+    X, Y = tensor.materialize(mask, max_rows, batch_size=batch_size)
+    return model.fit(X, Y), len(X)
+
+
+def persistence(tensor: HorizonTensor, X: np.ndarray) -> np.ndarray:
+    last = tensor.feature_names.index(f"{tensor.target}_t-0")
+    return np.repeat(X[:, last:last + 1].astype(np.float64), len(tensor.horizons), axis=1)
+
+
+def evaluate(models: dict, tensor: HorizonTensor, mask: np.ndarray, batch_size: int = 65_536) -> tuple:
+    """
+    Score every model, and the persistence baseline, on the origins in `mask`.
+    Returns ({model: overall metrics}, {model: [metrics per horizon]}).
+    """
+    names = list(models) + [PERSISTENCE]
+    overall = {name: RunningMetrics() for name in names}
+    by_horizon = {name: [RunningMetrics() for _ in tensor.horizons] for name in names}
+    for _, _, X, Y in tensor.batches(mask, batch_size):
+        for name in names:
+            with span("score", rows=len(X), model=name):
+                P = persistence(tensor, X) if name == PERSISTENCE else models[name].predict(X).reshape(Y.shape)
+            overall[name].update(Y.ravel(), P.ravel())
+            for j, metrics in enumerate(by_horizon[name]):
+                metrics.update(Y[:, j], P[:, j])
+    return ({n: m.result() for n, m in overall.items()},
+            {n: [m.result() for m in ms] for n, ms in by_horizon.items()})
+
+
+def horizon_table(tensor: HorizonTensor, by_horizon: dict, metric: str = "RMSE") -> pd.DataFrame:
+    return pd.DataFrame({"Lead (h)": tensor.horizons,
+                         **{name: [m[metric] for m in ms] for name, ms in by_horizon.items()}})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train direct multi-horizon windspeed forecasters")
+    parser.add_argument("--input", default="era5_features", help="features dataset directory (or legacy CSV)")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_HORIZON_MODELS, choices=list(HORIZON_MODELS))
+    parser.add_argument("--horizons", nargs="+", type=int, default=DEFAULT_HORIZONS, help="lead times in hours")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="lag window length in time steps")
+    parser.add_argument("--test-size", type=float, default=0.2, help="share of the time axis held out")
+    parser.add_argument("--max-rows", type=int, default=200_000,
+                        help="training rows for models without partial_fit (random thinning)")
+    parser.add_argument("--batch-size", type=int, default=65_536, help="origins materialized at a time")
+    parser.add_argument("--cores", type=int, default=os.cpu_count(), help="threads per model")
+    parser.add_argument("--registry", default=REGISTRY_DIR, help="model registry directory")
+    parser.add_argument("--report", default="horizon_metrics.csv", help="CSV of test RMSE per lead time")
+    args = parser.parse_args()
+
+    with stage("train_horizons"):
+        start = time.perf_counter()
+
+        # --- Step 1: Build the lag/lead tensor over the per-cell series ---
+        print("🔹 Building lag windows and lead targets...")
+        tensor = read_tensor(args.input, args.window, args.horizons)
+        print(f"✅ {len(tensor.cells)} cells x {len(tensor.times)} steps of {tensor.step_hours:g} h, "
+              f"{len(tensor.feature_names)} inputs, {len(tensor.horizons)} horizons, "
+              f"{tensor.nbytes / 1e6:.1f} MB held")
+
+        # --- Step 2: Chronological split of the forecast origins ---
+        train_mask, test_mask, cut = split_origins(tensor, args.test_size)
+        print(f"✅ Training origins: {int(train_mask.sum()):,}, test origins: {int(test_mask.sum()):,} "
+              f"(from {tensor.times[cut]})")
+
+        # --- Step 3: Fit every model ---
+        models, rows = {}, {}
+        for name in args.models:
+            print(f"\n🚀 Training {name}...")
+            fit_start = time.perf_counter()
+            with threadpool_limits(limits=args.cores), span("fit", model=name) as s:
+                models[name], rows[name] = fit_direct(HORIZON_MODELS[name](args.cores), tensor, train_mask,
+                                                      args.max_rows, args.batch_size)
+                s.rows = rows[name]
+            print(f"✅ {name} trained on {rows[name]:,} origins in {time.perf_counter() - fit_start:.1f} s")
+
+        # --- Step 4: Score per horizon, next to persistence ---
+        with threadpool_limits(limits=args.cores):
+            overall, by_horizon = evaluate(models, tensor, test_mask, args.batch_size)
+
+        # --- Step 5: Register ---
+        registry = ModelRegistry(args.registry)
+        for name, model in models.items():
+            rmse = {f"+{h}h": float(m["RMSE"]) for h, m in zip(tensor.horizons, by_horizon[name])}
+            with span("register", model=name):
+                meta = registry.register(name, model, metrics=overall[name], params=model.get_params(deep=False),
+                                         data_range=(tensor.times[0], tensor.times[cut - 1]), n_rows=rows[name],
+                                         features=tensor.feature_names, feature_dtype=TENSOR_DTYPE,
+                                         extra={"horizons": tensor.spec, "horizon_rmse": rmse})
+            print(f"✅ {name} model saved as {registry.root}/{name}/{meta['version']}")
+
+        table = horizon_table(tensor, by_horizon)
+        table.to_csv(args.report, index=False)
+        print("\n📊 Test RMSE by lead time")
+        print(table.to_string(index=False, float_format="%.4f"))
+        print("\n📊 All horizons")
+        print(pd.DataFrame([{"Model": n, **m} for n, m in overall.items()]).to_string(index=False))
+        print(f"\n✅ Metrics by lead time saved to {args.report}")
+        print(f"✅ Direct models trained and saved in {time.perf_counter() - start:.1f} s.")
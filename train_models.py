@@ -1,87 +1,254 @@
+"""
+train_models.py
+Train SVR, RandomForest and GradientBoosting on era5_features and save them.
+ApproxSVR (kernel_svr.ApproxKernelSVR) is a linear-time stand-in for the exact
+SVR on large training sets; select it with --models. --boosting picks the
+GradientBoosting backend (see boosting.py). --params loads tuned
+hyperparameters from tune_models.py. Each model is stored as a new version in
+the model registry (see model_registry.py); the SVR models carry their scaler.
+Between full refits, update_models.py updates these versions with new rows only.
+
+The models are fitted at the same time in a process pool. The training and
+test matrices are written once to .npy files and opened memory-mapped by every
+worker instead of being pickled into each one. The total worker count is capped
+at the available cores: each model gets one core, and estimators that support
+n_jobs (RandomForest) share whatever is left.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
-import joblib
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.svm import SVR
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from threadpoolctl import threadpool_limits
 
-print("✅ Starting model training pipeline...")
-
-# --- Step 1: Load dataset ---
-print("🔹 Loading dataset...")
-df = pd.read_csv("era5_features.csv", parse_dates=["time"])
-print(f"✅ Loaded {len(df)} rows.")
-
-# --- Step 2: Define features & target ---
-print("🔹 Preparing features and target...")
-X = df[["windspeed", "temperature_C", "pressure_hPa",
-        "windspeed_roll24h", "temperature_roll7d",
-        "windspeed_cubed", "windspeed_lag1"]].fillna(0)
-y = df["windspeed"]
-
-# --- NaN check ---
-print("🔍 Checking for NaNs in training data...")
-print("X NaNs:", X.isnull().sum().sum())
-print("y NaNs:", y.isnull().sum())
-
-# --- Step 3: Train/test split ---
-print("🔹 Splitting into train/test sets...")
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, shuffle=False
-)
-print(f"✅ Training size: {len(X_train)}, Test size: {len(X_test)}")
-
-# --- Step 4: Scale features for SVR ---
-print("🔹 Scaling features for SVR...")
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
-X_test_scaled = scaler.transform(X_test)
-joblib.dump(scaler, "scaler.pkl")
-print("✅ Scaler saved as scaler.pkl")
-
-# --- Step 5: Define models ---
-models = {
-    "SVR": SVR(kernel="rbf", C=100, gamma=0.1, epsilon=0.1),
-    "RandomForest": RandomForestRegressor(n_estimators=200, random_state=42),
-    "GradientBoosting": GradientBoostingRegressor(
-        n_estimators=300, learning_rate=0.05, max_depth=4, random_state=42
-    )
+import dataset_store
+from boosting import BACKENDS, MULTICORE_BACKENDS, fit_booster, make_booster, n_rounds
+from era5_features import FEATURES
+from instrumentation import span, stage
+from kernel_svr import ApproxKernelSVR
+from model_registry import REGISTRY_DIR, ModelRegistry
+
+# Model factories take the number of threads the estimator may use
+MODELS = {
+    "SVR": lambda n_jobs: SVR(kernel="rbf", C=100, gamma=0.1, epsilon=0.1),
+    "ApproxSVR": lambda n_jobs: ApproxKernelSVR(method="nystroem", n_components=500, C=100, gamma=0.1, epsilon=0.1),
+    "RandomForest": lambda n_jobs: RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=n_jobs),
+    "GradientBoosting": lambda n_jobs: make_booster("exact", n_jobs),
 }
+DEFAULT_MODELS = ["SVR", "RandomForest", "GradientBoosting"]
+SCALED_MODELS = {"SVR", "ApproxSVR"}  # trained on StandardScaler output
+MULTICORE_MODELS = {"RandomForest"}   # estimators that honour n_jobs
+
 
-results = []
+def compute_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> dict:
+    """RMSE, MAE, weighted MAPE (masking y < 1 m/s) and R²."""
+    y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+    rmse = np.sqrt(mean_squared_error(y_true, y_pred))
+    mae = mean_absolute_error(y_true, y_pred)
+    r2 = r2_score(y_true, y_pred)
 
-# --- Step 6: Train, evaluate, and save models ---
-for name, model in models.items():
-    print(f"\n🚀 Training {name}...")
+    # --- Weighted MAPE ---
+    mask = y_true >= 1.0
+    numerator = np.sum(np.abs(y_true[mask] - y_pred[mask]))
+    denominator = np.sum(np.abs(y_true[mask]))
+    wmape = (numerator / denominator) * 100 if denominator != 0 else np.nan
 
-    if name == "SVR":
-        model.fit(X_train_scaled, y_train)
-        y_pred = model.predict(X_test_scaled)
-    else:
-        model.fit(X_train, y_train)
-        y_pred = model.predict(X_test)
+    return {"RMSE": rmse, "MAE": mae, "wMAPE (%)": wmape, "R²": r2}
 
-    print(f"✅ {name} training complete.")
 
-    # --- Metrics ---
-    rmse = mean_squared_error(y_test, y_pred, squared=False)
-    mae = mean_absolute_error(y_test, y_pred)
-    r2 = r2_score(y_test, y_pred)
+class RunningMetrics:
+    """compute_metrics accumulated batch by batch, without keeping the arrays."""
 
-    # --- Weighted MAPE ---
-    mask = y_test >= 1.0
-    numerator = np.sum(np.abs(y_test[mask] - y_pred[mask]))
-    denominator = np.sum(np.abs(y_test[mask]))
-    wmape = (numerator / denominator) * 100 if denominator != 0 else np.nan
+    def __init__(self):
+        self.n = 0
+        self.sse = 0.0           # sum of squared errors
+        self.sae = 0.0           # sum of absolute errors
+        self.mean = 0.0          # running mean of y_true ...
+        self.m2 = 0.0            # ... and sum of squared deviations from it (Chan et al. merge)
+        self.masked_ae = 0.0     # wMAPE numerator and denominator over y_true >= 1 m/s
+        self.masked_abs = 0.0
+
+    def update(self, y_true: np.ndarray, y_pred: np.ndarray) -> None:
+        y_true, y_pred = np.asarray(y_true, dtype=np.float64), np.asarray(y_pred, dtype=np.float64)
+        if len(y_true) == 0:
+            return
+        abs_err = np.abs(y_true - y_pred)
+        self.sse += float(np.dot(abs_err, abs_err))
+        self.sae += float(abs_err.sum())
+
+        mask = y_true >= 1.0
+        self.masked_ae += float(abs_err[mask].sum())
+        self.masked_abs += float(np.abs(y_true[mask]).sum())
+
+        n, mean = len(y_true), float(y_true.mean())
+        delta, total = mean - self.mean, self.n + n
+        self.m2 += float(np.sum((y_true - mean) ** 2)) + delta * delta * self.n * n / total
+        self.mean += delta * n / total
+        self.n = total
+
+    def result(self) -> dict:
+        """The metrics so far; all NaN before any row was seen."""
+        wmape = self.masked_ae / self.masked_abs * 100 if self.masked_abs != 0 else np.nan
+        r2 = 1 - self.sse / self.m2 if self.m2 != 0 else np.nan
+        if self.n == 0:
+            return {"RMSE": np.nan, "MAE": np.nan, "wMAPE (%)": wmape, "R²": r2}
+        return {"RMSE": np.sqrt(self.sse / self.n), "MAE": self.sae / self.n, "wMAPE (%)": wmape, "R²": r2}
+
+
+def plan_threads(names: list, cores: int, multicore_models: set = MULTICORE_MODELS) -> dict:
+    """Give every model one core and split the remainder across multi-core estimators."""
+    multicore = [n for n in names if n in multicore_models]
+    spare = max(0, cores - len(names))
+    plan = {n: 1 for n in names}
+    for i, n in enumerate(multicore):
+        plan[n] += spare // len(multicore) + (1 if i < spare % len(multicore) else 0)
+    return plan
+
+
+def share_arrays(arrays: dict, directory: str) -> None:
+    for name, arr in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(arr, dtype=np.float64))
+
+
+def open_shared(directory: str, name: str) -> np.ndarray:
+    return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+
+def fit_and_save(name: str, n_jobs: int, array_dir: str, boosting: str = "exact", params: dict = None,
+                 run_info: dict = None) -> dict:
+    """
+    Worker: fit one model on the shared arrays, register it, and return its test metrics.
+    `run_info` holds what every entry of the run shares: registry root, scaler,
+    training data range and row count.
+    """
+    run_info = run_info or {}
+    suffix = "_scaled" if name in SCALED_MODELS else ""
+    X_train, X_test = open_shared(array_dir, "X_train" + suffix), open_shared(array_dir, "X_test" + suffix)
+    y_train, y_test = open_shared(array_dir, "y_train"), open_shared(array_dir, "y_test")
+
+    print(f"\n🚀 Training {name} ({n_jobs} thread{'s' if n_jobs > 1 else ''})...")
+    start = time.perf_counter()
+    with threadpool_limits(limits=n_jobs):   # caps OpenMP/BLAS threads inside this worker
+        with span("fit", rows=len(X_train), model=name, n_jobs=n_jobs):
+            if name == "GradientBoosting":
+                model = fit_booster(make_booster(boosting, n_jobs).set_params(**(params or {})), X_train, y_train)
+                print(f"   {boosting} backend kept {n_rounds(model)} trees")
+            else:
+                model = MODELS[name](n_jobs).set_params(**(params or {})).fit(X_train, y_train)
+        fit_time = time.perf_counter() - start
+        with span("score", rows=len(X_test), model=name):
+            y_pred = model.predict(X_test)
+    print(f"✅ {name} training complete in {fit_time:.1f} s.")
+
+    metrics = compute_metrics(y_test, y_pred)
+    registry = ModelRegistry(run_info.get("registry", REGISTRY_DIR))
+    with span("register", model=name):
+        meta = registry.register(name, model, scaler=run_info.get("scaler") if name in SCALED_MODELS else None,
+                                 metrics=metrics, params=model.get_params(deep=False),
+                                 data_range=run_info.get("data_range"), n_rows=run_info.get("n_rows"))
+    print(f"✅ {name} model saved as {registry.root}/{name}/{meta['version']}")
+    return {"Model": name, **metrics, "Fit (s)": fit_time}
+
+
+def train_all(names: list, array_dir: str, cores: int, parallel: bool = True, boosting: str = "exact",
+              params: dict = None, run_info: dict = None) -> list:
+    params = params or {}
+    multicore = MULTICORE_MODELS | ({"GradientBoosting"} if boosting in MULTICORE_BACKENDS else set())
+    if not parallel:
+        # One model at a time, so each may use every core it supports
+        return [fit_and_save(n, cores if n in multicore else 1, array_dir, boosting, params.get(n), run_info)
+                for n in names]
+
+    plan = plan_threads(names, cores, multicore)
+    if cores == 1:
+        return [fit_and_save(n, plan[n], array_dir, boosting, params.get(n), run_info) for n in names]
+
+    with ProcessPoolExecutor(max_workers=min(len(names), cores)) as pool:
+        futures = [pool.submit(fit_and_save, n, plan[n], array_dir, boosting, params.get(n), run_info)
+                   for n in names]
+        return [f.result() for f in futures]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and save the windspeed models")
+    parser.add_argument("--input", default="era5_features", help="features dataset directory (or legacy CSV)")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS, choices=list(MODELS))
+    parser.add_argument("--cores", type=int, default=os.cpu_count(), help="total cores to use")
+    parser.add_argument("--sequential", action="store_true", help="fit models one after another")
+    parser.add_argument("--boosting", choices=BACKENDS, default="exact", help="GradientBoosting backend")
+    parser.add_argument("--params", help="JSON of per-model hyperparameters, e.g. tuning/best_params.json")
+    parser.add_argument("--registry", default=REGISTRY_DIR, help="model registry directory")
+    args = parser.parse_args()
+
+    params = {}
+    if args.params:
+        with open(args.params) as fh:
+            params = json.load(fh)
+
+    with stage("train_models"):
+        print("✅ Starting model training pipeline...")
+        start = time.perf_counter()
+
+        # --- Step 1: Load dataset ---
+        print("🔹 Loading dataset...")
+        df = dataset_store.read_table(args.input, columns=["time"] + FEATURES)
+        print(f"✅ Loaded {len(df)} rows.")
+
+        # --- Step 2: Define features & target ---
+        print("🔹 Preparing features and target...")
+        with span("prepare", rows=len(df)):
+            X = df[FEATURES].fillna(0).to_numpy(dtype=np.float64)
+            y = df["windspeed"].to_numpy(dtype=np.float64)
+
+        # --- NaN check ---
+        print("🔍 Checking for NaNs in training data...")
+        print("X NaNs:", int(np.isnan(X).sum()))
+        print("y NaNs:", int(np.isnan(y).sum()))
+
+        # --- Step 3: Train/test split ---
+        print("🔹 Splitting into train/test sets...")
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, shuffle=False
+        )
+        print(f"✅ Training size: {len(X_train)}, Test size: {len(X_test)}")
+        train_times = df["time"].iloc[:len(X_train)]
+
+        # --- Step 4: Scale features for SVR ---
+        print("🔹 Scaling features for SVR...")
+        with span("scale", rows=len(X)):
+            scaler = StandardScaler()
+            X_train_scaled = scaler.fit_transform(X_train)
+            X_test_scaled = scaler.transform(X_test)
+        run_info = {"registry": args.registry, "scaler": scaler, "n_rows": len(X_train),
+                    "data_range": (train_times.min(), train_times.max())}
+
+        # --- Step 5: Share training arrays with the workers ---
+        array_dir = tempfile.mkdtemp(prefix="train_arrays_", dir=".")
+        try:
+            with span("share_arrays", bytes=2 * X.nbytes + y.nbytes):
+                share_arrays({"X_train": X_train, "X_test": X_test, "X_train_scaled": X_train_scaled,
+                              "X_test_scaled": X_test_scaled, "y_train": y_train, "y_test": y_test}, array_dir)
+            del X, X_train, X_test, X_train_scaled, X_test_scaled, df, train_times
 
-    results.append({"Model": name, "RMSE": rmse, "MAE": mae, "wMAPE (%)": wmape, "R²": r2})
-    joblib.dump(model, f"{name}_model.pkl")
-    print(f"✅ {name} model saved as {name}_model.pkl")
+            # --- Step 6: Train, evaluate, and save models ---
+            results = train_all(args.models, array_dir, args.cores, parallel=not args.sequential,
+                                boosting=args.boosting, params=params, run_info=run_info)
+        finally:
+            shutil.rmtree(array_dir, ignore_errors=True)
 
-# --- Step 7: Print summary table ---
-results_df = pd.DataFrame(results)
-print("\n📊 Model Comparison Summary")
-print(results_df)
-print("\n✅ All models trained and saved successfully.")
\ No newline at end of file
+        # --- Step 7: Print summary table ---
+        results_df = pd.DataFrame(results)
+        print("\n📊 Model Comparison Summary")
+        print(results_df)
+        print(f"\n✅ All models trained and saved successfully in {time.perf_counter() - start:.1f} s.")
@@ -0,0 +1,244 @@
+"""
+tune_models.py
+Hyperparameter search for the train_models.py models on walk-forward folds.
+
+Folds are expanding windows over the unique timestamps. Each fold trains on
+everything before its validation block, so no grid cell is ever validated on
+a time step that is also in its training data. Every fold's raw and scaled
+matrices are written once to <search-dir>/folds_<key>/ and opened
+memory-mapped by the workers. All candidates and later runs reuse them.
+
+Candidates go through successive halving, with folds as the resource. Every
+candidate is scored on the first fold (the cheapest, with the least training
+data). The best 1/eta are promoted to eta times as many folds, and so on until
+the survivors have seen every fold. A promoted candidate keeps its earlier
+fold results. Each (candidate, fold) trial is appended to
+<search-dir>/trials.jsonl as soon as it finishes, so an interrupted search
+resumes where it stopped. The best parameters go to <search-dir>/best_params.json,
+which `train_models.py --params` reads.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import ParameterSampler, TimeSeriesSplit
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+
+import dataset_store
+from boosting import BACKENDS, fit_booster, make_booster
+from era5_features import FEATURES
+from instrumentation import span, stage
+from train_models import DEFAULT_MODELS, MODELS, SCALED_MODELS, compute_metrics, open_shared, share_arrays
+
+SEARCH_SPACES = {
+    "SVR": {"C": [1, 10, 100, 1000], "gamma": [0.01, 0.03, 0.1, 0.3], "epsilon": [0.05, 0.1, 0.2]},
+    "ApproxSVR": {"C": [1, 10, 100, 1000], "gamma": [0.01, 0.03, 0.1, 0.3], "n_components": [200, 500, 1000]},
+    "RandomForest": {"n_estimators": [100, 200, 400], "max_depth": [None, 10, 20],
+                     "min_samples_leaf": [1, 5, 20], "max_features": [1.0, 0.5, "sqrt"]},
+    "GradientBoosting": {"learning_rate": [0.02, 0.05, 0.1, 0.2], "max_depth": [3, 4, 6, 8]},
+}
+SCORE = "RMSE"   # lower is better
+
+
+def walk_forward_folds(times: np.ndarray, n_splits: int, window: int = None, gap: int = 0) -> list:
+    """(train rows, validation rows) slices over time-sorted rows, split on unique timestamps."""
+    unique, starts = np.unique(times, return_index=True)
+    bounds = np.append(starts, len(times))
+    splitter = TimeSeriesSplit(n_splits=n_splits, max_train_size=window, gap=gap)
+    return [(slice(bounds[tr[0]], bounds[tr[-1] + 1]), slice(bounds[va[0]], bounds[va[-1] + 1]))
+            for tr, va in splitter.split(unique)]
+
+
+def data_key(times: np.ndarray, y: np.ndarray, n_splits: int, window: int, gap: int) -> str:
+    """Identify the data and fold layout, so trials from a different dataset are not reused."""
+    parts = [len(y), str(times[0]), str(times[-1]), float(np.sum(y)), n_splits, window, gap, FEATURES]
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:12]
+
+
+def cache_folds(X: np.ndarray, y: np.ndarray, folds: list, directory: str) -> list:
+    """Write each fold's raw and scaled matrices once; return the fold directories."""
+    fold_dirs = []
+    for k, (tr, va) in enumerate(folds):
+        fold_dir = os.path.join(directory, f"fold{k}")
+        fold_dirs.append(fold_dir)
+        if os.path.exists(os.path.join(fold_dir, "done")):
+            continue
+        os.makedirs(fold_dir, exist_ok=True)
+        scaler = StandardScaler().fit(X[tr])
+        share_arrays({"X_train": X[tr], "X_test": X[va], "X_train_scaled": scaler.transform(X[tr]),
+                      "X_test_scaled": scaler.transform(X[va]), "y_train": y[tr], "y_test": y[va]}, fold_dir)
+        open(os.path.join(fold_dir, "done"), "w").close()
+    return fold_dirs
+
+
+def build_model(name: str, params: dict, boosting: str = "exact", n_jobs: int = 1):
+    if name == "GradientBoosting":
+        return make_booster(boosting, n_jobs).set_params(**params)
+    return MODELS[name](n_jobs).set_params(**params)
+
+
+def evaluate(name: str, params: dict, fold_dir: str, boosting: str = "exact") -> dict:
+    """Worker: fit one candidate on one cached fold and return its validation metrics."""
+    suffix = "_scaled" if name in SCALED_MODELS else ""
+    X_train, X_test = open_shared(fold_dir, "X_train" + suffix), open_shared(fold_dir, "X_test" + suffix)
+    y_train, y_test = open_shared(fold_dir, "y_train"), open_shared(fold_dir, "y_test")
+
+    start = time.perf_counter()
+    with threadpool_limits(limits=1), span("trial", rows=len(y_train), model=name, fold=os.path.basename(fold_dir)):
+        model = build_model(name, params, boosting)
+        if name == "GradientBoosting":
+            fit_booster(model, X_train, y_train)
+        else:
+            model.fit(X_train, y_train)
+        metrics = compute_metrics(y_test, model.predict(X_test))
+    return {**{k: float(v) for k, v in metrics.items()}, "Fit (s)": time.perf_counter() - start}
+
+
+def trial_backend(name: str, boosting: str):
+    """The boosting backend a trial of `name` ran on; part of its identity, None for other models."""
+    return boosting if name == "GradientBoosting" else None
+
+
+class TrialStore:
+    """
+    Append-only JSON-lines record of finished (candidate, fold) trials. GradientBoosting
+    trials are keyed by backend too; ones logged without a backend are not reused.
+    """
+
+    def __init__(self, path: str, key: str):
+        self.path = path
+        self.key = key
+        self.results = {}
+        if os.path.exists(path):
+            with open(path) as fh:
+                for line in fh:
+                    try:
+                        trial = json.loads(line)
+                    except json.JSONDecodeError:   # torn final line from an interrupted run
+                        continue
+                    if trial["data_key"] == key:
+                        tid = self.trial_id(trial["model"], trial["params"], trial["fold"], trial.get("backend"))
+                        self.results[tid] = trial["metrics"]
+
+    @staticmethod
+    def trial_id(model: str, params: dict, fold: int, backend: str = None) -> tuple:
+        return model, backend, json.dumps(params, sort_keys=True), fold
+
+    def get(self, model: str, params: dict, fold: int, backend: str = None):
+        return self.results.get(self.trial_id(model, params, fold, backend))
+
+    def add(self, model: str, params: dict, fold: int, metrics: dict, backend: str = None) -> None:
+        self.results[self.trial_id(model, params, fold, backend)] = metrics
+        with open(self.path, "a") as fh:
+            fh.write(json.dumps({"data_key": self.key, "model": model, "backend": backend, "params": params,
+                                 "fold": fold, "metrics": metrics}) + "\n")
+
+
+def rung_schedule(n_folds: int, min_folds: int, eta: int) -> list:
+    """Cumulative fold counts per rung, e.g. 5 folds, eta 3 -> [1, 3, 5]."""
+    if eta < 2:
+        raise ValueError("eta must be at least 2")
+    rungs, r = [], min_folds
+    while r < n_folds:
+        rungs.append(r)
+        r *= eta
+    return rungs + [n_folds]
+
+
+def mean_metrics(store: TrialStore, model: str, params: dict, n_folds: int, backend: str = None) -> dict:
+    per_fold = [store.get(model, params, k, backend) for k in range(n_folds)]
+    return {m: float(np.mean([f[m] for f in per_fold])) for m in per_fold[0]}
+
+
+def successive_halving(name: str, candidates: list, fold_dirs: list, store: TrialStore, pool,
+                       eta: int = 3, min_folds: int = 1, boosting: str = "exact") -> pd.DataFrame:
+    """Run the rungs for one model; return the finalists' mean metrics over all folds, best first."""
+    alive = list(candidates)
+    backend = trial_backend(name, boosting)
+    for r, n_folds in enumerate(rung_schedule(len(fold_dirs), min_folds, eta)):
+        pending = {pool.submit(evaluate, name, p, fold_dirs[k], boosting): (p, k)
+                   for p in alive for k in range(n_folds) if store.get(name, p, k, backend) is None}
+        print(f"   rung {r}: {len(alive)} candidates x {n_folds} folds ({len(pending)} new trials)")
+        with span("rung", model=name, rung=r, candidates=len(alive), trials=len(pending)):
+            for future in as_completed(pending):
+                params, fold = pending[future]
+                store.add(name, params, fold, future.result(), backend)
+
+        alive.sort(key=lambda p: mean_metrics(store, name, p, n_folds, backend)[SCORE])
+        if n_folds == len(fold_dirs):
+            break
+        alive = alive[:max(1, math.ceil(len(alive) / eta))]
+
+    rows = [{"Model": name, "params": json.dumps(p), **mean_metrics(store, name, p, len(fold_dirs), backend)}
+            for p in alive]
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward hyperparameter search for the windspeed models")
+    parser.add_argument("--input", default="era5_features", help="features dataset directory (or legacy CSV)")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS, choices=list(SEARCH_SPACES))
+    parser.add_argument("--boosting", choices=BACKENDS, default="exact", help="GradientBoosting backend")
+    parser.add_argument("--candidates", type=int, default=27, help="sampled configurations per model")
+    parser.add_argument("--folds", type=int, default=5, help="walk-forward folds")
+    parser.add_argument("--window", type=int, default=None, help="cap training to this many time steps (rolling)")
+    parser.add_argument("--gap", type=int, default=0, help="time steps left out between train and validation")
+    parser.add_argument("--eta", type=int, default=3, help="keep 1/eta of the candidates at each rung")
+    parser.add_argument("--min-folds", type=int, default=1,
+                        help="folds in the first rung (--min-folds = --folds scores every candidate on every fold)")
+    parser.add_argument("--cores", type=int, default=os.cpu_count(), help="parallel trials")
+    parser.add_argument("--search-dir", default="tuning", help="fold cache, trial log and results")
+    args = parser.parse_args()
+
+    with stage("tune_models"):
+        print("✅ Starting hyperparameter search...")
+        start = time.perf_counter()
+
+        # --- Step 1: Load dataset in time order ---
+        df = dataset_store.read_table(args.input, columns=["time"] + FEATURES)
+        df = df.sort_values("time", kind="stable")
+        times = df["time"].to_numpy()
+        X = df[FEATURES].fillna(0).to_numpy(dtype=np.float64)
+        y = df["windspeed"].to_numpy(dtype=np.float64)
+        print(f"✅ Loaded {len(df)} rows.")
+        del df
+
+        # --- Step 2: Build and cache the walk-forward folds ---
+        key = data_key(times, y, args.folds, args.window, args.gap)
+        folds = walk_forward_folds(times, args.folds, args.window, args.gap)
+        fold_dirs = cache_folds(X, y, folds, os.path.join(args.search_dir, f"folds_{key}"))
+        for k, (tr, va) in enumerate(folds):
+            print(f"   fold {k}: train {tr.stop - tr.start} rows, validate {va.stop - va.start} rows")
+        del X, y
+
+        # --- Step 3: Successive halving per model ---
+        store = TrialStore(os.path.join(args.search_dir, "trials.jsonl"), key)
+        print(f"🔹 {len(store.results)} finished trials found for this dataset")
+        results = []
+        with ProcessPoolExecutor(max_workers=args.cores) as pool:
+            for name in args.models:
+                space = SEARCH_SPACES[name]
+                n_grid = math.prod(len(v) for v in space.values())
+                candidates = list(ParameterSampler(space, min(args.candidates, n_grid), random_state=42))
+                print(f"\n🚀 Tuning {name}: {len(candidates)} of {n_grid} configurations")
+                results.append(successive_halving(name, candidates, fold_dirs, store, pool, args.eta,
+                                                  args.min_folds, args.boosting))
+
+        # --- Step 4: Report and save the winners ---
+        results_df = pd.concat(results, ignore_index=True)
+        best = {name: json.loads(group.iloc[0]["params"]) for name, group in results_df.groupby("Model", sort=False)}
+        with open(os.path.join(args.search_dir, "best_params.json"), "w") as fh:
+            json.dump(best, fh, indent=2)
+
+        print("\n📊 Finalists (mean over all folds)")
+        print(results_df.to_string(index=False))
+        print(f"\n✅ Best parameters saved to {os.path.join(args.search_dir, 'best_params.json')} "
+              f"in {time.perf_counter() - start:.1f} s.")
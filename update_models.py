@@ -0,0 +1,191 @@
+"""
+update_models.py
+Nightly incremental update of the registered models with the newly appended
+era5_features rows, as a cheap companion to a periodic full refit by
+train_models.py.
+
+The starting point for each model is its latest registry version, full or
+incremental. The new rows are those after the end of that version's training
+data range. Only the partitions from that month on are read, so the work
+grows with the new data, not with the history:
+  RandomForest       grows --new-trees trees on the new rows (warm_start). The
+                     oldest trees are dropped beyond --max-trees.
+  GradientBoosting   adds up to --new-rounds boosting rounds fitted to the new
+                     rows, early-stopped on their last 10% (boosting.extend_booster).
+  ApproxSVR          continues its SGD on the new rows (partial_fit).
+  SVR                has no incremental form and is left to the full refit.
+The scaler of a scaled model is updated with the new rows' running
+statistics (StandardScaler.partial_fit) before the model sees them.
+
+The most recent --holdout of the new time steps is held out for scoring.
+Holdout rows fall after the recorded training range, so the next update
+trains on them. Each updated model is scored on the holdout next to the
+latest full refit of the same model. The difference is the drift. It is
+printed, stored in the new version's meta.json, and written to --report. A
+steadily growing drift means it is time for a full refit.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor, RandomForestRegressor
+from threadpoolctl import threadpool_limits
+
+import dataset_store
+from boosting import extend_booster
+from era5_features import FEATURES
+from instrumentation import span, stage
+from kernel_svr import ApproxKernelSVR
+from model_registry import REGISTRY_DIR, ModelRegistry, RegisteredModel
+from train_models import MODELS, compute_metrics
+
+UPDATABLE_MODELS = ["ApproxSVR", "RandomForest", "GradientBoosting"]
+
+
+def read_new_rows(input_path: str, after: pd.Timestamp) -> pd.DataFrame:
+    """Rows of the features dataset with time > `after`, reading only the partitions from its month on."""
+    columns = ["time"] + FEATURES
+    if os.path.isdir(input_path):
+        df = dataset_store.read_dataset(input_path, columns, start=after.strftime("%Y-%m"))
+    else:
+        df = dataset_store.read_table(input_path, columns)   # a single file has to be read whole
+    df = df[df["time"] > after]
+    return df.sort_values("time", kind="stable", ignore_index=True)
+
+
+def holdout_split(times: np.ndarray, holdout: float) -> int:
+    """Row index where the held-out block starts; the cut falls on a time-step boundary."""
+    unique = np.unique(times)
+    if len(unique) < 2:
+        return len(times)
+    first_held = unique[min(len(unique) - 1, max(1, int(round(len(unique) * (1 - holdout)))))]
+    return int(np.searchsorted(times, first_held))
+
+
+def grow_forest(model: RandomForestRegressor, X: np.ndarray, y: np.ndarray, new_trees: int,
+                max_trees: int = None, n_jobs: int = 1) -> RandomForestRegressor:
+    """Add `new_trees` trees fitted to (X, y); drop the oldest ones beyond `max_trees`."""
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + new_trees, n_jobs=n_jobs).fit(X, y)
+    if max_trees and len(model.estimators_) > max_trees:
+        del model.estimators_[:len(model.estimators_) - max_trees]
+        model.set_params(n_estimators=max_trees)
+    return model
+
+
+def update_estimator(model, X: np.ndarray, y: np.ndarray, new_trees: int = 20, max_trees: int = None,
+                     new_rounds: int = 50, n_jobs: int = 1):
+    """Update a fitted estimator in place with new rows only; None if it has no incremental form."""
+    if isinstance(model, ApproxKernelSVR):
+        return model.partial_fit(X, y)
+    if isinstance(model, RandomForestRegressor):
+        return grow_forest(model, X, y, new_trees, max_trees, n_jobs)
+    if isinstance(model, (GradientBoostingRegressor, HistGradientBoostingRegressor)) or hasattr(model, "get_booster"):
+        if hasattr(model, "n_jobs"):   # xgboost; the sklearn boosters follow threadpool_limits
+            model.set_params(n_jobs=n_jobs)
+        return extend_booster(model, X, y, new_rounds)
+    return None
+
+
+def update_one(name: str, registry: ModelRegistry, df: pd.DataFrame, holdout: float, new_trees: int,
+               max_trees: int, new_rounds: int, cores: int) -> dict:
+    """Update the latest version of `name` with the rows of `df` it has not seen; returns a report row."""
+    meta = registry.metadata(name)
+    new = df[df["time"] > pd.Timestamp(meta["data_range"][1])]
+    cut = holdout_split(new["time"].to_numpy(), holdout)
+    if cut == 0 or cut == len(new):
+        print(f"⏭️  {name} {meta['version']}: {len(new)} new rows, too few time steps to update and score")
+        return None
+
+    X = new[FEATURES].fillna(0).to_numpy(dtype=np.float64)
+    y = new["windspeed"].to_numpy(dtype=np.float64)
+    X_update, y_update, X_hold, y_hold = X[:cut], y[:cut], X[cut:], y[cut:]
+
+    # The latest full refit is scored first and released, so only one model is held at a time
+    full_version = registry.latest(name, lineage="full")
+    with span("score_full_refit", rows=len(y_hold), model=name, version=full_version):
+        full_metrics = compute_metrics(y_hold, registry.load(name, full_version).predict(X_hold))
+
+    # Copy-on-write map: loading does not hold a second copy, and the in-place updates stay private
+    with span("load_model", model=name, version=meta["version"]):
+        entry = registry.load(name, meta["version"], mmap_mode="c")
+    start = time.perf_counter()
+    with threadpool_limits(limits=cores), span("update", rows=cut, model=name, parent=meta["version"]):
+        if entry.scaler is not None:
+            entry.scaler.partial_fit(X_update)
+            X_fit = entry.scaler.transform(X_update)
+        else:
+            X_fit = X_update
+        model = update_estimator(entry.model, X_fit, y_update, new_trees, max_trees, new_rounds, cores)
+    update_time = time.perf_counter() - start
+    if model is None:
+        print(f"⏭️  {name}: {type(entry.model).__name__} has no incremental update; refit it with train_models.py")
+        return None
+
+    updated = RegisteredModel(meta, model, entry.scaler)
+    metrics = compute_metrics(y_hold, updated.predict(X_hold))
+
+    # Drift against the latest full refit, on the same held-out rows
+    drift = {"against": full_version, "full_metrics": {k: float(v) for k, v in full_metrics.items()},
+             "delta": {k: float(metrics[k] - full_metrics[k]) for k in metrics},
+             "holdout_rows": len(y_hold)}
+
+    end = new["time"].iloc[cut - 1]
+    with span("register", model=name):
+        new_meta = registry.register(name, model, scaler=entry.scaler, metrics=metrics,
+                                     params=model.get_params(deep=False),
+                                     data_range=(meta["data_range"][0], end), n_rows=(meta["n_rows"] or 0) + cut,
+                                     lineage="incremental", parent=meta["version"], drift=drift)
+    print(f"✅ {name} {meta['version']} -> {new_meta['version']}: {cut:,} new rows in {update_time:.1f} s, "
+          f"RMSE {metrics['RMSE']:.4f} vs full refit {full_version} {full_metrics['RMSE']:.4f}")
+    return {"Model": name, "Version": new_meta["version"], "Parent": meta["version"], "New rows": cut,
+            "Update (s)": update_time, "RMSE": metrics["RMSE"], "Full refit": full_version,
+            "Full RMSE": full_metrics["RMSE"], **{f"Δ {k}": v for k, v in drift["delta"].items()}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the registered models with newly appended feature rows")
+    parser.add_argument("--input", default="era5_features", help="features dataset directory (or legacy CSV)")
+    parser.add_argument("--models", nargs="+", default=UPDATABLE_MODELS, choices=list(MODELS))
+    parser.add_argument("--registry", default=REGISTRY_DIR, help="model registry directory")
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of the new time steps held out for scoring")
+    parser.add_argument("--new-trees", type=int, default=20, help="trees added to RandomForest per update")
+    parser.add_argument("--max-trees", type=int, default=400, help="RandomForest size cap (oldest trees dropped)")
+    parser.add_argument("--new-rounds", type=int, default=50, help="boosting rounds added per update")
+    parser.add_argument("--cores", type=int, default=os.cpu_count(), help="threads per model")
+    parser.add_argument("--report", default="drift_report.csv", help="CSV of update metrics and drift")
+    args = parser.parse_args()
+
+    with stage("update_models"):
+        registry = ModelRegistry(args.registry)
+        names = [n for n in args.models if registry.versions(n)]
+        if not names:
+            raise SystemExit(f"No models registered in {args.registry}; run train_models.py first")
+        # Versions without a training range (e.g. from model_registry.py --import-legacy) have no "new rows"
+        for n in [n for n in names if not registry.metadata(n).get("data_range")]:
+            print(f"⏭️  {n} {registry.latest(n)}: no recorded training data range, so the new rows are unknown; "
+                  f"refit it with train_models.py")
+        names = [n for n in names if registry.metadata(n).get("data_range")]
+        if not names:
+            raise SystemExit("No registered model records its training data range; run train_models.py first")
+
+        # --- Step 1: Read only the rows newer than the oldest model's training range ---
+        after = min(pd.Timestamp(registry.metadata(n)["data_range"][1]) for n in names)
+        df = read_new_rows(args.input, after)
+        print(f"✅ Loaded {len(df):,} rows after {after}")
+
+        # --- Step 2: Update each model and score it against its latest full refit ---
+        rows = [update_one(n, registry, df, args.holdout, args.new_trees, args.max_trees, args.new_rounds,
+                           args.cores) for n in names]
+        rows = [r for r in rows if r is not None]
+
+        if rows:
+            report = pd.DataFrame(rows)
+            report.to_csv(args.report, index=False)
+            print("\n📊 Incremental update vs latest full refit (on the held-out new rows)")
+            print(report.to_string(index=False))
+            print(f"✅ Drift report saved to {args.report}")
+        else:
+            print("✅ Models already up to date")
@@ -1,5 +1,5 @@
-import pandas as pd
+import dataset_store
 
-df = pd.read_csv("era5_cleaned.csv", parse_dates=["time"])
+df = dataset_store.read_table("era5_cleaned", columns=["time"])
 print(df["time"].min(), df["time"].max())
 print(df["time"].diff().value_counts().head())
\ No newline at end of file
@@ -1,30 +1,79 @@
+"""
+validate_era5_full.py
+Check a cleaned dataset for duplicate and missing time steps per grid point
+(or station), and optionally write a repaired copy.
+
+The data is streamed batch by batch through gaps.GapScanner. Without
+--output, only the time and cell columns are read. Every gap is listed in
+--report with its cell, first and last missing time, length, and action:
+  filled     at most --max-fill long; interpolated in the --output copy
+  fillable   as short, but left alone: without --output nothing is written
+  open       longer; left missing, so era5_features.py restarts its rolling windows after it
+  leading / trailing   missing before the cell's first row or after its last
+
+  python validate_era5_full.py                                   # report on era5_cleaned
+  python validate_era5_full.py --output era5_repaired            # ...and write the repaired dataset
+  python validate_era5_full.py --input data/midas_combined.csv --time-col timestamp --step 1h
+"""
+
+import argparse
+import os
+
 import pandas as pd
 
-# Load the cleaned dataset
-df = pd.read_csv("era5_cleaned.csv", parse_dates=["time"])
-
-# --- Step 1: Remove duplicates ---
-df = df.drop_duplicates(subset="time", keep="first").sort_values("time")
-
-print("✅ Deduplicated dataset")
-print("Start:", df["time"].min())
-print("End:", df["time"].max())
-print("Total rows:", len(df))
-
-# --- Step 2: Check for missing 3-hourly steps ---
-expected_range = pd.date_range(
-    start=df["time"].min(),
-    end=df["time"].max(),
-    freq="3H"
-)
-
-missing = expected_range.difference(df["time"])
-
-if len(missing) == 0:
-    print("🎉 No missing 3-hourly steps — dataset is continuous!")
-else:
-    print(f"⚠️ Found {len(missing)} missing timestamps:")
-    print(missing[:20])  # show first 20 gaps
-    # Save full list to CSV for inspection
-    pd.DataFrame(missing, columns=["missing_time"]).to_csv("missing_timestamps.csv", index=False)
-    print("Full list saved to missing_timestamps.csv")
\ No newline at end of file
+import dataset_store
+from era5_features import SPACE_COLS
+from gaps import GapScanner
+from instrumentation import span, stage
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find duplicate and missing time steps per cell, fill short gaps")
+    parser.add_argument("--input", default="era5_cleaned", help="cleaned dataset directory (or CSV)")
+    parser.add_argument("--output", help="write the deduplicated, gap-filled dataset to this directory")
+    parser.add_argument("--report", default="gaps.csv", help="CSV with one row per gap")
+    parser.add_argument("--time-col", default="time")
+    parser.add_argument("--cells", nargs="+", help=f"columns identifying a series (default: those of {SPACE_COLS})")
+    parser.add_argument("--step", default="3h", help="expected spacing of the time steps")
+    parser.add_argument("--max-fill", default="6h", help="longest gap filled by interpolation")
+    parser.add_argument("--batch-size", type=int, default=1_000_000, help="rows read at a time")
+    args = parser.parse_args()
+
+    with stage("validate_era5_full"):
+        if args.output and os.path.abspath(args.output) == os.path.abspath(args.input):
+            raise SystemExit("--output must differ from --input")
+        step = pd.Timedelta(args.step)
+        max_fill = int(pd.Timedelta(args.max_fill) // step)
+        cells = args.cells or [c for c in SPACE_COLS
+                               if c in next(dataset_store.iter_batches(args.input, 1, time_col=args.time_col))]
+        columns = None if args.output else [args.time_col] + cells
+        print(f"🔹 Scanning {args.input} per {' x '.join(cells) or 'dataset'} at {args.step} steps, "
+              f"filling gaps of up to {max_fill} steps")
+
+        scanner = GapScanner(cells, step, max_fill, args.time_col)
+        if args.output:
+            dataset_store.clear(args.output)
+        for batch in dataset_store.iter_batches(args.input, args.batch_size, columns, args.time_col):
+            with span("scan", rows=len(batch)):
+                repaired = scanner.scan(batch, repair=bool(args.output))
+            if args.output:
+                dataset_store.write_partitions(repaired, args.output, time_col=args.time_col, mode="append")
+            print(f"   scanned {scanner.counts['rows']:,} rows", end="\r")
+
+        with span("report"):
+            report = scanner.report()
+            report.to_csv(args.report, index=False)
+        summary = scanner.summary()
+        print(f"\n✅ {summary['rows']:,} rows, {summary['cells']:,} cells x {summary['steps']:,} steps, "
+              f"{summary['complete (%)']:.2f}% complete")
+        print(f"   duplicate rows: {summary['duplicates']:,}   off the {args.step} grid: {summary['off_grid']:,}   "
+              f"out of order: {summary['out_of_order']:,}")
+
+        if report.empty:
+            print("🎉 No missing steps — every series is continuous!")
+        else:
+            by_action = report.groupby("action")["steps"].agg(["count", "sum"])
+            for action, row in by_action.iterrows():
+                print(f"⚠️ {action:<9} {row['count']:,} gaps, {row['sum']:,} missing steps")
+            print(f"Full list saved to {args.report}")
+        if args.output:
+            print(f"✅ Repaired dataset ({summary['filled_rows']:,} rows interpolated) saved to {args.output}/")